@@ -1,127 +1,226 @@
-import numpy as np
-import random
-import pandas as pd
-from utils import can_capture
-import os
-
-
-class QLearningAgent:
-    def __init__(self, epsilon=0.3, alpha=0.1, gamma=0.99):
-        self.epsilon = epsilon  # 探索率
-        self.alpha = alpha  # 学习率
-        self.gamma = gamma  # 折扣因子
-        self.q_table = {}  # Q表
-
-    def get_state(self, board):
-        """将棋盘状态转换为字符串形式"""
-        state = []
-        for row in board:
-            for piece in row:
-                if piece:
-                    state.append((piece.name, piece.state, piece.player))
-                else:
-                    state.append(("empty", "unknown", -1))
-        return str(state)
-
-    def get_valid_actions(self, board, current_player):
-        """根据当前状态动态生成合法动作列表"""
-        valid_actions = set()
-        size = len(board)
-
-        for row in range(size):
-            for col in range(size):
-                piece = board[row][col]
-                if piece and piece.player == current_player:
-                    if piece.state == "unknown":
-                        valid_actions.add("flip")  # 翻开棋子
-                    elif piece.state == "known":
-                        valid_moves = self.get_valid_moves(board, row, col)
-                        if valid_moves:
-                            valid_actions.add("move")  # 移动棋子
-                            for move in valid_moves:
-                                target_piece = board[move[0]][move[1]]
-                                if target_piece and target_piece.player != piece.player:
-                                    valid_actions.add("capture")  # 吃掉棋子
-        if not valid_actions:
-            valid_actions.add("skip")  # 跳过回合
-        return list(valid_actions)
-
-    def get_valid_moves(self, board, row, col):
-        """获取棋子的合法移动位置"""
-        size = len(board)
-        moves = []
-        piece = board[row][col]
-        if not piece:
-            return moves
-
-        for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            nr, nc = row + dr, col + dc
-            if 0 <= nr < size and 0 <= nc < size:
-                target_piece = board[nr][nc]
-                if not target_piece:
-                    moves.append((nr, nc))  # 空位可以移动
-                elif target_piece.player != piece.player and target_piece.state == "known":
-                    if can_capture(piece.name, target_piece.name):
-                        moves.append((nr, nc))  # 可以吃掉对手棋子
-        return moves
-
-    def choose_action(self, state, board, current_player):
-        """选择动作（探索或利用）"""
-        valid_actions = self.get_valid_actions(board, current_player)
-        if random.uniform(0, 1) < self.epsilon:
-            return random.choice(valid_actions)  # 探索
-        else:
-            if state not in self.q_table:
-                self.q_table[state] = {"flip": 0, "move": 0, "capture": 0, "skip": 0}
-            max_q = max(self.q_table[state][action] for action in valid_actions)
-            best_actions = [action for action in valid_actions if self.q_table[state][action] == max_q]
-            return random.choice(best_actions)  # 利用
-
-    def update_q_table(self, state, action, reward, next_state):
-        """更新Q表"""
-        if state not in self.q_table:
-            self.q_table[state] = {"flip": 0, "move": 0, "capture": 0, "skip": 0}
-        if next_state not in self.q_table:
-            self.q_table[next_state] = {"flip": 0, "move": 0, "capture": 0, "skip": 0}
-
-        best_next_action = max(self.q_table[next_state].values())
-        td_target = reward + self.gamma * best_next_action
-        td_error = td_target - self.q_table[state][action]
-        self.q_table[state][action] += self.alpha * td_error
-
-    def save_q_table_as_csv(self, filename):
-        """将Q表保存为CSV文件"""
-        # 确保 data 文件夹存在
-        data_dir = "data"
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-
-        # 完整的文件路径
-        filepath = os.path.join(data_dir, filename)
-
-        states = list(self.q_table.keys())
-        actions = ["flip", "move", "capture", "skip"]
-
-        q_table_df = pd.DataFrame(index=states, columns=actions)
-        for state in states:
-            for action in actions:
-                q_table_df.at[state, action] = self.q_table[state][action]
-
-        q_table_df.to_csv(filepath)
-        print(f"Q表已成功保存为CSV文件：{filepath}")
-
-
-    def load_q_table_from_csv(self, filename):
-        """从CSV文件加载Q表"""
-        data_dir = "data"
-        filepath = os.path.join(data_dir, filename)
-
-        # 检查文件是否存在
-        if not os.path.exists(filepath):
-            print(f"文件 {filepath} 不存在，无法加载Q表。")
-            return
-
-        self.q_table = {}
-        q_table_df = pd.read_csv(filepath, index_col=0)
-        for state in q_table_df.index:
-            self.q_table[state] = q_table_df.loc[state].to_dict()
\ No newline at end of file
+import random
+from utils import CAPTURE_MATRIX, neighbor_cells
+from zobrist import hash_board, hash_legacy_state
+from symmetry import canonical_key
+from bounded_qtable import BoundedQTable
+import os
+
+# NumPy / pandas 以及依赖它们的 qtable_store、qtable_service 只在用到的方法里导入，
+# 导入本模块（例如 test.py 启动时）不会加载它们
+
+ACTIONS = ["flip", "move", "capture", "skip"]
+_rng = None
+
+
+def select_actions(q_values, masks, epsilon, rng=None):
+    """对一批状态做 epsilon-greedy 选择：q_values 与 masks 形状均为 [n, 4]（列顺序同 ACTIONS），
+    以 epsilon 的概率在合法动作中均匀探索，否则在 Q 值最大的合法动作中随机打破平局；返回动作编号数组"""
+    import numpy as np
+
+    global _rng
+    if rng is None:
+        rng = _rng = _rng or np.random.default_rng()
+    masks = np.asarray(masks, dtype=bool)
+    masked = np.where(masks, q_values, -np.inf)
+    best = masks & (masked == masked.max(axis=1, keepdims=True))
+    explore = rng.random(len(masks)) < epsilon
+    candidates = np.where(explore[:, None], masks, best)
+    return np.where(candidates, rng.random(masks.shape), -1.0).argmax(axis=1)
+
+
+class QLearningAgent:
+    def __init__(self, epsilon=0.3, alpha=0.1, gamma=0.99, canonical=False, capacity=None, eviction="lru"):
+        self.epsilon = epsilon  # 探索率
+        self.alpha = alpha  # 学习率
+        self.gamma = gamma  # 折扣因子
+        self.canonical = canonical  # 是否使用对称/颜色交换规范化的状态键（双方可共用一张表）
+        self.q_table = {}  # Q表
+        if capacity:
+            # 限制 Q 表容量，超出时按 eviction 策略（lru / visits / zero）淘汰
+            self.q_table = BoundedQTable(capacity, eviction)
+
+    def get_state(self, board, player=0):
+        """将棋盘状态转换为 Zobrist 哈希值（整数），与 GameEngine.state_key / canonical_key 一致"""
+        if self.canonical:
+            return canonical_key(board, player)
+        return hash_board(board)
+
+    def state_key(self, engine):
+        """规则引擎当前局面在本智能体 Q 表中的键（增量维护，无需扫描棋盘）"""
+        return engine.canonical_key() if self.canonical else engine.state_key
+
+    def get_valid_actions(self, board, current_player):
+        """根据当前状态动态生成合法动作列表"""
+        valid_actions = set()
+        size = len(board)
+
+        for row in range(size):
+            for col in range(size):
+                piece = board[row][col]
+                if piece and piece.player == current_player:
+                    if piece.state == "unknown":
+                        valid_actions.add("flip")  # 翻开棋子
+                    elif piece.state == "known":
+                        valid_moves = self.get_valid_moves(board, row, col)
+                        if valid_moves:
+                            valid_actions.add("move")  # 移动棋子
+                            for move in valid_moves:
+                                target_piece = board[move[0]][move[1]]
+                                if target_piece and target_piece.player != piece.player:
+                                    valid_actions.add("capture")  # 吃掉棋子
+        if not valid_actions:
+            valid_actions.add("skip")  # 跳过回合
+        return list(valid_actions)
+
+    def get_valid_moves(self, board, row, col):
+        """获取棋子的合法移动位置"""
+        moves = []
+        piece = board[row][col]
+        if not piece:
+            return moves
+
+        capture_row = CAPTURE_MATRIX[piece.type_id]
+        for nr, nc in neighbor_cells(len(board))[row][col]:
+            target_piece = board[nr][nc]
+            if not target_piece:
+                moves.append((nr, nc))  # 空位可以移动
+            elif target_piece.player != piece.player and target_piece.state == "known":
+                if capture_row[target_piece.type_id]:
+                    moves.append((nr, nc))  # 可以吃掉对手棋子
+        return moves
+
+    def choose_action(self, state, board, current_player, rng=random):
+        """选择动作（探索或利用）；rng 为随机数生成器，自我对弈时传入对局自己的 random.Random 以便复现"""
+        valid_actions = self.get_valid_actions(board, current_player)
+        if rng.uniform(0, 1) < self.epsilon:
+            return rng.choice(valid_actions)  # 探索
+        else:
+            if state not in self.q_table:
+                self.q_table[state] = {"flip": 0, "move": 0, "capture": 0, "skip": 0}
+            max_q = max(self.q_table[state][action] for action in valid_actions)
+            best_actions = [action for action in valid_actions if self.q_table[state][action] == max_q]
+            return rng.choice(best_actions)  # 利用
+
+    def action_masks(self, boards, players):
+        """多个局面的合法动作掩码 [n, 4]，与 get_valid_actions 一致（批量环境可直接用 BatchedGameEnv.action_mask）"""
+        import numpy as np
+
+        masks = np.zeros((len(boards), len(ACTIONS)), dtype=bool)
+        for i, (board, player) in enumerate(zip(boards, players)):
+            for action in self.get_valid_actions(board, player):
+                masks[i, ACTIONS.index(action)] = True
+        return masks
+
+    def choose_actions(self, states, masks, rng=None):
+        """批量版 choose_action：states 为状态键数组，masks 为合法动作掩码，返回动作编号数组（ACTIONS 中的下标）
+
+        一次向量化地完成查表、探索和打破平局；没见过的状态按全 0 处理，但不会像 choose_action 那样插入新行。
+        """
+        from qtable_store import lookup_many
+
+        return select_actions(lookup_many(self.q_table, states), masks, self.epsilon, rng)
+
+    def update_q_table(self, state, action, reward, next_state):
+        """更新Q表"""
+        if state not in self.q_table:
+            self.q_table[state] = {"flip": 0, "move": 0, "capture": 0, "skip": 0}
+        row = self.q_table[state]  # 先取出引用：容量有限时写入 next_state 可能淘汰 state
+        if next_state not in self.q_table:
+            self.q_table[next_state] = {"flip": 0, "move": 0, "capture": 0, "skip": 0}
+
+        best_next_action = max(self.q_table[next_state].values())
+        td_target = reward + self.gamma * best_next_action
+        td_error = td_target - row[action]
+        row[action] += self.alpha * td_error
+
+    def save_q_table_as_csv(self, filename):
+        """将Q表保存为CSV文件"""
+        import pandas as pd
+
+        # 确保 data 文件夹存在
+        data_dir = "data"
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+
+        # 完整的文件路径
+        filepath = os.path.join(data_dir, filename)
+
+        states = list(self.q_table.keys())
+        actions = ["flip", "move", "capture", "skip"]
+
+        q_table_df = pd.DataFrame(index=states, columns=actions)
+        for state in states:
+            for action in actions:
+                q_table_df.at[state, action] = self.q_table[state][action]
+
+        q_table_df.to_csv(filepath)
+        print(f"Q表已成功保存为CSV文件：{filepath}")
+
+
+    def load_q_table_from_csv(self, filename):
+        """从CSV文件加载Q表"""
+        import pandas as pd
+
+        data_dir = "data"
+        filepath = os.path.join(data_dir, filename)
+
+        # 检查文件是否存在
+        if not os.path.exists(filepath):
+            print(f"文件 {filepath} 不存在，无法加载Q表。")
+            return
+
+        self.q_table = {}
+        q_table_df = pd.read_csv(filepath, index_col=0)
+        if not pd.api.types.is_integer_dtype(q_table_df.index):
+            # 旧版以字符串为键的 Q 表，载入时转换为哈希键（可用 zobrist.py 永久转换）
+            q_table_df.index = [hash_legacy_state(state) for state in q_table_df.index]
+            q_table_df = q_table_df[~q_table_df.index.duplicated(keep="first")]
+        for state in q_table_df.index:
+            self.q_table[state] = q_table_df.loc[state].to_dict()
+
+    def save_q_table_as_binary(self, filename):
+        """将Q表保存为可内存映射的二进制文件"""
+        from qtable_store import save_q_table
+
+        data_dir = "data"
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+
+        filepath = os.path.join(data_dir, filename)
+        save_q_table(self.q_table, filepath)
+        print(f"Q表已成功保存为二进制文件：{filepath}")
+
+    def load_q_table_from_binary(self, filename):
+        """以内存映射方式加载二进制Q表，查询时直接读取文件而不展开为字典"""
+        from qtable_store import MappedQTable
+
+        filepath = os.path.join("data", filename)
+        if not os.path.exists(filepath):
+            print(f"文件 {filepath} 不存在，无法加载Q表。")
+            return
+
+        self.q_table = MappedQTable(filepath)
+
+    def attach_q_table(self, name):
+        """附加到 qtable_service 发布的共享内存Q表（零拷贝，发布者换表后自动切换），
+        没有发布者时回退到 load_q_table；返回是否附加成功"""
+        from qtable_service import SharedQTable, service_name
+
+        try:
+            self.q_table = SharedQTable(service_name(name))
+            return True
+        except (FileNotFoundError, RuntimeError):
+            self.load_q_table(name)
+            return False
+
+    def save_q_table(self, name):
+        """同时保存 CSV 和二进制两种格式，name 不含扩展名"""
+        self.save_q_table_as_csv(f"{name}.csv")
+        self.save_q_table_as_binary(f"{name}.qtb")
+
+    def load_q_table(self, name):
+        """优先加载二进制Q表，不存在时回退到CSV，name 不含扩展名"""
+        if os.path.exists(os.path.join("data", f"{name}.qtb")):
+            self.load_q_table_from_binary(f"{name}.qtb")
+        else:
+            self.load_q_table_from_csv(f"{name}.csv")
\ No newline at end of file
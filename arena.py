@@ -0,0 +1,316 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import sys
+import time
+from itertools import combinations
+import numpy as np
+from ai import QLearningAgent
+from engine import GameEngine, PIECE_VALUES
+from qtable_store import ACTIONS, lookup_many
+
+
+POLICIES = {}  # 策略类型 -> 工厂函数(参数字符串) -> 策略对象
+GAME_SEED_STRIDE = 1_000_003
+
+
+def policy(kind):
+    """注册策略类型；命令行中写作 "类型" 或 "类型:参数"，例如 q:agent1_q_table、search:100"""
+    def register(factory):
+        POLICIES[kind] = factory
+        return factory
+    return register
+
+
+class AgentPolicy:
+    """包装选择抽象动作（flip/move/capture/skip）的智能体"""
+
+    def __init__(self, agent):
+        self.agent = agent
+
+    def reset(self, seed):
+        pass
+
+    def act(self, engine, rng):
+        state = self.agent.state_key(engine)
+        action = self.agent.choose_action(state, engine.board, engine.current_player, rng)
+        engine.apply_action(action, rng)
+
+
+class QTablePolicy(AgentPolicy):
+    """只读地使用训练好的 Q 表走子（贪心，随机打破平局）
+
+    经 lookup_many 查表，没见过的状态按全 0 处理但不会插入新行，Q 表大小不随对局增长，
+    同一个策略对象可以被多个会话、多个线程共享。
+    """
+
+    def act(self, engine, rng):
+        state = self.agent.state_key(engine)
+        valid_actions = self.agent.get_valid_actions(engine.board, engine.current_player)
+        values = dict(zip(ACTIONS, lookup_many(self.agent.q_table, [state])[0].tolist()))
+        max_q = max(values[action] for action in valid_actions)
+        engine.apply_action(rng.choice([action for action in valid_actions if values[action] == max_q]), rng)
+
+
+class GreedyPolicy:
+    """贪心吃子：能吃就吃价值最高的棋子，否则翻开一枚未知棋子，再否则随机移动"""
+
+    def reset(self, seed):
+        pass
+
+    def act(self, engine, rng):
+        captures = engine.capture_moves()
+        if captures:
+            best = max(PIECE_VALUES[engine.board[r][c].name] for _, _, r, c in captures)
+            engine.move_piece(*rng.choice([m for m in captures if PIECE_VALUES[engine.board[m[2]][m[3]].name] == best]))
+        elif engine.unknown_cells():
+            engine.apply_action("flip", rng)
+        elif engine.movable_cells():
+            engine.apply_action("move", rng)
+        else:
+            engine.skip_turn()
+
+
+class SearchPolicy:
+    """search.SearchAgent，每局开始时清空置换表并重新设定随机种子"""
+
+    def __init__(self, budget_ms):
+        from search import SearchAgent
+        self.searcher = SearchAgent(budget_ms)
+
+    def reset(self, seed):
+        self.searcher.table.clear()
+        self.searcher.rng.seed(seed)
+
+    def act(self, engine, rng):
+        from search import apply_move
+        apply_move(engine, self.searcher.choose_move(engine))
+
+
+@policy("random")
+def random_policy(arg):
+    return AgentPolicy(QLearningAgent(epsilon=1.0))
+
+
+@policy("greedy")
+def greedy_policy(arg):
+    return GreedyPolicy()
+
+
+@policy("q")
+def q_policy(arg):
+    name = arg or "agent1_q_table"
+    if not any(os.path.exists(os.path.join("data", name + ext)) for ext in (".qtb", ".csv")):
+        raise FileNotFoundError(f"data 文件夹中没有 Q 表 {name}")
+    agent = QLearningAgent(epsilon=0)
+    agent.load_q_table(name)
+    return QTablePolicy(agent)
+
+
+@policy("linear")
+def linear_policy(arg):
+    from linear_agent import LinearQAgent
+    name = arg or "agent1_linear"
+    if not os.path.exists(os.path.join("data", f"{name}.lw")):
+        raise FileNotFoundError(f"data 文件夹中没有线性智能体权重 {name}.lw")
+    agent = LinearQAgent(epsilon=0)
+    agent.load_q_table(name)
+    return AgentPolicy(agent)
+
+
+@policy("search")
+def search_policy(arg):
+    return SearchPolicy(float(arg or 50))
+
+
+def make_policy(spec):
+    kind, _, arg = spec.partition(":")
+    if kind not in POLICIES:
+        raise ValueError(f"未知的策略类型 {kind}，可选：{', '.join(POLICIES)}")
+    return POLICIES[kind](arg)
+
+
+_worker_policies = {}  # 每个进程中按描述缓存的策略对象（Q 表只加载一次）
+
+
+def get_policy(spec):
+    if spec not in _worker_policies:
+        _worker_policies[spec] = make_policy(spec)
+    return _worker_policies[spec]
+
+
+def play_one(engine, seats, game_seed):
+    """用 game_seed 布子并对弈一局，seats[0] 执蓝先手；返回 (胜者, 回合数)"""
+    rng = random.Random(game_seed)
+    for seat in seats:
+        seat.reset(game_seed)
+    engine.reset()
+    engine.setup_pieces(rng)
+    while not engine.game_over:
+        seats[engine.current_player].act(engine, rng)
+        engine.end_turn()
+    return engine.winner, engine.total_turns
+
+
+def play_games(task):
+    """对局任务（可在子进程中运行）：返回 (策略 A, 策略 B, A 胜, 平, A 负, 总回合数)
+
+    第 2k 和 2k+1 局使用同一个布子种子并交换先后手，减少发牌运气带来的方差。
+    """
+    spec_a, spec_b, seed, games, board_size = task
+    engine = GameEngine(board_size)
+    a, b = get_policy(spec_a), get_policy(spec_b)
+    wins = draws = losses = turns = 0
+    for game in games:
+        a_seat = game % 2
+        winner, length = play_one(engine, (a, b) if a_seat == 0 else (b, a), seed * GAME_SEED_STRIDE + game // 2)
+        turns += length
+        if winner is None:
+            draws += 1
+        elif winner == a_seat:
+            wins += 1
+        else:
+            losses += 1
+    return spec_a, spec_b, wins, draws, losses, turns
+
+
+def run_matches(specs, games_per_pair=1000, seed=0, workers=None, chunk_size=100, board_size=5):
+    """所有策略两两对弈 games_per_pair 局，返回 {(A, B): [A 胜, 平, A 负, 总回合数]} 和每秒对局数"""
+    specs = list(dict.fromkeys(specs))
+    for spec in specs:
+        make_policy(spec)  # 在派发任务之前检查策略描述和文件
+    workers = workers or os.cpu_count()
+    tasks = [(a, b, seed, range(start, min(start + chunk_size, games_per_pair)), board_size)
+             for a, b in combinations(specs, 2) for start in range(0, games_per_pair, chunk_size)]
+    results = {pair: [0, 0, 0, 0] for pair in combinations(specs, 2)}
+
+    total = games_per_pair * len(results)
+    done = 0
+    start = time.perf_counter()
+    pool = mp.Pool(workers) if workers > 1 else None
+    try:
+        outcomes = pool.imap_unordered(play_games, tasks) if pool else map(play_games, tasks)
+        for spec_a, spec_b, wins, draws, losses, turns in outcomes:
+            counts = results[spec_a, spec_b]
+            for i, value in enumerate((wins, draws, losses, turns)):
+                counts[i] += value
+            done += wins + draws + losses
+            print(f"\r已完成 {done}/{total} 局", end="", file=sys.stderr, flush=True)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    print(file=sys.stderr)
+    return results, done / (time.perf_counter() - start)
+
+
+def fit_elo(num_players, first, second, games, points, prior=1.0, iterations=500):
+    """Bradley-Terry 模型的极大似然 Elo（平局算半局胜），用 MM 迭代求解
+
+    first/second 为每组对局双方的编号，points 为 first 的得分，可以带一个前导的批次维（自助法样本）。
+    每组对局额外加 prior 局虚拟平局，保证全胜或全负的策略也有有限的等级分。
+    """
+    points = np.atleast_2d(points) + prior / 2
+    games = np.asarray(games, dtype=np.float64) + prior
+    incidence_first = np.eye(num_players)[first]  # [对局组, 玩家]
+    incidence_second = np.eye(num_players)[second]
+    score = points @ incidence_first + (games - points) @ incidence_second  # [批次, 玩家]
+    strength = np.ones((points.shape[0], num_players))
+    for _ in range(iterations):
+        pair = games / (strength[:, first] + strength[:, second])
+        strength = score / (pair @ incidence_first + pair @ incidence_second)
+        strength /= np.exp(np.log(strength).mean(axis=1, keepdims=True))
+    return 400 * np.log10(strength)
+
+
+def summarize(results, anchor="random", bootstrap=1000, seed=0):
+    """汇总对局结果：每个策略的 Elo（以 anchor 为 0，没有时以平均值为 0）与 95% 置信区间、胜/平/负和平均回合数
+
+    置信区间由参数化自助法得到：按每组对局的胜/平/负比例重新抽样，再重新拟合 Elo。
+    """
+    specs = list(dict.fromkeys(spec for pair in results for spec in pair))
+    index = {spec: i for i, spec in enumerate(specs)}
+    pairs = list(results)
+    first = np.array([index[a] for a, _ in pairs])
+    second = np.array([index[b] for _, b in pairs])
+    wdl = np.array([results[pair][:3] for pair in pairs], dtype=np.float64)
+    games = wdl.sum(axis=1)
+
+    rng = np.random.default_rng(seed)
+    samples = np.stack([rng.multinomial(int(n), row / n, size=bootstrap) if n else np.zeros((bootstrap, 3))
+                        for n, row in zip(games, wdl)], axis=1)  # [样本, 对局组, 3]
+    points = np.vstack([wdl[:, 0] + wdl[:, 1] / 2, samples[..., 0] + samples[..., 1] / 2])
+    ratings = fit_elo(len(specs), first, second, games, points)
+    ratings -= ratings[:, [index[anchor]]] if anchor in index else ratings.mean(axis=1, keepdims=True)
+    low, high = np.percentile(ratings[1:], [2.5, 97.5], axis=0)
+
+    players = []
+    for spec, i in index.items():
+        wins = draws = losses = turns = 0
+        for (a, b), (w, d, l, t) in results.items():
+            if a == spec:
+                wins, draws, losses, turns = wins + w, draws + d, losses + l, turns + t
+            elif b == spec:
+                wins, draws, losses, turns = wins + l, draws + d, losses + w, turns + t
+        played = wins + draws + losses
+        players.append({"policy": spec, "elo": float(ratings[0, i]), "ci_low": float(low[i]), "ci_high": float(high[i]),
+                        "win": wins, "draw": draws, "loss": losses,
+                        "score": (wins + draws / 2) / played if played else 0.0,
+                        "avg_turns": turns / played if played else 0.0})
+    players.sort(key=lambda p: -p["elo"])
+    matches = [{"a": a, "b": b, "win": w, "draw": d, "loss": l, "avg_turns": t / (w + d + l) if w + d + l else 0.0}
+               for (a, b), (w, d, l, t) in results.items()]
+    return {"players": players, "matches": matches, "ratings": ratings[1:], "index": index}
+
+
+def gate(summary, candidate, baseline, margin=0.0):
+    """candidate 比 baseline 高出 margin 分以上（自助法差值的 2.5% 分位数）时返回 True"""
+    index = summary["index"]
+    diff = summary["ratings"][:, index[candidate]] - summary["ratings"][:, index[baseline]]
+    return float(np.percentile(diff, 2.5)) > margin
+
+
+def print_summary(summary):
+    print(f"{'策略':<24}{'Elo':>8}{'95%置信区间':>20}{'胜/平/负':>20}{'得分率':>8}{'平均回合':>8}")
+    for p in summary["players"]:
+        interval = f"[{p['ci_low']:.0f}, {p['ci_high']:.0f}]"
+        record = f"{p['win']}/{p['draw']}/{p['loss']}"
+        print(f"{p['policy']:<24}{p['elo']:>8.0f}{interval:>20}{record:>20}{p['score']:>8.1%}{p['avg_turns']:>8.1f}")
+    print()
+    for m in summary["matches"]:
+        print(f"{m['a']} vs {m['b']}：{m['win']}-{m['draw']}-{m['loss']}，平均 {m['avg_turns']:.1f} 回合")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="策略对战场：多进程循环赛，报告胜/平/负、Elo 与置信区间")
+    parser.add_argument("policies", nargs="*", default=["random", "greedy", "q:agent1_q_table", "q:agent2_q_table"],
+                        help=f"策略描述，类型可选 {', '.join(POLICIES)}，例如 q:agent1_q_table linear search:50")
+    parser.add_argument("--games", type=int, default=1000, help="每对策略的对局数（先后手各半）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=100, help="每个任务的对局数")
+    parser.add_argument("--anchor", default="random", help="Elo 为 0 的参照策略")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--gate", nargs=2, metavar=("CANDIDATE", "BASELINE"),
+                        help="CANDIDATE 没有显著强于 BASELINE 时以状态码 1 退出")
+    parser.add_argument("--margin", type=float, default=0.0, help="--gate 要求的最小 Elo 差")
+    args = parser.parse_args()
+    if args.gate:
+        missing = [name for name in args.gate if name not in args.policies]
+        if missing:
+            parser.error(f"--gate 中的 {', '.join(missing)} 不在参赛策略中：{' '.join(args.policies)}")
+
+    results, rate = run_matches(args.policies, args.games, args.seed, args.workers, args.chunk_size)
+    summary = summarize(results, args.anchor, seed=args.seed)
+    print_summary(summary)
+    print(f"{rate:.0f} 局/秒，{args.workers} 个进程")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "games_per_sec": rate, "players": summary["players"],
+                       "matches": summary["matches"]}, f, indent=2, ensure_ascii=False)
+    if args.gate:
+        passed = gate(summary, *args.gate, args.margin)
+        print(f"{args.gate[0]} {'通过' if passed else '未通过'}对 {args.gate[1]} 的检验")
+        sys.exit(0 if passed else 1)
@@ -0,0 +1,249 @@
+import time
+import numpy as np
+from engine import PIECE_SET, PIECE_VALUES, PIECE_RANK
+from piece import Piece
+from utils import CAPTURE_MATRIX, DIRECTIONS
+from zobrist import PIECE_NAMES, PIECE_STATES, zobrist_table
+
+
+ACTIONS = ["flip", "move", "capture", "skip"]
+FLIP, MOVE, CAPTURE, SKIP = range(len(ACTIONS))
+KING = PIECE_NAMES.index("king")
+
+
+def neighbor_table(size):
+    """每个格子上下左右四个方向的相邻格子编号，越界为 -1"""
+    table = np.full((size * size, len(DIRECTIONS)), -1, dtype=np.int64)
+    for row in range(size):
+        for col in range(size):
+            for d, (dr, dc) in enumerate(DIRECTIONS):
+                nr, nc = row + dr, col + dc
+                if 0 <= nr < size and 0 <= nc < size:
+                    table[row * size + col, d] = nr * size + nc
+    return table
+
+
+class BatchedGameEnv:
+    """用堆叠的 NumPy 数组同时推进 N 局对弈，规则与 GameEngine / QLearningAgent.get_valid_actions 一致
+
+    每局棋盘按格子展平为长度 size*size 的行：piece_type（棋子类型编号）、owner（玩家，空格为 -1）、
+    revealed（是否翻开）、alive（格子上是否有存活棋子）。
+    """
+
+    def __init__(self, num_games, size=5, max_skip_turns=50, max_turns=100, seed=None):
+        self.num_games = num_games
+        self.size = size
+        self.cells = size * size
+        self.max_skip_turns = max_skip_turns
+        self.max_turns = max_turns
+        self.rng = np.random.default_rng(seed)
+
+        self.neighbors = neighbor_table(size)
+        self.on_board = self.neighbors >= 0
+        self.safe_neighbors = np.where(self.on_board, self.neighbors, 0)  # 越界方向用 0 占位，再由 on_board 屏蔽
+        self.capture_matrix = np.array(CAPTURE_MATRIX, dtype=bool)
+        self.piece_values = np.array([PIECE_VALUES[name] for name in PIECE_NAMES], dtype=np.float64)
+        self.piece_rank = np.array([PIECE_RANK[name] for name in PIECE_NAMES], dtype=np.int8)
+        self.start_types = np.array([PIECE_NAMES.index(name) for name in PIECE_SET] * 2, dtype=np.int8)
+        self.start_owners = np.repeat(np.array([0, 1], dtype=np.int8), len(PIECE_SET))
+        center = (size // 2) * size + size // 2
+        self.free_cells = np.array([cell for cell in range(self.cells) if cell != center])
+
+        table = zobrist_table(size)
+        self.zobrist = np.array([[[[table[cell][(name, player, state)] for state in PIECE_STATES]
+                                   for player in (0, 1)] for name in PIECE_NAMES]
+                                 for cell in range(self.cells)], dtype=np.int64)
+
+        self.piece_type = np.zeros((num_games, self.cells), dtype=np.int8)
+        self.owner = np.full((num_games, self.cells), -1, dtype=np.int8)
+        self.revealed = np.zeros((num_games, self.cells), dtype=bool)
+        self.alive = np.zeros((num_games, self.cells), dtype=bool)
+        self.current_player = np.zeros(num_games, dtype=np.int8)
+        self.skip_turns = np.zeros((num_games, 2), dtype=np.int32)
+        self.total_turns = np.zeros(num_games, dtype=np.int32)
+        self.done = np.zeros(num_games, dtype=bool)
+        self.winner = np.full(num_games, -1, dtype=np.int8)  # 结束且为 -1 表示平局
+        self.reset()
+
+    def reset(self, games=None):
+        """重新布子；games 为需要重置的对局编号，默认全部"""
+        games = np.arange(self.num_games) if games is None else np.asarray(games)
+        rows = games[:, None]
+        order = np.argsort(self.rng.random((len(games), len(self.free_cells))), axis=1)
+        cells = self.free_cells[order]  # 第 i 枚棋子放在 cells[:, i]
+
+        self.piece_type[games] = 0
+        self.owner[games] = -1
+        self.revealed[games] = False
+        self.alive[games] = False
+        self.piece_type[rows, cells] = self.start_types
+        self.owner[rows, cells] = self.start_owners
+        self.alive[rows, cells] = True
+
+        self.current_player[games] = 0
+        self.skip_turns[games] = 0
+        self.total_turns[games] = 0
+        self.done[games] = False
+        self.winner[games] = -1
+
+    def move_masks(self):
+        """返回 (moves, captures)，形状均为 (N, cells, 4)：当前玩家每个棋子每个方向能否移动/击杀"""
+        player = self.current_player[:, None, None]
+        nb = self.safe_neighbors
+        source = (self.alive & self.revealed & (self.owner == self.current_player[:, None]))[:, :, None]
+        target_alive = self.alive[:, nb]
+        capturable = (target_alive & self.revealed[:, nb] & (self.owner[:, nb] != player)
+                      & self.capture_matrix[self.piece_type[:, :, None], self.piece_type[:, nb]])
+        moves = source & self.on_board & (~target_alive | capturable)
+        return moves, moves & target_alive
+
+    def action_mask(self):
+        """(N, 4) 合法抽象动作掩码，与 QLearningAgent.get_valid_actions 相同"""
+        moves, captures = self.move_masks()
+        mask = np.zeros((self.num_games, len(ACTIONS)), dtype=bool)
+        mask[:, FLIP] = (self.alive & ~self.revealed & (self.owner == self.current_player[:, None])).any(axis=1)
+        mask[:, MOVE] = moves.any(axis=(1, 2))
+        mask[:, CAPTURE] = captures.any(axis=(1, 2))
+        mask[:, SKIP] = ~mask[:, :SKIP].any(axis=1)
+        return mask
+
+    def random_choice(self, mask):
+        """在最后一维的可选项中均匀随机选一个"""
+        return np.where(mask, self.rng.random(mask.shape), -1.0).argmax(axis=-1)
+
+    def step(self, actions):
+        """所有未结束的对局同时执行一个抽象动作并结束回合，返回 (rewards, done)"""
+        actions = np.asarray(actions)
+        games = np.arange(self.num_games)
+        player = self.current_player.astype(np.int64)
+        active = ~self.done
+        rewards = np.zeros(self.num_games)
+        moves, captures = self.move_masks()
+
+        # 翻子：双方的未知棋子都可以翻
+        unknown = self.alive & ~self.revealed
+        do_flip = active & (actions == FLIP) & unknown.any(axis=1)
+        flip_games = games[do_flip]
+        self.revealed[flip_games, self.random_choice(unknown[do_flip])] = True
+        rewards[do_flip] = 1
+
+        # 移动：先随机选一枚能动的棋子，再随机选方向；击杀：在所有击杀走法中随机选
+        movable = moves.any(axis=2)
+        do_move = active & (actions == MOVE) & movable.any(axis=1)
+        move_games = games[do_move]
+        move_src = self.random_choice(movable[do_move])
+        move_dir = self.random_choice(moves[move_games, move_src])
+
+        do_capture = active & (actions == CAPTURE) & captures.any(axis=(1, 2))
+        capture_games = games[do_capture]
+        capture_flat = self.random_choice(captures[do_capture].reshape(-1, self.cells * len(DIRECTIONS)))
+        capture_src, capture_dir = np.divmod(capture_flat, len(DIRECTIONS))
+
+        g = np.concatenate([move_games, capture_games])
+        src = np.concatenate([move_src, capture_src])
+        dst = self.neighbors[src, np.concatenate([move_dir, capture_dir])]
+        captured = self.alive[g, dst]
+        rewards[g] = np.where(captured, self.piece_values[self.piece_type[g, dst]], -0.1)
+        self.piece_type[g, dst] = self.piece_type[g, src]
+        self.owner[g, dst] = self.owner[g, src]
+        self.revealed[g, dst] = True
+        self.alive[g, dst] = True
+        self.owner[g, src] = -1
+        self.revealed[g, src] = False
+        self.alive[g, src] = False
+
+        # 跳过：累计连续跳过次数；其他有效动作清零
+        do_skip = active & (actions == SKIP)
+        self.skip_turns[games[do_skip], player[do_skip]] += 1
+        rewards[do_skip] = -1
+        acted = do_flip | do_move | do_capture
+        self.skip_turns[games[acted], player[acted]] = 0
+
+        # 结束回合
+        self.total_turns[active] += 1
+        self.check_game_over(active)
+        switch = active & ~self.done
+        self.current_player[switch] = 1 - self.current_player[switch]
+        return rewards, self.done.copy()
+
+    def check_game_over(self, active):
+        """按 GameEngine.check_game_over 的顺序判定所有对局的胜负"""
+        undecided = active.copy()
+
+        def decide(condition, winner):
+            selected = undecided & condition
+            self.winner[selected] = winner[selected] if isinstance(winner, np.ndarray) else winner
+            self.done |= selected
+            undecided[selected] = False
+
+        kings = self.alive & (self.piece_type == KING)
+        decide(~(kings & (self.owner == 0)).any(axis=1), 1)
+        decide(~(kings & (self.owner == 1)).any(axis=1), 0)
+        decide(self.skip_turns[:, 0] > self.max_skip_turns, 1)
+        decide(self.skip_turns[:, 1] > self.max_skip_turns, 0)
+
+        games = np.arange(self.num_games)
+        first = self.alive.argmax(axis=1)
+        last = self.cells - 1 - self.alive[:, ::-1].argmax(axis=1)
+        first_rank = self.piece_rank[self.piece_type[games, first]]
+        last_rank = self.piece_rank[self.piece_type[games, last]]
+        higher = np.where(first_rank > last_rank, self.owner[games, first], self.owner[games, last])
+        two_left = self.alive.sum(axis=1) == 2
+        decide(two_left & (first_rank != last_rank), higher)
+        decide(two_left, -1)
+
+        if self.max_turns is not None:
+            decide(self.total_turns > self.max_turns, -1)
+
+    def state_keys(self):
+        """所有对局的 Zobrist 哈希，与 GameEngine.state_key / QLearningAgent.get_state 相同"""
+        components = self.zobrist[np.arange(self.cells), self.piece_type,
+                                  np.maximum(self.owner, 0), self.revealed.astype(np.int8)]
+        return np.bitwise_xor.reduce(np.where(self.alive, components, 0), axis=1)
+
+    def board(self, game):
+        """把第 game 局转换为 Piece 二维列表，供按对象工作的代码使用"""
+        grid = [[None for _ in range(self.size)] for _ in range(self.size)]
+        for cell in np.flatnonzero(self.alive[game]):
+            state = "known" if self.revealed[game, cell] else "unknown"
+            piece = Piece(PIECE_NAMES[self.piece_type[game, cell]], int(self.owner[game, cell]), state,
+                          int(self.revealed[game, cell]), 1)
+            grid[cell // self.size][cell % self.size] = piece
+        return grid
+
+
+def random_rollouts(num_games=1024, steps=200, seed=0):
+    """用随机合法动作推进批量对局，结束的对局自动重开，返回每秒状态转移数"""
+    env = BatchedGameEnv(num_games, seed=seed)
+    transitions = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        actions = env.random_choice(env.action_mask())
+        transitions += int((~env.done).sum())
+        env.step(actions)
+        if env.done.any():
+            env.reset(np.flatnonzero(env.done))
+    return transitions / (time.perf_counter() - start)
+
+
+def agent_rollouts(agent, num_games=1024, steps=200, seed=0):
+    """批量对局中由 agent.choose_actions 一次为所有对局选动作（双方共用同一个智能体），返回每秒状态转移数"""
+    env = BatchedGameEnv(num_games, seed=seed)
+    transitions = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        actions = agent.choose_actions(env.state_keys(), env.action_mask(), env.rng)
+        transitions += int((~env.done).sum())
+        env.step(actions)
+        if env.done.any():
+            env.reset(np.flatnonzero(env.done))
+    return transitions / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    from ai import QLearningAgent
+
+    print(f"批量随机对弈：{random_rollouts():.0f} 次状态转移/秒")
+    agent = QLearningAgent(epsilon=0.1)
+    agent.load_q_table("agent1_q_table")
+    print(f"批量 Q 表对弈（choose_actions）：{agent_rollouts(agent):.0f} 次状态转移/秒")
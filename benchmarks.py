@@ -0,0 +1,371 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+import numpy as np
+from ai import QLearningAgent
+from board import Board
+from compact_board import BoardSnapshots, CompactBoard
+from engine import GameEngine
+from piece import Piece
+from train import play_game
+from utils import PIECE_TYPES, can_capture
+
+
+BENCHMARKS = {}  # 名称 -> 函数(config) -> 结果字典
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def time_call(func, number, repeat=5):
+    """重复 repeat 轮、每轮调用 number 次，返回最快一轮的单次耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def micro_result(seconds, number):
+    return {"us_per_call": seconds * 1e6, "calls": number}
+
+
+@contextmanager
+def data_copy():
+    """在临时目录中放一份 data 文件夹的副本，CSV 读写不会改动仓库里的 Q 表"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copytree(DATA_DIR, os.path.join(tmp, "data"))
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(cwd)
+
+
+def sample_positions(count, seed):
+    """用固定种子的随机对局采样局面，返回 (棋盘, 当前玩家) 列表"""
+    rng = random.Random(seed)
+    engine = GameEngine()
+    positions = []
+    while len(positions) < count:
+        engine.reset()
+        engine.setup_pieces(rng)
+        while not engine.game_over and len(positions) < count:
+            board = [[Piece(p.name, p.player, p.state, p.check, p.alive) if p else None for p in row]
+                     for row in engine.board]
+            positions.append((board, engine.current_player))
+            engine.apply_action(rng.choice(["flip", "flip", "move", "capture"]), rng)
+            engine.end_turn()
+    return positions
+
+
+@benchmark("micro.get_state")
+def bench_get_state(config):
+    agent = QLearningAgent()
+    positions = sample_positions(200, config["seed"])
+    number = config["scale"] * 2
+    seconds = time_call(lambda: [agent.get_state(board) for board, _ in positions], number) / len(positions)
+    return micro_result(seconds, number * len(positions))
+
+
+@benchmark("micro.get_valid_actions")
+def bench_get_valid_actions(config):
+    agent = QLearningAgent()
+    positions = sample_positions(200, config["seed"])
+    number = config["scale"]
+    seconds = time_call(lambda: [agent.get_valid_actions(board, player) for board, player in positions],
+                        number) / len(positions)
+    return micro_result(seconds, number * len(positions))
+
+
+@benchmark("micro.get_valid_moves")
+def bench_get_valid_moves(config):
+    agent = QLearningAgent()
+    cells = [(board, r, c) for board, _ in sample_positions(200, config["seed"])
+             for r in range(5) for c in range(5) if board[r][c] and board[r][c].state == "known"]
+    number = config["scale"] * 2
+    seconds = time_call(lambda: [agent.get_valid_moves(board, r, c) for board, r, c in cells], number) / len(cells)
+    return micro_result(seconds, number * len(cells))
+
+
+@benchmark("micro.choose_actions")
+def bench_choose_actions(config):
+    positions = sample_positions(1000, config["seed"])
+    with data_copy():
+        agent = QLearningAgent(epsilon=0.1)
+        agent.load_q_table_from_csv("agent1_q_table.csv")
+    states = [agent.get_state(board) for board, _ in positions]
+    masks = agent.action_masks([board for board, _ in positions], [player for _, player in positions])
+    keys = np.array(states, dtype=np.int64)
+    number = config["scale"] // 10 or 1
+    single = time_call(lambda: [agent.choose_action(state, board, player)
+                                for state, (board, player) in zip(states, positions)], number) / len(states)
+    batch = time_call(lambda: agent.choose_actions(keys, masks), number * 10) / len(states)
+    return {"single_us": single * 1e6, "batch_us": batch * 1e6, "states": len(states)}
+
+
+@benchmark("micro.can_capture")
+def bench_can_capture(config):
+    pairs = [(a, d) for a in PIECE_TYPES for d in PIECE_TYPES]
+    number = config["scale"] * 40
+    seconds = time_call(lambda: [can_capture(a, d) for a, d in pairs], number) / len(pairs)
+    return micro_result(seconds, number * len(pairs))
+
+
+@benchmark("micro.board_copy")
+def bench_board_copy(config):
+    boards = [board for board, _ in sample_positions(200, config["seed"])]
+    compact = [CompactBoard.from_board(board) for board in boards]
+    number = config["scale"] // 2 or 1
+    objects = time_call(lambda: [[[Piece(p.name, p.player, p.state, p.check, p.alive) if p else None for p in row]
+                                  for row in board] for board in boards], number) / len(boards)
+    cells = time_call(lambda: [board.copy() for board in compact], number) / len(boards)
+    snapshots = BoardSnapshots(capacity=len(compact))
+    for board in compact:
+        snapshots.append(board)
+    keys = time_call(snapshots.state_keys, number) / len(boards)
+    return {"objects_us": objects * 1e6, "compact_us": cells * 1e6, "snapshot_keys_us": keys * 1e6,
+            "snapshot_bytes": snapshots.data.itemsize * snapshots.data.shape[1]}
+
+
+@benchmark("micro.update_q_table")
+def bench_update_q_table(config):
+    rng = random.Random(config["seed"])
+    with data_copy():
+        agent = QLearningAgent()
+        agent.load_q_table_from_csv("agent1_q_table.csv")
+    states = list(agent.q_table)
+    transitions = [(rng.choice(states), rng.choice(["flip", "move", "capture", "skip"]), rng.uniform(-1, 20),
+                    rng.choice(states)) for _ in range(1000)]
+    number = config["scale"] // 2 or 1
+    seconds = time_call(lambda: [agent.update_q_table(*t) for t in transitions], number) / len(transitions)
+    return micro_result(seconds, number * len(transitions))
+
+
+@benchmark("persistence.csv")
+def bench_csv(config):
+    with data_copy():
+        agent = QLearningAgent()
+        load = time_call(lambda: agent.load_q_table_from_csv("agent1_q_table.csv"), 1, repeat=3)
+        save = time_call(lambda: agent.save_q_table_as_csv("agent1_q_table.csv"), 1, repeat=3)
+    return {"states": len(agent.q_table), "load_ms": load * 1000, "save_ms": save * 1000}
+
+
+@benchmark("e2e.self_play")
+def bench_self_play(config):
+    rng = random.Random(config["seed"])
+    engine = GameEngine()
+    agents = [QLearningAgent(), QLearningAgent()]
+    num_games = config["scale"] * 5
+    turns = 0
+    start = time.perf_counter()
+    for _ in range(num_games):
+        play_game(engine, agents, rng)
+        turns += engine.total_turns
+    elapsed = time.perf_counter() - start
+    return {"games": num_games, "games_per_sec": num_games / elapsed, "turns_per_sec": turns / elapsed}
+
+
+@benchmark("e2e.server_sessions")
+def bench_server_sessions(config):
+    """在线程池中并发对弈多个 AI 对 AI 会话，双方共享同一个 Q 表策略；Q 表的状态数必须保持不变"""
+    from concurrent.futures import ThreadPoolExecutor
+    from arena import GAME_SEED_STRIDE
+    from game_server import Session, session_policy
+
+    def play(session):
+        while session.ai_to_move():
+            session.ai_turn()
+        return session.engine.total_turns
+
+    num_sessions = config["scale"] * 2
+    with data_copy():
+        q_table = session_policy("q").agent.q_table
+        states = len(q_table)
+        sessions = [Session(i, "ai", "q", seed=config["seed"] * GAME_SEED_STRIDE + i) for i in range(num_sessions)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        turns = sum(executor.map(play, sessions))
+    elapsed = time.perf_counter() - start
+    if len(q_table) != states:
+        raise RuntimeError(f"服务端 Q 表在 {num_sessions} 个会话中从 {states} 个状态变为 {len(q_table)} 个")
+    return {"sessions": num_sessions, "sessions_per_sec": num_sessions / elapsed, "turns_per_sec": turns / elapsed,
+            "q_states": states}
+
+
+class CountingCanvas:
+    """无显示环境下代替 tk.Canvas：只记录画布操作次数，用来测量 Board 自身的刷新开销"""
+
+    def __init__(self):
+        self.operations = 0
+        self.next_item = 0
+
+    def create_image(self, *args, **kwargs):
+        self.operations += 1
+        self.next_item += 1
+        return self.next_item
+
+    def itemconfig(self, *args, **kwargs):
+        self.operations += 1
+
+    def move(self, *args):
+        self.operations += 1
+
+    def delete(self, *args):
+        self.operations += 1
+
+
+class NamedSprites:
+    def piece(self, piece):
+        return "hide" if piece.state == "unknown" else f"{piece.name}_{piece.player}"
+
+    def background(self):
+        return "background"
+
+
+def replay_frames(board, seed, num_games):
+    """在 Board 上重放随机对局，返回 (帧数, 每帧耗时)"""
+    rng = random.Random(seed)
+    engine = GameEngine()
+    frames = 0
+    elapsed = 0.0
+    for _ in range(num_games):
+        engine.reset()
+        engine.setup_pieces(rng)
+        board.board = engine.board
+        board.redraw()
+        while not engine.game_over:
+            engine.apply_action(rng.choice(["flip", "move", "capture"]), rng)
+            start = time.perf_counter()
+            board.show_action(engine.last_action)
+            if hasattr(board.canvas, "update_idletasks"):
+                board.canvas.update_idletasks()
+            elapsed += time.perf_counter() - start
+            frames += 1
+            engine.end_turn()
+    return frames, elapsed / frames
+
+
+@benchmark("e2e.board_redraw")
+def bench_board_redraw(config):
+    board = Board(None, 5, is_training=True)
+    board.canvas = CountingCanvas()
+    board.sprites = NamedSprites()
+    num_games = max(1, config["scale"] // 10)
+    frames, per_frame = replay_frames(board, config["seed"], num_games)
+    result = {"frames": frames, "headless_ms_per_frame": per_frame * 1000,
+              "canvas_ops_per_frame": board.canvas.operations / frames}
+
+    # 有显示环境时再测一次真实 Tk 画布
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        result["tk_ms_per_frame"] = None
+        result["tk_skipped"] = str(e)
+        return result
+    try:
+        root.withdraw()
+        _, tk_per_frame = replay_frames(Board(root, 5), config["seed"], num_games)
+        result["tk_ms_per_frame"] = tk_per_frame * 1000
+    finally:
+        root.destroy()
+    return result
+
+
+HEAVY_MODULES = ("numpy", "pandas", "PIL")
+
+
+def import_time(module, repeat=3):
+    """在新的解释器中用 -X importtime 导入 module，返回 (最快一次的累计导入耗时（微秒）, 被导入的重量级依赖)"""
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    best = float("inf")
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        for line in proc.stderr.splitlines():
+            # 格式为 "import time: 自身 | 累计 | 模块名"，顶层模块没有缩进
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2] == " " + module:
+                best = min(best, int(fields[1]))
+    return best, [m for m in proc.stdout.strip().split(",") if m]
+
+
+@benchmark("startup.import")
+def bench_import(config):
+    result = {}
+    for module in ("test", "game", "main"):
+        us, heavy = import_time(module)
+        result[f"{module}_ms"] = us / 1000
+        result[f"{module}_heavy"] = heavy
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(names=None, seed=0, scale=100):
+    """运行选中的基准测试，返回可写入 JSON 的结果"""
+    config = {"seed": seed, "scale": scale}
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if names and not any(name.startswith(prefix) for prefix in names):
+            continue
+        random.seed(seed)
+        results[name] = func(config)
+        print(f"{name}: {results[name]}")
+    return {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+            "config": config, "results": results}
+
+
+def compare(old_path, new_path):
+    """对比两次运行的 JSON 结果（数值为 新/旧 的比例）"""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    for name, metrics in new["results"].items():
+        for metric, value in metrics.items():
+            before = old["results"].get(name, {}).get(metric)
+            if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+                print(f"{name}.{metric}: {before:.4g} -> {value:.4g} ({value / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="引擎、智能体与持久化热路径的基准测试")
+    parser.add_argument("--output", default="benchmark_results.json", help="结果 JSON 文件")
+    parser.add_argument("--only", nargs="*", help="只运行以这些前缀开头的基准，例如 micro e2e.self_play")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=int, default=100, help="迭代次数倍数，越大越稳定")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="对比两次运行的结果后退出")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        report = run_benchmarks(args.only, args.seed, args.scale)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"结果已保存到 {args.output}")
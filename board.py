@@ -1,76 +1,136 @@
-import tkinter as tk
-from PIL import Image, ImageTk, ImageEnhance
-
-
-class Board:
-    def __init__(self, root=None, size=5, is_training=False):
-        self.size = size
-        self.cell_size = 400 // size
-        self.board = [[None for _ in range(size)] for _ in range(size)]
-        self.piece_photos = {}  # 用于存储所有棋子图片的引用
-
-        if not is_training:  # 如果不是训练模式，初始化界面
-            self.root = root
-            self.canvas = tk.Canvas(root, width=400, height=400)
-            self.canvas.grid(row=2, column=0, columnspan=2)  # 固定棋盘位置
-            self.draw_board()
-        else:
-            self.root = None
-            self.canvas = None
-
-    def draw_board(self):
-        # 加载棋盘背景图片
-        image_path = "images/board_background.png"
-        self.board_image = Image.open(image_path)
-        self.board_image = self.board_image.resize((400, 400), Image.LANCZOS)
-        enhancer = ImageEnhance.Brightness(self.board_image)
-        self.board_image = enhancer.enhance(0.5) #调透明度
-        self.board_photo = ImageTk.PhotoImage(self.board_image)
-        self.canvas.create_image(0, 0, anchor="nw", image=self.board_photo)
-
-    def draw_piece(self, row, col, piece):
-        x1, y1 = col * self.cell_size, row * self.cell_size
-
-        # 根据棋子状态加载图片
-        if piece.state == "unknown":
-            image_path = f"images/hide.png"
-        else:
-            image_path = f"images/{piece.name}_{piece.player}.png"
-
-        # 加载图片并调整大小
-        piece_image = Image.open(image_path)
-        piece_image = piece_image.resize((self.cell_size, self.cell_size), Image.LANCZOS) 
-        piece_photo = ImageTk.PhotoImage(piece_image)
-
-        # 将图片对象存储在字典中，防止被垃圾回收
-        self.piece_photos[(row, col)] = piece_photo
-
-        # 在Canvas上显示棋子图片
-        self.canvas.create_image(x1, y1, anchor="nw", image=piece_photo)
-
-    def place_piece(self, row, col, piece):
-        self.board[row][col] = piece
-        self.draw_piece(row, col, piece)
-
-    def get_piece(self, row, col):
-        return self.board[row][col]
-
-    def move_piece(self, from_row, from_col, to_row, to_col):
-        piece = self.board[from_row][from_col]
-        self.board[from_row][from_col] = None
-        self.board[to_row][to_col] = piece
-        self.canvas.delete("all")
-        self.draw_board()
-        for r in range(self.size):
-            for c in range(self.size):
-                if self.board[r][c]:
-                    self.draw_piece(r, c, self.board[r][c])
-
-    def update_draw_piece(self, row, col, piece):
-        self.board[row][col].check = 1
-        self.canvas.delete("all")
-        self.draw_board()
-        for r in range(self.size):
-            for c in range(self.size):
-                if self.board[r][c]:
-                    self.draw_piece(r, c, self.board[r][c])
\ No newline at end of file
+import tkinter as tk
+
+
+class SpriteCache:
+    """按 cell_size 缓存缩放好的棋子图片和调暗的棋盘背景，每张图片只解码、缩放一次
+
+    PIL 在第一次加载图片时才导入，训练模式和还没开始游戏的窗口不需要它。
+    """
+
+    def __init__(self, root, cell_size, board_pixels=400):
+        self.root = root
+        self.cell_size = cell_size
+        self.board_pixels = board_pixels
+        self.photos = {}  # 图片名 -> PhotoImage，同时保存引用防止被垃圾回收
+        self.background_photo = None
+
+    def background(self):
+        if self.background_photo is None:
+            from PIL import Image, ImageTk, ImageEnhance
+
+            board_image = Image.open("images/board_background.png")
+            board_image = board_image.resize((self.board_pixels, self.board_pixels), Image.LANCZOS)
+            board_image = ImageEnhance.Brightness(board_image).enhance(0.5)  # 调透明度
+            self.background_photo = ImageTk.PhotoImage(board_image, master=self.root)
+        return self.background_photo
+
+    def piece(self, piece):
+        # 根据棋子状态选择图片
+        name = "hide" if piece.state == "unknown" else f"{piece.name}_{piece.player}"
+        photo = self.photos.get(name)
+        if photo is None:
+            from PIL import Image, ImageTk
+
+            piece_image = Image.open(f"images/{name}.png")
+            piece_image = piece_image.resize((self.cell_size, self.cell_size), Image.LANCZOS)
+            photo = self.photos[name] = ImageTk.PhotoImage(piece_image, master=self.root)
+        return photo
+
+
+_sprite_caches = {}
+
+
+def get_sprite_cache(root, cell_size):
+    """同一个窗口、同一格子大小的棋盘共用一份图片缓存"""
+    key = (root, cell_size)
+    if key not in _sprite_caches:
+        _sprite_caches[key] = SpriteCache(root, cell_size)
+    return _sprite_caches[key]
+
+
+class Board:
+    def __init__(self, root=None, size=5, is_training=False):
+        self.size = size
+        self.cell_size = 400 // size
+        self.board = [[None for _ in range(size)] for _ in range(size)]
+        self.cell_items = [[None for _ in range(size)] for _ in range(size)]  # 每个格子对应的画布图片项
+        self.cell_photos = [[None for _ in range(size)] for _ in range(size)]  # 每个格子当前显示的图片
+
+        if not is_training:  # 如果不是训练模式，初始化界面
+            self.root = root
+            self.sprites = get_sprite_cache(root, self.cell_size)
+            self.canvas = tk.Canvas(root, width=400, height=400)
+            self.canvas.grid(row=2, column=0, columnspan=2)  # 固定棋盘位置
+            self.draw_board()
+        else:
+            self.root = None
+            self.sprites = None
+            self.canvas = None
+
+    def draw_board(self):
+        # 棋盘背景只在第一次使用时加载，并且只创建一次画布项
+        self.canvas.create_image(0, 0, anchor="nw", image=self.sprites.background())
+
+    def draw_piece(self, row, col, piece):
+        """显示格子上的棋子：已有画布项时只替换图片，图片未变化时不做任何操作"""
+        photo = self.sprites.piece(piece)
+        item = self.cell_items[row][col]
+        if item is None:
+            x1, y1 = col * self.cell_size, row * self.cell_size
+            self.cell_items[row][col] = self.canvas.create_image(x1, y1, anchor="nw", image=photo)
+        elif self.cell_photos[row][col] is not photo:
+            self.canvas.itemconfig(item, image=photo)
+        self.cell_photos[row][col] = photo
+
+    def clear_cell(self, row, col):
+        item = self.cell_items[row][col]
+        if item is not None:
+            self.canvas.delete(item)
+            self.cell_items[row][col] = None
+            self.cell_photos[row][col] = None
+
+    def place_piece(self, row, col, piece):
+        self.board[row][col] = piece
+        self.draw_piece(row, col, piece)
+
+    def get_piece(self, row, col):
+        return self.board[row][col]
+
+    def redraw(self):
+        """让画布与棋盘数据一致，只改动显示内容发生变化的格子"""
+        for r in range(self.size):
+            for c in range(self.size):
+                if self.board[r][c]:
+                    self.draw_piece(r, c, self.board[r][c])
+                else:
+                    self.clear_cell(r, c)
+
+    def move_item(self, from_row, from_col, to_row, to_col):
+        """把起点格子的画布项移动到终点，终点原有的（被击杀的）棋子图片被删除"""
+        self.clear_cell(to_row, to_col)
+        item = self.cell_items[from_row][from_col]
+        self.canvas.move(item, (to_col - from_col) * self.cell_size, (to_row - from_row) * self.cell_size)
+        self.cell_items[to_row][to_col], self.cell_items[from_row][from_col] = item, None
+        self.cell_photos[to_row][to_col], self.cell_photos[from_row][from_col] = self.cell_photos[from_row][from_col], None
+        self.draw_piece(to_row, to_col, self.board[to_row][to_col])
+
+    def show_action(self, action):
+        """根据 GameEngine.last_action 只刷新涉及的格子"""
+        if action is None or action[0] == "skip":
+            return
+        if action[0] == "flip":
+            row, col = action[1]
+            self.draw_piece(row, col, action[2])
+        else:
+            (from_row, from_col), (to_row, to_col) = action[1], action[2]
+            self.move_item(from_row, from_col, to_row, to_col)
+
+    def move_piece(self, from_row, from_col, to_row, to_col):
+        piece = self.board[from_row][from_col]
+        self.board[from_row][from_col] = None
+        self.board[to_row][to_col] = piece
+        self.move_item(from_row, from_col, to_row, to_col)
+
+    def update_draw_piece(self, row, col, piece):
+        self.board[row][col].check = 1
+        self.draw_piece(row, col, piece)
\ No newline at end of file
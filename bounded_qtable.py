@@ -0,0 +1,106 @@
+import heapq
+from collections import OrderedDict
+
+
+def evict_lru(table, count):
+    """最久未使用的条目"""
+    victims = []
+    for state in table.rows:
+        if len(victims) == count:
+            break
+        victims.append(state)
+    return victims
+
+
+def evict_lowest_visits(table, count):
+    """访问次数最少的条目，次数相同时按最久未使用"""
+    return [state for _, _, state in heapq.nsmallest(
+        count, ((table.visits.get(state, 0), order, state) for order, state in enumerate(table.rows)))]
+
+
+def evict_zero_values(table, count):
+    """仍然全部为默认值 0 的条目优先，不够时再按最久未使用补足"""
+    victims = [state for state, row in table.rows.items() if not any(row.values())][:count]
+    if len(victims) < count:
+        chosen = set(victims)
+        for state in table.rows:
+            if len(victims) == count:
+                break
+            if state not in chosen:
+                victims.append(state)
+    return victims
+
+
+EVICTION_POLICIES = {"lru": evict_lru, "visits": evict_lowest_visits, "zero": evict_zero_values}
+
+
+class BoundedQTable:
+    """容量有限的 Q 表，接口与 QLearningAgent.q_table 使用的字典相同
+
+    写入新状态且已满时，按淘汰策略一次淘汰 evict_fraction * capacity 个条目（分摊扫描开销），
+    并统计命中率与淘汰数量。policy 可以是 EVICTION_POLICIES 中的名字，或 (table, count) -> 状态列表 的函数。
+    """
+
+    def __init__(self, capacity, policy="lru", evict_fraction=0.05):
+        self.capacity = capacity
+        self.policy = EVICTION_POLICIES[policy] if isinstance(policy, str) else policy
+        self.evict_batch = max(1, int(capacity * evict_fraction))
+        self.rows = OrderedDict()  # 按最近使用顺序排列
+        self.visits = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, state):
+        if state in self.rows:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def __getitem__(self, state):
+        row = self.rows[state]
+        self.rows.move_to_end(state)
+        self.visits[state] = self.visits.get(state, 0) + 1
+        return row
+
+    def __setitem__(self, state, row):
+        if state not in self.rows and len(self.rows) >= self.capacity:
+            self.evict(min(self.evict_batch, len(self.rows)))
+        self.rows[state] = row
+        self.rows.move_to_end(state)
+
+    def evict(self, count):
+        for state in self.policy(self, count):
+            del self.rows[state]
+            self.visits.pop(state, None)
+            self.evictions += 1
+
+    def get(self, state, default=None):
+        return self[state] if state in self.rows else default
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def keys(self):
+        return self.rows.keys()
+
+    def values(self):
+        return self.rows.values()
+
+    def items(self):
+        return self.rows.items()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.rows),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
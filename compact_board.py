@@ -0,0 +1,152 @@
+import numpy as np
+from piece import Piece
+from utils import PIECE_TYPES
+from zobrist import zobrist_table
+
+
+# 每个格子一个字节：0 为空格，否则为 ((类型 + 1) << 2) | (玩家 << 1) | 是否翻开，最低位即翻开标记
+EMPTY = 0
+NUM_CODES = (len(PIECE_TYPES) + 1) << 2
+CODE_TYPE = [(code >> 2) - 1 for code in range(NUM_CODES)]
+CODE_OWNER = [(code >> 1) & 1 if code >= 4 else -1 for code in range(NUM_CODES)]
+_code_zobrist = {}
+
+
+def encode(type_id, player, known):
+    return ((type_id + 1) << 2) | (player << 1) | known
+
+
+def piece_code(piece):
+    """Piece（或 None）对应的格子编码"""
+    if not piece:
+        return EMPTY
+    return encode(piece.type_id, piece.player, 1 if piece.state == "known" else 0)
+
+
+def code_piece(code):
+    """格子编码对应的新 Piece 对象，空格返回 None"""
+    if not code:
+        return None
+    known = code & 1
+    return Piece(PIECE_TYPES[CODE_TYPE[code]], CODE_OWNER[code], "known" if known else "unknown", known, 1)
+
+
+def code_zobrist(size):
+    """按编码索引的 Zobrist 表 [格子数, NUM_CODES]（uint64，空格为 0），与 zobrist.zobrist_table 的取值相同"""
+    if size not in _code_zobrist:
+        table = np.zeros((size * size, NUM_CODES), dtype=np.uint64)
+        for cell, entries in enumerate(zobrist_table(size)):
+            for (name, player, state), value in entries.items():
+                table[cell, encode(PIECE_TYPES.index(name), player, 1 if state == "known" else 0)] = value
+        _code_zobrist[size] = table
+    return _code_zobrist[size]
+
+
+class CompactBoard:
+    """用 bytearray 保存的棋盘，每个格子一个字节的编码
+
+    复制、比较和序列化都是对一段连续内存的操作，array() 返回零拷贝的 NumPy 视图以便向量化扫描；
+    需要 Piece 对象的代码可以用 board[row, col] 或 to_board() 按需生成。
+    """
+
+    __slots__ = ("size", "cells")
+
+    def __init__(self, size=5, cells=None):
+        self.size = size
+        self.cells = bytearray(size * size) if cells is None else bytearray(cells)
+
+    @classmethod
+    def from_board(cls, board):
+        """从 Piece 对象组成的二维列表（GameEngine.board / Board.board）构造"""
+        return cls(len(board), [piece_code(piece) for row in board for piece in row])
+
+    @classmethod
+    def from_engine(cls, engine):
+        return cls.from_board(engine.board)
+
+    def to_board(self):
+        """还原为 Piece 对象组成的二维列表（每次都生成新对象）"""
+        size = self.size
+        return [[code_piece(self.cells[row * size + col]) for col in range(size)] for row in range(size)]
+
+    def code(self, row, col):
+        return self.cells[row * self.size + col]
+
+    def __getitem__(self, position):
+        row, col = position
+        return code_piece(self.cells[row * self.size + col])
+
+    def __setitem__(self, position, piece):
+        row, col = position
+        self.cells[row * self.size + col] = piece_code(piece)
+
+    def copy(self):
+        return CompactBoard(self.size, self.cells)
+
+    def __eq__(self, other):
+        return isinstance(other, CompactBoard) and self.cells == other.cells
+
+    __hash__ = None  # 可变对象；需要作为字典键时用 key()
+
+    def key(self):
+        """不可变的字节串，可以作为字典键或集合元素"""
+        return bytes(self.cells)
+
+    def array(self):
+        """零拷贝的 [size, size] uint8 视图，修改会直接反映到棋盘上"""
+        return np.frombuffer(self.cells, dtype=np.uint8).reshape(self.size, self.size)
+
+    def state_key(self):
+        """棋盘的 Zobrist 哈希，与 GameEngine.state_key / zobrist.hash_board 相同"""
+        codes = np.frombuffer(self.cells, dtype=np.uint8)
+        components = code_zobrist(self.size)[np.arange(len(codes)), codes]
+        return int(np.bitwise_xor.reduce(components))
+
+    def counts(self):
+        """返回 (存活数, 未翻开数)，都是按玩家编号的长度 2 数组"""
+        codes = np.frombuffer(self.cells, dtype=np.uint8)
+        pieces = codes[codes != EMPTY]
+        owner = (pieces >> 1) & 1
+        live = np.bincount(owner, minlength=2)
+        unknown = np.bincount(owner[(pieces & 1) == 0], minlength=2)
+        return live, unknown
+
+
+class BoardSnapshots:
+    """大量棋盘快照按行存放在一个 [容量, 格子数] 的 uint8 数组中，每个快照只占 size * size 字节
+
+    容量不够时按倍数扩容；state_keys() 一次算出所有快照的 Zobrist 哈希。
+    """
+
+    def __init__(self, size=5, capacity=1024):
+        self.size = size
+        self.data = np.zeros((capacity, size * size), dtype=np.uint8)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, board):
+        """追加一个快照：CompactBoard、Piece 二维列表或 GameEngine"""
+        if not isinstance(board, CompactBoard):
+            board = CompactBoard.from_board(getattr(board, "board", board))
+        if self.count == len(self.data):
+            self.data = np.concatenate([self.data, np.zeros_like(self.data)])
+        self.data[self.count] = np.frombuffer(board.cells, dtype=np.uint8)
+        self.count += 1
+        return self.count - 1
+
+    def __getitem__(self, index):
+        if not -self.count <= index < self.count:
+            raise IndexError(index)
+        return CompactBoard(self.size, self.data[index % self.count].tobytes())
+
+    def array(self):
+        """已保存快照的 [数量, 格子数] 视图"""
+        return self.data[:self.count]
+
+    def state_keys(self):
+        """所有快照的 Zobrist 哈希（int64 数组）"""
+        codes = self.array()
+        components = code_zobrist(self.size)[np.arange(codes.shape[1]), codes]
+        return np.bitwise_xor.reduce(components, axis=1).astype(np.int64)
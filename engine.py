@@ -0,0 +1,258 @@
+import random
+from piece import Piece
+from utils import CAPTURE_MATRIX, neighbor_cells
+from zobrist import piece_key
+from symmetry import NUM_SYMMETRIES, symmetry_piece_keys, canonical_from_keys
+
+
+PIECE_SET = ["farmer"] * 4 + ["soilder"] * 4 + ["archer"] * 2 + ["knight"] + ["king"]
+PIECE_VALUES = {"farmer": 1, "soilder": 2, "archer": 3, "knight": 4, "king": 20}  # 棋子价值表（击杀奖励）
+PIECE_RANK = {"farmer": 1, "soilder": 2, "archer": 3, "knight": 4, "king": 5}  # 残局比较用的等级
+
+
+class GameEngine:
+    """不依赖 tkinter / PIL 的纯规则引擎：布子、翻子、移动/击杀、跳过计数与胜负判定"""
+
+    def __init__(self, size=5, max_skip_turns=50, max_turns=100):
+        self.size = size
+        self.max_skip_turns = max_skip_turns  # 连续跳过超过该次数判负
+        self.max_turns = max_turns  # 总回合数超过该值判平局
+        self.neighbors = neighbor_cells(size)  # 预先计算的相邻格子表
+        self.reset()
+
+    def reset(self):
+        """清空棋盘并重置回合状态"""
+        self.board = [[None for _ in range(self.size)] for _ in range(self.size)]
+        self.current_player = 0
+        self.skip_turns = {0: 0, 1: 0}  # 每个玩家连续跳过的回合数
+        self.total_turns = 0
+        self.game_over = False
+        self.winner = None  # 0 蓝方，1 红方，None 平局或未结束
+        self.end_reason = ""
+        self.last_action = None  # 最近一次动作，供界面显示
+        self.state_key = 0  # 棋盘的 Zobrist 哈希，随落子/翻子/移动增量更新，可直接作为 Q 表的键
+        self.symmetry_keys = [0] * (2 * NUM_SYMMETRIES)  # 8 种对称变换 × 是否交换颜色下的哈希
+        # 随落子/翻子/移动/击杀增量维护的索引与计数，状态检查无需扫描整个棋盘
+        self.positions = {0: {}, 1: {}}  # 每个玩家：存活棋子 -> (row, col)
+        self.live_count = {0: 0, 1: 0}
+        self.unknown_count = {0: 0, 1: 0}
+        self.king_alive = {0: False, 1: False}
+
+    def setup_pieces(self, rng=random):
+        """随机初始化棋子，中心格留空"""
+        blue_pieces = [Piece(name, 0, "unknown", 0, 1) for name in PIECE_SET]
+        red_pieces = [Piece(name, 1, "unknown", 0, 1) for name in PIECE_SET]
+        all_pieces = blue_pieces + red_pieces
+        rng.shuffle(all_pieces)
+
+        center = (self.size // 2, self.size // 2)
+        available_positions = [(row, col) for row in range(self.size)
+                               for col in range(self.size) if (row, col) != center]
+        rng.shuffle(available_positions)
+
+        for i, piece in enumerate(all_pieces):
+            row, col = available_positions[i]
+            self.place_piece(row, col, piece)
+
+    def get_piece(self, row, col):
+        return self.board[row][col]
+
+    def place_piece(self, row, col, piece):
+        old_piece = self.board[row][col]
+        if old_piece:
+            self.toggle_key(row, col, old_piece)
+            self.remove_from_index(old_piece)
+        self.board[row][col] = piece
+        if piece:
+            self.toggle_key(row, col, piece)
+            self.positions[piece.player][piece] = (row, col)
+            self.live_count[piece.player] += 1
+            if piece.state == "unknown":
+                self.unknown_count[piece.player] += 1
+            if piece.name == "king":
+                self.king_alive[piece.player] = True
+
+    def toggle_key(self, row, col, piece):
+        """把棋子在某格的哈希分量异或进（或移出）state_key 与各对称哈希"""
+        self.state_key ^= piece_key(self.size, row, col, piece)
+        parts = symmetry_piece_keys(self.size, row, col, piece)
+        self.symmetry_keys = [key ^ part for key, part in zip(self.symmetry_keys, parts)]
+
+    def canonical_key(self, player=None):
+        """对称与颜色交换下的规范化哈希，以 player（默认当前玩家）为己方，双方可共用一张 Q 表"""
+        return canonical_from_keys(self.symmetry_keys, self.current_player if player is None else player)
+
+    def remove_from_index(self, piece):
+        del self.positions[piece.player][piece]
+        self.live_count[piece.player] -= 1
+        if piece.state == "unknown":
+            self.unknown_count[piece.player] -= 1
+        if piece.name == "king":
+            self.king_alive[piece.player] = False
+
+    def flip_piece(self, row, col):
+        """翻开棋子，双方的未知棋子都可以翻"""
+        piece = self.board[row][col]
+        if piece and piece.state == "unknown":
+            self.toggle_key(row, col, piece)
+            piece.state = "known"
+            self.toggle_key(row, col, piece)
+            piece.check = 1
+            self.unknown_count[piece.player] -= 1
+            self.skip_turns[self.current_player] = 0
+            self.last_action = ("flip", (row, col), piece)
+            return 1  # 成功翻开棋子的奖励
+        return 0  # 未翻开棋子的奖励
+
+    def move_piece(self, from_row, from_col, to_row, to_col):
+        """移动当前玩家的已知棋子，目标为敌方棋子时击杀"""
+        piece = self.board[from_row][from_col]
+        if not piece or piece.player != self.current_player:
+            return -1  # 无效移动的奖励
+        if (to_row, to_col) not in self.get_valid_moves(from_row, from_col):
+            return -1
+
+        target_piece = self.board[to_row][to_col]
+        if target_piece:
+            target_piece.alive = 0
+            self.toggle_key(to_row, to_col, target_piece)
+            self.remove_from_index(target_piece)
+            reward = PIECE_VALUES[target_piece.name]
+        else:
+            reward = -0.1
+        self.toggle_key(from_row, from_col, piece)
+        self.toggle_key(to_row, to_col, piece)
+        self.board[from_row][from_col] = None
+        self.board[to_row][to_col] = piece
+        self.positions[piece.player][piece] = (to_row, to_col)
+        self.skip_turns[self.current_player] = 0
+        self.last_action = ("move", (from_row, from_col), (to_row, to_col), piece, target_piece)
+        return reward
+
+    def skip_turn(self):
+        """跳过回合"""
+        self.skip_turns[self.current_player] += 1
+        self.last_action = ("skip", self.current_player)
+        return -1  # 跳过回合的惩罚
+
+    def get_valid_moves(self, row, col):
+        """获取已知棋子的合法移动位置：空位或可击杀的已知敌方棋子"""
+        moves = []
+        piece = self.board[row][col]
+        if not piece or piece.state != "known":
+            return moves
+
+        capture_row = CAPTURE_MATRIX[piece.type_id]
+        for nr, nc in self.neighbors[row][col]:
+            target_piece = self.board[nr][nc]
+            if not target_piece:
+                moves.append((nr, nc))
+            elif target_piece.player != piece.player and target_piece.state == "known":
+                if capture_row[target_piece.type_id]:
+                    moves.append((nr, nc))
+        return moves
+
+    def unknown_cells(self):
+        return [position for player in (0, 1) for piece, position in self.positions[player].items()
+                if piece.state == "unknown"]
+
+    def movable_cells(self, player=None):
+        """当前玩家（或指定玩家）可以移动的已知棋子位置"""
+        if player is None:
+            player = self.current_player
+        return [(r, c) for piece, (r, c) in self.positions[player].items()
+                if piece.state == "known" and self.get_valid_moves(r, c)]
+
+    def capture_moves(self, player=None):
+        """当前玩家（或指定玩家）所有的击杀走法 (from_row, from_col, to_row, to_col)"""
+        if player is None:
+            player = self.current_player
+        captures = []
+        for r, c in self.movable_cells(player):
+            for nr, nc in self.get_valid_moves(r, c):
+                if self.board[nr][nc]:
+                    captures.append((r, c, nr, nc))
+        return captures
+
+    def has_valid_actions(self, player=None):
+        """检查是否还有可翻开或可移动的棋子"""
+        if self.unknown_count[0] or self.unknown_count[1]:
+            return True
+        if player is None:
+            player = self.current_player
+        return any(piece.state == "known" and self.get_valid_moves(r, c)
+                   for piece, (r, c) in self.positions[player].items())
+
+    def apply_action(self, action, rng=random):
+        """执行智能体选择的抽象动作（flip/move/capture/skip），返回奖励"""
+        if action == "flip":
+            unknown = self.unknown_cells()
+            if unknown:
+                return self.flip_piece(*rng.choice(unknown))
+        elif action == "move":
+            movable = self.movable_cells()
+            if movable:
+                from_row, from_col = rng.choice(movable)
+                to_row, to_col = rng.choice(self.get_valid_moves(from_row, from_col))
+                return self.move_piece(from_row, from_col, to_row, to_col)
+        elif action == "capture":
+            captures = self.capture_moves()
+            if captures:
+                return self.move_piece(*rng.choice(captures))
+        elif action == "skip":
+            return self.skip_turn()
+        self.last_action = None
+        return 0
+
+    def describe_last_action(self, who, reward=None):
+        """把最近一次动作转换为界面显示的文字"""
+        suffix = "" if reward is None else f"，奖励：{reward}"
+        action = self.last_action
+        if action is None:
+            return f"{who}无可用行动{suffix}"
+        if action[0] == "flip":
+            return f"{who}翻开了棋子：{action[2].name}{suffix}"
+        if action[0] == "skip":
+            return f"{who}跳过回合{suffix}"
+        piece, target_piece = action[3], action[4]
+        if target_piece:
+            return f"{who}的{piece.name}击杀了{target_piece.name}{suffix}"
+        return f"{who}移动了{piece.name}{suffix}"
+
+    def end_turn(self):
+        """结束当前回合：判定胜负，未结束则交换玩家"""
+        self.total_turns += 1
+        if not self.check_game_over():
+            self.current_player = 1 - self.current_player
+        return self.game_over
+
+    def finish(self, winner, reason):
+        self.game_over = True
+        self.winner = winner
+        self.end_reason = reason
+        return True
+
+    def check_game_over(self):
+        """检查游戏是否结束：国王被击杀、连续跳过过多、只剩两子、回合数超限"""
+        if not self.king_alive[0]:
+            return self.finish(1, "蓝方国王被击杀，红方获胜")
+        if not self.king_alive[1]:
+            return self.finish(0, "红方国王被击杀，蓝方获胜")
+
+        if self.skip_turns[0] > self.max_skip_turns:
+            return self.finish(1, "蓝方连续跳过回合过多，红方获胜")
+        if self.skip_turns[1] > self.max_skip_turns:
+            return self.finish(0, "红方连续跳过回合过多，蓝方获胜")
+
+        if self.live_count[0] + self.live_count[1] == 2:
+            piece1, piece2 = list(self.positions[0]) + list(self.positions[1])
+            if PIECE_RANK[piece1.name] > PIECE_RANK[piece2.name]:
+                return self.finish(piece1.player, "只剩两枚棋子，等级高的一方获胜")
+            if PIECE_RANK[piece1.name] < PIECE_RANK[piece2.name]:
+                return self.finish(piece2.player, "只剩两枚棋子，等级高的一方获胜")
+            return self.finish(None, "平局：剩余棋子等级相同")
+
+        if self.max_turns is not None and self.total_turns > self.max_turns:
+            return self.finish(None, f"总回合数超过{self.max_turns}，平局")
+
+        return False
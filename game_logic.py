@@ -1,202 +1,184 @@
-import tkinter as tk
-from tkinter import messagebox
-import random
-from board import Board
-from piece import Piece
-from utils import can_capture
-
-
-class GameManager:
-    def __init__(self, root, update_wins_callback):
-        self.root = root
-        self.update_wins = update_wins_callback
-        self.board_size = 5
-        self.current_player = 0
-        self.players = ["蓝方", "红方"]
-        self.unknown_pieces = {"蓝方": 12, "红方": 12}
-        self.king_status = {"蓝方": True, "红方": True}
-        self.selected_piece = None
-        self.skip_turn_count = {"蓝方": 0, "红方": 0}
-        self.total_turns = 0
-        self.game_started = False
-
-        # 初始化棋盘
-        self.board = Board(self.root, self.board_size)
-        self.turn_label = tk.Label(self.root, text="当前回合：蓝方", font=("Arial", 14))
-        self.turn_label.grid(row=3, column=0, columnspan=2)  # 固定回合标签位置
-
-        # 绑定点击事件到棋盘
-        self.board.canvas.bind("<Button-1>", self.on_click)
-
-    def reset_game(self):
-        self.current_player = 0
-        self.total_turns = 0
-        self.selected_piece = None
-        self.game_started = True
-        self.board.canvas.delete("all")
-        self.board = Board(self.root, self.board_size)
-        self.board.canvas.bind("<Button-1>", self.on_click)  # 确保事件重新绑定
-        self.setup_board()
-        self.update_turn_label()
-
-    def setup_board(self):
-        pieces = ["farmer"] * 4 + ["soilder"] * 4 + ["archer"] * 2 + ["knight"] + ["king"]
-        blue_pieces = [Piece(piece, 0, "unknown", 0, 1) for piece in pieces]
-        red_pieces = [Piece(piece, 1, "unknown", 0, 1) for piece in pieces]
-        all_pieces = blue_pieces + red_pieces
-        random.shuffle(all_pieces)
-
-        available_positions = [(row, col) for row in range(self.board_size)
-                                for col in range(self.board_size) if (row, col) != (2, 2)]
-        random.shuffle(available_positions)
-
-        for i, piece in enumerate(all_pieces):
-            row, col = available_positions[i]
-            self.board.place_piece(row, col, piece)
-
-    def update_turn_label(self):
-        self.turn_label.config(text=f"当前回合：{self.players[self.current_player]}")
-
-    def switch_player(self):
-        self.current_player = 1 - self.current_player
-        self.update_turn_label()
-
-    def on_click(self, event):
-        if not self.game_started:
-            return
-
-        cell_size = 400 // self.board_size
-        row, col = event.y // cell_size, event.x // cell_size
-
-        if self.selected_piece:
-            from_row, from_col = self.selected_piece
-            self.move_piece((from_row, from_col), (row, col))
-            self.selected_piece = None
-        else:
-            piece = self.board.get_piece(row, col)
-            if piece:
-                if piece.player == self.current_player:
-                    if piece.state == "unknown":
-                        piece.state = "known"
-                        self.board.update_draw_piece(row, col, piece)
-                        self.check_game_status()
-                        self.switch_player()
-                    elif piece.state == "known" and piece.check == 1:
-                        self.selected_piece = (row, col)
-                else:
-                    if piece.state == "unknown":
-                        piece.state = "known"
-                        self.board.update_draw_piece(row, col, piece)
-                        self.check_game_status()
-                        self.switch_player()
-                    else:
-                        messagebox.showinfo("提示", "不能移动对手的已知棋子")
-            else:
-                messagebox.showinfo("提示", "目标位置为空，不能移动到此位置")
-
-    def move_piece(self, from_pos, to_pos):
-        from_row, from_col = from_pos
-        to_row, to_col = to_pos
-
-        if abs(from_row - to_row) + abs(from_col - to_col) != 1:
-            messagebox.showerror("无效移动", "棋子只能移动一格")
-            return
-
-        from_piece = self.board.get_piece(from_row, from_col)
-        to_piece = self.board.get_piece(to_row, to_col)
-
-        if not to_piece:
-            self.board.move_piece(from_row, from_col, to_row, to_col)
-            messagebox.showinfo("移动", f"移动 {from_piece.name} 到 ({to_row}, {to_col})")
-            self.switch_player()
-        elif to_piece and to_piece.player != from_piece.player and can_capture(from_piece.name, to_piece.name):
-            self.board.get_piece(to_row, to_col).alive = 0
-            self.board.move_piece(from_row, from_col, to_row, to_col)
-            messagebox.showinfo("捕获", f"{from_piece.name} 捕获了 {to_piece.name}")
-            self.check_game_status()
-            self.switch_player()
-        else:
-            messagebox.showerror("无效移动", f"{from_piece.name} 无法捕获 {to_piece.name}")
-
-    def check_game_status(self):
-        blue_king_alive = any(piece.name == "king" and piece.alive == 1 and piece.player == 0 for row in self.board.board for piece in row if piece)
-        red_king_alive = any(piece.name == "king" and piece.alive == 1 and piece.player == 1 for row in self.board.board for piece in row if piece)
-
-        if not blue_king_alive:
-            messagebox.showinfo("Game Over", "蓝方国王被击杀，红方获胜！")
-            self.update_wins("红方")
-            self.end_game()
-        elif not red_king_alive:
-            messagebox.showinfo("Game Over", "红方国王被击杀，蓝方获胜！")
-            self.update_wins("蓝方")
-            self.end_game()
-        else:
-            self.check_skip_turn()
-            self.check_remaining_pieces()
-            self.check_total_turns()
-
-    def check_skip_turn(self):
-        player_pieces = [piece for row in self.board.board for piece in row if piece and piece.player == self.current_player]
-        known_pieces = [piece for piece in player_pieces if piece.state == "known"]
-        unknown_pieces = [piece for piece in player_pieces if piece.state == "unknown"]
-
-        can_flip = len(unknown_pieces) > 0
-        can_move = False
-
-        for piece in known_pieces:
-            for row in range(self.board_size):
-                for col in range(self.board_size):
-                    if self.board.get_piece(row, col) is piece:
-                        break
-                else:
-                    continue
-                break
-
-            for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                to_row, to_col = row + dr, col + dc
-                if 0 <= to_row < self.board_size and 0 <= to_col < self.board_size:
-                    to_piece = self.board.get_piece(to_row, to_col)
-                    if not to_piece or (to_piece and to_piece.player != piece.player and can_capture(piece.name, to_piece.name)):
-                        can_move = True
-                        break
-            if can_move:
-                break
-
-        if not can_flip and not can_move:
-            self.skip_turn_count[self.players[self.current_player]] += 1
-            messagebox.showinfo("提示", f"无可用行动，自动跳过")
-            self.switch_player()
-        else:
-            self.skip_turn_count[self.players[self.current_player]] = 0
-
-        if self.skip_turn_count[self.players[self.current_player]] >= 5:
-            messagebox.showinfo("游戏结束", f"{self.players[self.current_player]}连续5回合跳过，判负！")
-            winner = "红方" if self.current_player == 0 else "蓝方"
-            self.update_wins(winner)
-            self.end_game()
-
-    def check_remaining_pieces(self):
-        remaining_pieces = [piece for row in self.board.board for piece in row if piece and piece.alive == 1]
-        if len(remaining_pieces) == 2:
-            piece1, piece2 = remaining_pieces
-            piece_rank = {"farmer": 1, "soilder": 2, "archer": 3, "knight": 4, "king": 5}
-            if piece_rank[piece1.name] > piece_rank[piece2.name]:
-                winner = self.players[piece1.player]
-            elif piece_rank[piece1.name] < piece_rank[piece2.name]:
-                winner = self.players[piece2.player]
-            else:
-                winner = "平局"
-            messagebox.showinfo("游戏结束", f"游戏结束，{winner}！")
-            if winner != "平局":
-                self.update_wins(winner)
-            self.end_game()
-
-    def check_total_turns(self):
-        self.total_turns += 1
-        if self.total_turns > 100:
-            messagebox.showinfo("游戏结束", "总回合数超过100，平局！")
-            self.end_game()
-
-    def end_game(self):
-        self.game_started = False
+import copy
+import tkinter as tk
+from tkinter import messagebox
+from concurrent.futures import ThreadPoolExecutor
+from board import Board
+from engine import GameEngine
+from profiling import timers
+
+
+class GameManager:
+    AI_POLL_INTERVAL = 50  # 轮询搜索结果的间隔（毫秒）
+
+    def __init__(self, root, update_wins_callback, search_budget=500):
+        self.root = root
+        self.update_wins = update_wins_callback
+        self.board_size = 5
+        self.players = ["蓝方", "红方"]
+        self.selected_piece = None
+        self.game_started = False
+        self.engine = GameEngine(self.board_size, max_skip_turns=4)  # 连续5回合跳过判负
+        self.ai_player = None  # 由搜索 AI 控制的一方，None 为双人对战
+        self.search_budget = search_budget
+        self.searcher = None  # 第一次人机对战时才创建（连带导入 NumPy），双人对战不需要
+        self.executor = ThreadPoolExecutor(max_workers=1)  # 搜索在后台线程中进行，界面保持响应
+        self.ai_poll_id = None
+        self.generation = 0  # 每次 reset_game 递增，上一局还没算完的搜索结果会被丢弃
+
+        # 初始化棋盘
+        self.board = Board(self.root, self.board_size)
+        self.turn_label = tk.Label(self.root, text="当前回合：蓝方", font=("Arial", 14))
+        self.turn_label.grid(row=3, column=0, columnspan=2)  # 固定回合标签位置
+
+        # 绑定点击事件到棋盘
+        self.board.canvas.bind("<Button-1>", self.on_click)
+
+    @property
+    def current_player(self):
+        return self.engine.current_player
+
+    def reset_game(self, ai_player=None):
+        self.cancel_ai_turn()
+        self.generation += 1
+        self.ai_player = ai_player
+        if ai_player is not None and self.searcher is None:
+            from search import SearchAgent
+            self.searcher = SearchAgent(self.search_budget)
+        self.selected_piece = None
+        self.game_started = True
+        self.setup_board()
+        self.update_turn_label()
+        if self.current_player == self.ai_player:
+            self.start_ai_turn()
+
+    def setup_board(self):
+        self.engine.reset()
+        self.engine.setup_pieces()
+        self.board.board = self.engine.board
+        self.board.redraw()
+
+    def update_turn_label(self):
+        self.turn_label.config(text=f"当前回合：{self.players[self.current_player]}")
+
+    def on_click(self, event):
+        if not self.game_started or self.current_player == self.ai_player:
+            return
+
+        cell_size = self.board.cell_size
+        row, col = event.y // cell_size, event.x // cell_size
+        if not (0 <= row < self.board_size and 0 <= col < self.board_size):
+            return
+
+        if self.selected_piece:
+            from_row, from_col = self.selected_piece
+            self.selected_piece = None
+            self.move_piece((from_row, from_col), (row, col))
+        else:
+            piece = self.engine.get_piece(row, col)
+            if piece:
+                if piece.state == "unknown":
+                    # 双方的未知棋子都可以翻开
+                    with timers.phase("apply"):
+                        self.engine.flip_piece(row, col)
+                    with timers.phase("render"):
+                        self.board.show_action(self.engine.last_action)
+                    self.end_turn()
+                elif piece.player == self.current_player:
+                    if piece.check == 1:
+                        self.selected_piece = (row, col)
+                else:
+                    messagebox.showinfo("提示", "不能移动对手的已知棋子")
+            else:
+                messagebox.showinfo("提示", "目标位置为空，不能移动到此位置")
+
+    def move_piece(self, from_pos, to_pos):
+        from_row, from_col = from_pos
+        to_row, to_col = to_pos
+
+        if abs(from_row - to_row) + abs(from_col - to_col) != 1:
+            messagebox.showerror("无效移动", "棋子只能移动一格")
+            return
+
+        from_piece = self.engine.get_piece(from_row, from_col)
+        to_piece = self.engine.get_piece(to_row, to_col)
+
+        with timers.phase("apply"):
+            reward = self.engine.move_piece(from_row, from_col, to_row, to_col)
+        if reward == -1:
+            if to_piece:
+                messagebox.showerror("无效移动", f"{from_piece.name} 无法捕获 {to_piece.name}")
+            else:
+                messagebox.showerror("无效移动", f"{from_piece.name} 无法移动到 ({to_row}, {to_col})")
+            return
+
+        with timers.phase("render"):
+            self.board.show_action(self.engine.last_action)
+        if to_piece:
+            messagebox.showinfo("捕获", f"{from_piece.name} 捕获了 {to_piece.name}")
+        else:
+            messagebox.showinfo("移动", f"移动 {from_piece.name} 到 ({to_row}, {to_col})")
+        self.end_turn()
+
+    def end_turn(self):
+        """结束回合：由规则引擎判定胜负，下一位玩家无子可动时自动跳过"""
+        with timers.phase("check"):
+            game_over = self.engine.end_turn()
+        if game_over:
+            self.show_result()
+            return
+        while not self.engine.has_valid_actions():
+            messagebox.showinfo("提示", f"{self.players[self.current_player]}无可用行动，自动跳过")
+            self.engine.skip_turn()
+            if self.engine.end_turn():
+                self.show_result()
+                return
+        self.update_turn_label()
+        if self.current_player == self.ai_player:
+            self.start_ai_turn()
+
+    def start_ai_turn(self):
+        """在后台线程中搜索 AI 的走法，主线程通过 after 轮询结果"""
+        self.turn_label.config(text=f"当前回合：{self.players[self.current_player]}（AI思考中）")
+        # 搜索在引擎的副本上进行：主线程随时可能重新开局并修改 self.engine
+        future = self.executor.submit(self.searcher.choose_move, copy.deepcopy(self.engine))
+        self.ai_poll_id = self.root.after(self.AI_POLL_INTERVAL, self.poll_ai_turn, future, self.generation)
+
+    def poll_ai_turn(self, future, generation):
+        from search import apply_move
+
+        self.ai_poll_id = None
+        if generation != self.generation:
+            return  # 搜索开始后已经重新开局
+        if not future.done():
+            self.ai_poll_id = self.root.after(self.AI_POLL_INTERVAL, self.poll_ai_turn, future, generation)
+            return
+        error = future.exception()
+        if error is not None:
+            # 搜索出错时结束本局并显示原因，而不是让棋盘一直停在“AI思考中”
+            self.end_game()
+            self.turn_label.config(text=f"AI出错：{error}")
+            return
+        with timers.phase("apply"):
+            apply_move(self.engine, future.result())
+        with timers.phase("render"):
+            self.board.show_action(self.engine.last_action)
+        self.end_turn()
+
+    def cancel_ai_turn(self):
+        if self.ai_poll_id is not None:
+            self.root.after_cancel(self.ai_poll_id)
+            self.ai_poll_id = None
+
+    def show_result(self):
+        winner = self.engine.winner
+        if winner is None:
+            messagebox.showinfo("游戏结束", f"{self.engine.end_reason}！")
+        else:
+            messagebox.showinfo("Game Over", f"{self.engine.end_reason}！")
+            self.update_wins(self.players[winner])
+        self.end_game()
+
+    def end_game(self):
+        self.cancel_ai_turn()
+        self.game_started = False
         self.turn_label.config(text="游戏结束")
\ No newline at end of file
@@ -0,0 +1,374 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from arena import get_policy, make_policy
+from compact_board import CompactBoard
+from engine import GameEngine
+from search import apply_move
+
+
+LATENCY_WINDOW = 10_000  # 每项延迟统计保留的最近样本数
+
+
+def latency_summary(samples):
+    """延迟样本（秒）的次数与 p50/p95/p99/最大值（毫秒）"""
+    if not samples:
+        return {"count": 0}
+    ms = np.fromiter(samples, dtype=np.float64, count=len(samples)) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"count": len(ms), "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "max_ms": float(ms.max())}
+
+
+_policy_lock = threading.Lock()  # 会话在线程池中创建，共享策略的缓存只能由一个线程填充
+
+
+def session_policy(spec):
+    """Q 表策略只读查表（QTablePolicy），与其他无状态策略一样在所有会话之间共享；
+    搜索 AI 的置换表按对局积累，每个会话单独创建"""
+    if spec.partition(":")[0] == "search":
+        return make_policy(spec)
+    with _policy_lock:
+        return get_policy(spec)
+
+
+def legal_moves(engine):
+    """当前玩家的具体走法：翻开任意未知棋子、移动己方已知棋子（包括击杀），都没有时只能跳过"""
+    moves = [{"type": "flip", "from": [r, c]} for r, c in sorted(engine.unknown_cells())]
+    for r, c in engine.movable_cells():
+        moves.extend({"type": "move", "from": [r, c], "to": [nr, nc]} for nr, nc in engine.get_valid_moves(r, c))
+    return moves or [{"type": "skip"}]
+
+
+def parse_move(move):
+    """把协议中的走法转换为 search.apply_move 接受的元组"""
+    if move.get("type") == "flip":
+        return ("flip", tuple(move["from"]))
+    if move.get("type") == "move":
+        return ("move", tuple(move["from"]), tuple(move["to"]))
+    if move.get("type") == "skip":
+        return ("skip",)
+    raise ValueError(f"未知的走法 {move}")
+
+
+class Session:
+    """一局对弈：human 模式下 human_player 一方由客户端走子，其余座位由 AI 策略走子"""
+
+    def __init__(self, session_id, mode="human", ai="q", human_player=0, seed=None, board_size=5):
+        self.id = session_id
+        self.mode = mode
+        self.human_player = human_player if mode == "human" else None
+        specs = ai if isinstance(ai, list) else [ai, ai]
+        self.policies = [None if seat == self.human_player else session_policy(specs[seat]) for seat in (0, 1)]
+        self.rng = random.Random(seed)
+        self.engine = GameEngine(board_size)
+        self.engine.setup_pieces(self.rng)
+        self.lock = asyncio.Lock()  # 同一会话的请求依次执行
+        self.request_latency = deque(maxlen=LATENCY_WINDOW)
+        self.ai_latency = deque(maxlen=LATENCY_WINDOW)
+
+    def ai_to_move(self):
+        return not self.engine.game_over and self.policies[self.engine.current_player] is not None
+
+    def ai_turn(self):
+        """在线程池中执行一个 AI 回合，返回动作描述"""
+        start = time.perf_counter()
+        engine = self.engine
+        who = "蓝方" if engine.current_player == 0 else "红方"
+        self.policies[engine.current_player].act(engine, self.rng)
+        text = engine.describe_last_action(who)
+        engine.end_turn()
+        self.ai_latency.append(time.perf_counter() - start)
+        return text
+
+    def human_turn(self, move):
+        engine = self.engine
+        if engine.game_over or engine.current_player != self.human_player:
+            raise ValueError("现在不是你的回合")
+        if move not in legal_moves(engine):
+            raise ValueError(f"不合法的走法 {move}")
+        apply_move(engine, parse_move(move))
+        text = engine.describe_last_action("玩家")
+        engine.end_turn()
+        return text
+
+    def state(self):
+        """可观测的局面：board 为每格编码（见 compact_board），未翻开的棋子统一为 -1"""
+        engine = self.engine
+        cells = CompactBoard.from_engine(engine).cells
+        state = {"session": self.id, "board": [code if code & 1 or not code else -1 for code in cells],
+                 "current_player": engine.current_player, "turn": engine.total_turns,
+                 "game_over": engine.game_over, "winner": engine.winner, "reason": engine.end_reason}
+        if not engine.game_over and engine.current_player == self.human_player:
+            state["legal"] = legal_moves(engine)
+        return state
+
+
+class GameServer:
+    """asyncio 多会话对局服务器，协议为每行一个 JSON 对象
+
+    请求 {"op": ..., "id": ...}，响应带回相同的 id 并包含 "ok"；同一连接上的请求并发处理，可能乱序返回。
+      new    {"mode": "human"|"ai", "ai": 策略或 [蓝方策略, 红方策略], "human_player": 0|1, "seed": 整数}
+      move   {"session": 会话号, "move": {"type": "flip"|"move"|"skip", "from": [r, c], "to": [r, c]}}
+      step   {"session": 会话号}  AI 对 AI 时走一个回合
+      state  {"session": 会话号}
+      stats  {"session": 会话号（可选）}
+      close  {"session": 会话号}
+    策略描述与 arena.py 相同。AI 走子在线程池中执行，慢的搜索不会阻塞事件循环里其他会话的请求。
+    """
+
+    def __init__(self, max_workers=8, board_size=5):
+        self.board_size = board_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.sessions = {}
+        self.next_id = itertools.count(1)
+        self.op_latency = {}  # 操作 -> 最近的处理延迟
+        self.started = time.perf_counter()
+        self.requests = 0
+
+    async def handle_connection(self, reader, writer):
+        opened = set()  # 本连接创建的会话，断开时一并关闭
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self.handle_line(line, writer, opened))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            for session_id in opened:
+                self.sessions.pop(session_id, None)
+            writer.close()
+
+    async def handle_line(self, line, writer, opened):
+        start = time.perf_counter()
+        request_id = None
+        op = "invalid"
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            op = request.get("op")
+            handler = getattr(self, f"op_{op}", None)
+            if handler is None:
+                raise ValueError(f"未知的操作 {op}")
+            response = await handler(request, opened)
+            response["ok"] = True
+        except Exception as e:  # 出错也要回复，否则客户端会一直等待这个 id
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        response["id"] = request_id
+        elapsed = time.perf_counter() - start
+        self.op_latency.setdefault(op, deque(maxlen=LATENCY_WINDOW)).append(elapsed)
+        self.requests += 1
+        session = self.sessions.get(response.get("session"))
+        if session is not None:
+            session.request_latency.append(elapsed)
+        try:
+            writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def get_session(self, request):
+        session = self.sessions.get(request.get("session"))
+        if session is None:
+            raise KeyError(f"会话 {request.get('session')} 不存在")
+        return session
+
+    async def run_ai(self, session):
+        """让 AI 一直走到轮到人类或对局结束，返回动作描述列表"""
+        loop = asyncio.get_running_loop()
+        events = []
+        while session.ai_to_move():
+            events.append(await loop.run_in_executor(self.executor, session.ai_turn))
+            if session.mode == "ai":
+                break  # AI 对 AI 时每次 step 只走一个回合
+        return events
+
+    async def op_new(self, request, opened):
+        mode = request.get("mode", "human")
+        if mode not in ("human", "ai"):
+            raise ValueError(f"未知的模式 {mode}")
+        # 第一次用到某个 Q 表策略时要从磁盘加载，放到线程池中创建会话，不阻塞其他连接
+        loop = asyncio.get_running_loop()
+        session = await loop.run_in_executor(self.executor, Session, next(self.next_id), mode, request.get("ai", "q"),
+                                             request.get("human_player", 0), request.get("seed"), self.board_size)
+        self.sessions[session.id] = session
+        opened.add(session.id)
+        async with session.lock:
+            events = await self.run_ai(session) if mode == "human" else []
+            return {"events": events, **session.state()}
+
+    async def op_move(self, request, opened):
+        session = self.get_session(request)
+        async with session.lock:
+            events = [session.human_turn(request["move"])]
+            events += await self.run_ai(session)
+            return {"events": events, **session.state()}
+
+    async def op_step(self, request, opened):
+        session = self.get_session(request)
+        async with session.lock:
+            if session.mode != "ai":
+                raise ValueError("只有 AI 对 AI 的会话可以 step")
+            return {"events": await self.run_ai(session), **session.state()}
+
+    async def op_state(self, request, opened):
+        return self.get_session(request).state()
+
+    async def op_close(self, request, opened):
+        session = self.get_session(request)
+        del self.sessions[session.id]
+        opened.discard(session.id)
+        return {"closed": session.id}
+
+    async def op_stats(self, request, opened):
+        if request.get("session") is not None:
+            session = self.get_session(request)
+            return {"session": session.id, "requests": latency_summary(session.request_latency),
+                    "ai_moves": latency_summary(session.ai_latency)}
+        ai_latency = [t for session in self.sessions.values() for t in session.ai_latency]
+        return {"sessions": len(self.sessions), "requests": self.requests,
+                "uptime_s": time.perf_counter() - self.started,
+                "ops": {op: latency_summary(samples) for op, samples in self.op_latency.items()},
+                "ai_moves": latency_summary(ai_latency)}
+
+    async def serve(self, host="127.0.0.1", port=8765, unix=None):
+        if unix:
+            server = await asyncio.start_unix_server(self.handle_connection, unix)
+            print(f"对局服务器监听 {unix}")
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            print(f"对局服务器监听 {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+class GameClient:
+    """协议客户端：同一连接上可以同时发出多个请求，按 id 匹配响应"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}
+        self.next_id = itertools.count(1)
+        self.listener = asyncio.create_task(self.listen())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765, unix=None):
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(unix)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def listen(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("连接已关闭"))
+
+    async def request(self, op, **fields):
+        """发送请求并等待响应，出错时抛出 RuntimeError"""
+        request_id = next(self.next_id)
+        future = self.pending[request_id] = asyncio.get_running_loop().create_future()
+        self.writer.write(json.dumps({"op": op, "id": request_id, **fields}).encode("utf-8") + b"\n")
+        await self.writer.drain()
+        response = await future
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.listener.cancel()
+
+
+async def play_load_session(client, index, mode, ai, seed, latencies):
+    """负载生成器中的一局：human 模式下客户端随机选合法走法，ai 模式下不停 step；返回回合数"""
+    rng = random.Random(seed + index)
+
+    async def timed(op, **fields):
+        start = time.perf_counter()
+        response = await client.request(op, **fields)
+        latencies.append(time.perf_counter() - start)
+        return response
+
+    state = await timed("new", mode=mode, ai=ai, human_player=index % 2, seed=seed + index)
+    while not state["game_over"]:
+        if mode == "human":
+            state = await timed("move", session=state["session"], move=rng.choice(state["legal"]))
+        else:
+            state = await timed("step", session=state["session"])
+    await client.request("close", session=state["session"])
+    return state["turn"]
+
+
+async def run_load(sessions=1000, connections=20, mode="human", ai="random", host="127.0.0.1", port=8765, unix=None,
+                   seed=0):
+    """并发打开 sessions 局对弈（平均分到 connections 个连接上）直到全部下完，报告吞吐量和延迟分布"""
+    clients = [await GameClient.connect(host, port, unix) for _ in range(connections)]
+    latencies = []
+    start = time.perf_counter()
+    turns = await asyncio.gather(*(play_load_session(clients[i % connections], i, mode, ai, seed, latencies)
+                                   for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    server_stats = await clients[0].request("stats")
+    for client in clients:
+        await client.close()
+
+    summary = latency_summary(latencies)
+    print(f"{sessions} 局并发（{connections} 个连接）用时 {elapsed:.2f}s：{len(latencies) / elapsed:.0f} 请求/秒，"
+          f"{sum(turns) / elapsed:.0f} 回合/秒")
+    print(f"往返延迟：p50 {summary['p50_ms']:.2f}ms，p95 {summary['p95_ms']:.2f}ms，p99 {summary['p99_ms']:.2f}ms，"
+          f"最大 {summary['max_ms']:.2f}ms")
+    for op, stats in server_stats["ops"].items():
+        if stats["count"]:
+            print(f"服务器处理 {op}：{stats['count']} 次，p50 {stats['p50_ms']:.2f}ms，p95 {stats['p95_ms']:.2f}ms")
+    return {"elapsed": elapsed, "requests": len(latencies), "turns": sum(turns), "latency": summary,
+            "server": server_stats}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多会话对局服务器（JSON lines over TCP / Unix socket）及负载生成器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="使用 Unix socket 路径代替 TCP")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) + 4), help="AI 走子线程数")
+    parser.add_argument("--load", type=int, metavar="SESSIONS", help="作为负载生成器运行，并发下 SESSIONS 局")
+    parser.add_argument("--connections", type=int, default=20, help="负载生成器的连接数")
+    parser.add_argument("--mode", choices=["human", "ai"], default="human", help="负载生成器的对局模式")
+    parser.add_argument("--ai", default="random", help="负载生成器请求的 AI 策略（见 arena.py）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        if args.load:
+            asyncio.run(run_load(args.load, args.connections, args.mode, args.ai, args.host, args.port, args.unix,
+                                 args.seed))
+        else:
+            asyncio.run(GameServer(args.workers).serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,231 @@
+import argparse
+import os
+import random
+import struct
+import time
+import numpy as np
+from ai import QLearningAgent, select_actions
+from batch_env import neighbor_table
+from engine import GameEngine, PIECE_SET, PIECE_VALUES
+from qtable_store import ACTIONS
+from utils import CAPTURE_MATRIX, PIECE_TYPES
+
+
+ACTION_INDEX = {action: i for i, action in enumerate(ACTIONS)}
+FEATURE_NAMES = (["bias"]
+                 + [f"my_known_{name}" for name in PIECE_TYPES] + [f"their_known_{name}" for name in PIECE_TYPES]
+                 + ["my_unknown", "their_unknown", "my_material", "their_material",
+                    "my_king_revealed", "their_king_revealed", "my_king_threats", "their_king_threats",
+                    "my_captures", "their_captures", "my_best_capture", "their_best_capture",
+                    "my_mobility", "their_mobility"])
+NUM_FEATURES = len(FEATURE_NAMES)
+WEIGHTS_MAGIC = b"CKLW"
+WEIGHTS_VERSION = 1
+WEIGHTS_HEADER = struct.Struct("<4sII")  # 魔数、版本号、特征数；之后是 float32 [动作数, 特征数] 权重
+
+_TYPE_COUNTS = np.bincount([PIECE_TYPES.index(name) for name in PIECE_SET], minlength=len(PIECE_TYPES))
+_TYPE_VALUES = np.array([PIECE_VALUES[name] for name in PIECE_TYPES], dtype=np.float64)
+_TOTAL_VALUE = float(sum(PIECE_VALUES[name] for name in PIECE_SET))
+_CAPTURE = np.array(CAPTURE_MATRIX, dtype=bool)
+_KING = PIECE_TYPES.index("king")
+_pairs = {}
+
+
+def neighbor_pairs(size):
+    """所有相邻的 (格子, 相邻格子) 对，展平为两个数组"""
+    if size not in _pairs:
+        table = neighbor_table(size)
+        src = np.repeat(np.arange(size * size), table.shape[1])
+        dst = table.ravel()
+        _pairs[size] = (src[dst >= 0], dst[dst >= 0])
+    return _pairs[size]
+
+
+def board_features(board, player):
+    """以 player 为己方提取棋盘特征，返回长度 NUM_FEATURES 的 float64 数组（大致归一化到 [0, 1]）"""
+    size = len(board)
+    cells = size * size
+    types = np.zeros(cells, dtype=np.int64)
+    owner = np.full(cells, -1, dtype=np.int64)
+    known = np.zeros(cells, dtype=bool)
+    for index, piece in enumerate(cell for row in board for cell in row):
+        if piece:
+            types[index] = piece.type_id
+            owner[index] = piece.player
+            known[index] = piece.state == "known"
+
+    mine = owner == player
+    theirs = owner == 1 - player
+    src, dst = neighbor_pairs(size)
+    # 相邻的已翻开敌对棋子中，src 可以吃掉 dst 的对
+    attack = known[src] & known[dst] & (owner[dst] == 1 - owner[src]) & _CAPTURE[types[src], types[dst]]
+    # 已翻开的棋子可以走到相邻空格
+    step = known[src] & (owner[dst] == -1) & (owner[src] >= 0)
+    movable = np.zeros(cells, dtype=bool)
+    movable[src[step | attack]] = True
+    king_cells = types == _KING
+
+    features = np.empty(NUM_FEATURES, dtype=np.float64)
+    features[0] = 1.0
+    features[1:6] = np.bincount(types[mine & known], minlength=len(PIECE_TYPES)) / _TYPE_COUNTS
+    features[6:11] = np.bincount(types[theirs & known], minlength=len(PIECE_TYPES)) / _TYPE_COUNTS
+    features[11] = np.count_nonzero(mine & ~known) / len(PIECE_SET)
+    features[12] = np.count_nonzero(theirs & ~known) / len(PIECE_SET)
+    features[13] = _TYPE_VALUES[types[mine]].sum() / _TOTAL_VALUE
+    features[14] = _TYPE_VALUES[types[theirs]].sum() / _TOTAL_VALUE
+    features[15] = np.count_nonzero(mine & known & king_cells)
+    features[16] = np.count_nonzero(theirs & known & king_cells)
+    features[17] = np.count_nonzero(attack & mine[dst] & king_cells[dst]) / 4
+    features[18] = np.count_nonzero(attack & theirs[dst] & king_cells[dst]) / 4
+    features[19] = np.count_nonzero(attack & mine[src]) / len(PIECE_SET)
+    features[20] = np.count_nonzero(attack & theirs[src]) / len(PIECE_SET)
+    # 能吃到的最有价值的棋子：让 capture 的估值可以反映这一步的即时奖励
+    target_values = _TYPE_VALUES[types[dst]] * attack
+    features[21] = target_values[mine[src]].max(initial=0) / _TYPE_VALUES[_KING]
+    features[22] = target_values[theirs[src]].max(initial=0) / _TYPE_VALUES[_KING]
+    features[23] = np.count_nonzero(movable & mine) / len(PIECE_SET)
+    features[24] = np.count_nonzero(movable & theirs) / len(PIECE_SET)
+    return features
+
+
+class LinearQAgent(QLearningAgent):
+    """线性函数逼近的 Q-learning 智能体：Q(s, a) = weights[a] · features(s)
+
+    状态键就是特征向量，因此可以直接替换 QLearningAgent 用在 play_game 等循环中；
+    内存占用固定，没见过的局面也能根据相似的特征给出估值。转移先攒成 batch_size 条的小批量，
+    再做一次向量化的半梯度更新。特征在不同局面间共享，gamma 接近 1 时自举误差会累积，默认取 0.5。
+    """
+
+    def __init__(self, epsilon=0.3, alpha=0.01, gamma=0.5, batch_size=32):
+        super().__init__(epsilon, alpha, gamma)
+        self.weights = np.zeros((len(ACTIONS), NUM_FEATURES), dtype=np.float64)
+        self.batch_size = batch_size
+        self.batch_states = np.zeros((batch_size, NUM_FEATURES))
+        self.batch_actions = np.zeros(batch_size, dtype=np.int64)
+        self.batch_rewards = np.zeros(batch_size)
+        self.batch_next_states = np.zeros((batch_size, NUM_FEATURES))
+        self.batch_done = np.zeros(batch_size, dtype=bool)
+        self.batch_count = 0
+
+    def get_state(self, board, player=0):
+        return board_features(board, player)
+
+    def state_key(self, engine):
+        return board_features(engine.board, engine.current_player)
+
+    def q_values(self, state):
+        return self.weights @ state
+
+    def choose_action(self, state, board, current_player, rng=random):
+        """选择动作（探索或利用），rng 的含义与 QLearningAgent.choose_action 相同"""
+        valid_actions = self.get_valid_actions(board, current_player)
+        if rng.uniform(0, 1) < self.epsilon:
+            return rng.choice(valid_actions)  # 探索
+        q_values = self.q_values(state)
+        max_q = max(q_values[ACTION_INDEX[action]] for action in valid_actions)
+        best_actions = [action for action in valid_actions if q_values[ACTION_INDEX[action]] == max_q]
+        return rng.choice(best_actions)  # 利用
+
+    def choose_actions(self, states, masks, rng=None):
+        """批量选择动作：states 为 [n, 特征数] 的特征矩阵"""
+        return select_actions(np.asarray(states) @ self.weights.T, masks, self.epsilon, rng)
+
+    def update_q_table(self, state, action, reward, next_state, done=False):
+        """记录一条转移，攒满一个小批量后更新权重"""
+        i = self.batch_count
+        self.batch_states[i] = state
+        self.batch_actions[i] = ACTION_INDEX[action]
+        self.batch_rewards[i] = reward
+        self.batch_next_states[i] = next_state
+        self.batch_done[i] = done
+        self.batch_count += 1
+        if self.batch_count == self.batch_size:
+            self.learn()
+
+    def learn(self):
+        """对已攒下的转移做一次批量半梯度 TD 更新"""
+        n = self.batch_count
+        if not n:
+            return
+        states, actions = self.batch_states[:n], self.batch_actions[:n]
+        next_best = np.where(self.batch_done[:n], 0.0, (self.batch_next_states[:n] @ self.weights.T).max(axis=1))
+        td_error = self.batch_rewards[:n] + self.gamma * next_best - np.einsum("ij,ij->i", states, self.weights[actions])
+        gradient = np.zeros_like(self.weights)
+        np.add.at(gradient, actions, td_error[:, None] * states)
+        self.weights += self.alpha / n * gradient
+        self.batch_count = 0
+
+    def save_q_table(self, name):
+        """把权重保存为 data/{name}.lw（几百字节）"""
+        self.learn()
+        os.makedirs("data", exist_ok=True)
+        filepath = os.path.join("data", f"{name}.lw")
+        with open(filepath, "wb") as f:
+            f.write(WEIGHTS_HEADER.pack(WEIGHTS_MAGIC, WEIGHTS_VERSION, NUM_FEATURES))
+            f.write(self.weights.astype(np.float32).tobytes())
+        print(f"权重已成功保存：{filepath}")
+
+    def load_q_table(self, name):
+        filepath = os.path.join("data", f"{name}.lw")
+        if not os.path.exists(filepath):
+            print(f"文件 {filepath} 不存在，无法加载权重。")
+            return
+        with open(filepath, "rb") as f:
+            magic, version, num_features = WEIGHTS_HEADER.unpack(f.read(WEIGHTS_HEADER.size))
+            if magic != WEIGHTS_MAGIC or version != WEIGHTS_VERSION or num_features != NUM_FEATURES:
+                raise ValueError(f"{filepath} 不是当前版本的线性智能体权重文件")
+            weights = np.frombuffer(f.read(), dtype=np.float32)
+        self.weights = weights.reshape(len(ACTIONS), NUM_FEATURES).astype(np.float64)
+
+
+def play_two_sided_game(engine, agents, rng=random, loss_penalty=PIECE_VALUES["king"]):
+    """自我对弈一局，每个玩家的转移从自己的回合到自己的下一回合（中间包含对手的应对），
+    终局时双方都得到一条结束转移，输家额外扣 loss_penalty；返回胜者"""
+    engine.reset()
+    engine.setup_pieces(rng)
+    pending = [None, None]  # 每个玩家尚未得到下一状态的 (state, action, reward)
+    while not engine.game_over:
+        player = engine.current_player
+        agent = agents[player]
+        state = agent.state_key(engine)
+        if pending[player]:
+            agent.update_q_table(*pending[player], state)
+        action = agent.choose_action(state, engine.board, player, rng)
+        reward = engine.apply_action(action, rng)
+        pending[player] = (state, action, reward)
+        engine.end_turn()
+
+    for player, agent in enumerate(agents):
+        if pending[player]:
+            state, action, reward = pending[player]
+            if engine.winner == 1 - player:
+                reward -= loss_penalty
+            agent.update_q_table(state, action, reward, agent.get_state(engine.board, player), done=True)
+    return engine.winner
+
+
+def train_linear_agents(num_games=1000, board_size=5, seed=None, save=True):
+    """线性智能体自我对弈训练，权重保存为 data/agent1_linear.lw 和 data/agent2_linear.lw"""
+    rng = random.Random(seed)
+    engine = GameEngine(board_size)
+    agents = [LinearQAgent(), LinearQAgent()]
+
+    start = time.perf_counter()
+    for game_count in range(num_games):
+        play_two_sided_game(engine, agents, rng)
+        if (game_count + 1) % 100 == 0 or game_count + 1 == num_games:
+            elapsed = time.perf_counter() - start
+            print(f"已完成 {game_count + 1} 次训练，{(game_count + 1) / elapsed * 60:.0f} 局/分钟")
+
+    if save:
+        agents[0].save_q_table("agent1_linear")
+        agents[1].save_q_table("agent2_linear")
+    return agents
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="线性函数逼近智能体的自我对弈训练")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    train_linear_agents(args.games, seed=args.seed)
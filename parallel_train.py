@@ -0,0 +1,154 @@
+import argparse
+import multiprocessing as mp
+import os
+import random
+import time
+from engine import GameEngine
+from ai import QLearningAgent
+from train import play_game
+
+
+class CountingAgent(QLearningAgent):
+    """worker 中使用的智能体：累计每个 (状态, 动作) 被更新的次数，并记录自上次同步以来更新过的状态"""
+
+    def __init__(self, q_table=None, **kwargs):
+        super().__init__(**kwargs)
+        self.q_table = {state: dict(values) for state, values in (q_table or {}).items()}
+        self.visits = {}
+        self.dirty = set()
+
+    def update_q_table(self, state, action, reward, next_state):
+        super().update_q_table(state, action, reward, next_state)
+        counts = self.visits.get(state)
+        if counts is None:
+            counts = self.visits[state] = {}
+        counts[action] = counts.get(action, 0) + 1
+        self.dirty.add(state)
+
+    def take_delta(self):
+        """取出自上次同步以来更新过的状态：{state: ({action: 当前Q值}, {action: 累计访问次数})}"""
+        delta = {state: ({action: self.q_table[state][action] for action in self.visits[state]},
+                         dict(self.visits[state]))
+                 for state in self.dirty}
+        self.dirty = set()
+        return delta
+
+
+class QTableMerger:
+    """按访问次数加权平均，把各 worker 发回的 Q 值合并进全局 Q 表
+
+    每个 worker 发回的是最新的绝对 Q 值和累计访问次数，合并器为每个 (状态, 动作) 只保留各 worker 的最新一份，
+    每次同步替换该 worker 的旧值后重新计算各 worker 之间的加权平均，同一 worker 的旧快照不会重复计入。
+    """
+
+    def __init__(self, q_tables=None):
+        q_tables = q_tables or [{}, {}]
+        self.q_tables = [{state: dict(values) for state, values in q_table.items()} for q_table in q_tables]
+        self.entries = [{} for _ in self.q_tables]  # {state: {action: {worker_id: (Q值, 累计访问次数)}}}
+
+    def merge(self, agent_index, delta, worker_id=0):
+        q_table = self.q_tables[agent_index]
+        entries = self.entries[agent_index]
+        for state, (values, counts) in delta.items():
+            row = q_table.get(state)
+            if row is None:
+                row = q_table[state] = {"flip": 0, "move": 0, "capture": 0, "skip": 0}
+            state_entries = entries.setdefault(state, {})
+            for action, count in counts.items():
+                workers = state_entries.setdefault(action, {})
+                workers[worker_id] = (values[action], count)
+                total = sum(c for _, c in workers.values())
+                row[action] = sum(v * c for v, c in workers.values()) / total
+
+    def save(self, names=("agent1_q_table", "agent2_q_table")):
+        for q_table, name in zip(self.q_tables, names):
+            agent = QLearningAgent()
+            agent.q_table = q_table
+            agent.save_q_table(name)
+
+
+def self_play_worker(worker_id, num_games, sync_every, seed, initial_tables, queue):
+    """在本地 Q 表副本上自我对弈，每 sync_every 局把增量发给合并进程"""
+    rng = random.Random(seed + worker_id)
+    engine = GameEngine()
+    agents = [CountingAgent(q_table) for q_table in initial_tables]
+
+    games_since_sync = 0
+    for game_count in range(num_games):
+        play_game(engine, agents, rng)
+        games_since_sync += 1
+        if games_since_sync == sync_every or game_count + 1 == num_games:
+            queue.put((worker_id, games_since_sync, [agent.take_delta() for agent in agents]))
+            games_since_sync = 0
+    queue.put((worker_id, 0, None))  # 结束标记
+
+
+def parallel_train_agents(num_workers=None, num_games=1000, sync_every=100, seed=0, resume=False, save=True):
+    """多进程自我对弈训练，返回 (合并器, 每秒对局数)"""
+    num_workers = num_workers or os.cpu_count()
+    initial_tables = [{}, {}]
+    if resume:
+        for index, name in enumerate(("agent1_q_table", "agent2_q_table")):
+            agent = QLearningAgent()
+            agent.load_q_table(name)
+            initial_tables[index] = agent.q_table
+    merger = QTableMerger(initial_tables)
+
+    queue = mp.Queue()
+    games_per_worker = [num_games // num_workers + (1 if i < num_games % num_workers else 0)
+                        for i in range(num_workers)]
+    workers = [mp.Process(target=self_play_worker,
+                          args=(i, games_per_worker[i], sync_every, seed, initial_tables, queue))
+               for i in range(num_workers) if games_per_worker[i] > 0]
+
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+
+    running = len(workers)
+    games_done = 0
+    while running:
+        worker_id, games, deltas = queue.get()
+        if deltas is None:
+            running -= 1
+            continue
+        for agent_index, delta in enumerate(deltas):
+            merger.merge(agent_index, delta, worker_id)
+        games_done += games
+    for worker in workers:
+        worker.join()
+    games_per_sec = games_done / (time.perf_counter() - start)
+
+    if save:
+        merger.save()
+    return merger, games_per_sec
+
+
+def benchmark_scaling(worker_counts=(1, 2, 4, 8, 16, 32), games_per_worker=200, sync_every=100, seed=0):
+    """对不同 worker 数测量每秒对局数（每个 worker 的对局数固定）"""
+    results = {}
+    for num_workers in worker_counts:
+        _, games_per_sec = parallel_train_agents(num_workers, num_workers * games_per_worker,
+                                                 sync_every, seed, save=False)
+        results[num_workers] = games_per_sec
+        print(f"{num_workers:>3} 个 worker：{games_per_sec:.1f} 局/秒，"
+              f"加速比 {games_per_sec / results[worker_counts[0]] * worker_counts[0]:.2f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多进程自我对弈训练")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--sync-every", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--resume", action="store_true", help="从 data 文件夹中已有的 Q 表继续训练")
+    parser.add_argument("--benchmark", action="store_true", help="只测量不同 worker 数的每秒对局数")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        counts = [n for n in (1, 2, 4, 8, 16, 32) if n <= args.workers]
+        benchmark_scaling(counts, sync_every=args.sync_every, seed=args.seed)
+    else:
+        _, rate = parallel_train_agents(args.workers, args.games, args.sync_every, args.seed, args.resume)
+        print(f"{args.workers} 个 worker 完成 {args.games} 局训练，{rate:.1f} 局/秒")
@@ -1,7 +1,13 @@
+from utils import PIECE_TYPE_IDS
+
+
 class Piece:
+    __slots__ = ("name", "type_id", "player", "state", "check", "alive")  # 没有 __dict__，每个对象少占几百字节
+
     def __init__(self, name, player, state,check,alive):
         self.name = name
+        self.type_id = PIECE_TYPE_IDS[name]  #棋子类型编号，用于查捕获矩阵
         self.player = player
         self.state = state
         self.check = check  #是否翻开
-        self.alive = alive  #是否存活
\ No newline at end of file
+        self.alive = alive  #是否存活
@@ -0,0 +1,171 @@
+import argparse
+import os
+import random
+import threading
+import time
+
+
+PHASES = ("encode", "choose", "apply", "check", "render", "q_update")
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("timers", "name", "start")
+
+    def __init__(self, timers, name):
+        self.timers = timers
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.timers.add(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+
+class PhaseTimers:
+    """回合循环中各阶段的计时器与计数器，未启用时 phase() 返回空操作，开销可以忽略
+
+    用法：
+        with timers.phase("choose"):
+            action = agent.choose_action(...)
+
+    AI 后台线程和 Tk 主线程会同时记录阶段耗时，累加都在锁内进行。
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.total_ns = dict.fromkeys(PHASES, 0)
+            self.calls = dict.fromkeys(PHASES, 0)
+            self.counters = {}
+
+    def phase(self, name):
+        return _Phase(self, name) if self.enabled else _NULL_PHASE
+
+    def add(self, name, elapsed_ns):
+        with self.lock:
+            self.total_ns[name] = self.total_ns.get(name, 0) + elapsed_ns
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        """{阶段: {"calls", "total_ms", "us_per_call", "share"}}"""
+        with self.lock:
+            total_ns = dict(self.total_ns)
+            calls = dict(self.calls)
+        total = sum(total_ns.values()) or 1
+        return {name: {"calls": calls[name], "total_ms": ns / 1e6,
+                       "us_per_call": ns / 1e3 / calls[name] if calls[name] else 0.0,
+                       "share": ns / total}
+                for name, ns in total_ns.items()}
+
+    def report(self):
+        lines = [f"{'阶段':<10}{'次数':>10}{'总耗时(ms)':>14}{'单次(us)':>12}{'占比':>8}"]
+        for name, stats in self.summary().items():
+            lines.append(f"{name:<12}{stats['calls']:>10}{stats['total_ms']:>14.2f}"
+                         f"{stats['us_per_call']:>12.2f}{stats['share']:>8.1%}")
+        with self.lock:
+            counters = sorted(self.counters.items())
+        for name, value in counters:
+            lines.append(f"{name}: {value}")
+        return "\n".join(lines)
+
+
+# 全局计时器：设置环境变量 CAT_KINGDOM_PROFILE=1 或调用 enable() 打开
+timers = PhaseTimers(enabled=os.environ.get("CAT_KINGDOM_PROFILE") == "1")
+
+
+def enable():
+    timers.reset()
+    timers.enabled = True
+
+
+def disable():
+    timers.enabled = False
+
+
+def profile_turns(num_turns=5000, seed=0, output="profile_report.txt", memory=True, top=25):
+    """用 cProfile（以及可选的 tracemalloc）运行 num_turns 个自我对弈回合，把分阶段耗时、
+    热点函数和内存分配位置写入报告文件，返回报告文本"""
+    import cProfile
+    import io
+    import pstats
+    import tracemalloc
+    from ai import QLearningAgent
+    from engine import GameEngine
+    from train import play_game
+
+    rng = random.Random(seed)
+    engine = GameEngine()
+    agents = [QLearningAgent(), QLearningAgent()]
+    was_enabled = timers.enabled
+    enable()
+
+    profiler = cProfile.Profile()
+    if memory:
+        tracemalloc.start()
+    turns = games = 0
+    start = time.perf_counter()
+    profiler.enable()
+    while turns < num_turns:
+        play_game(engine, agents, rng)
+        turns += engine.total_turns
+        games += 1
+    profiler.disable()
+    elapsed = time.perf_counter() - start
+    snapshot = tracemalloc.take_snapshot() if memory else None
+    peak = tracemalloc.get_traced_memory()[1] if memory else None
+    if memory:
+        tracemalloc.stop()
+    timers.enabled = was_enabled
+
+    out = io.StringIO()
+    out.write(f"{games} 局 / {turns} 回合，耗时 {elapsed:.2f}s（含分析开销），种子 {seed}\n\n")
+    out.write("== 分阶段耗时 ==\n" + timers.report() + "\n\n")
+    out.write(f"== cProfile（按累计耗时前 {top} 项）==\n")
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+    if snapshot:
+        out.write(f"== tracemalloc（峰值 {peak / 1024:.1f} KiB，按分配量前 {top} 行）==\n")
+        for stat in snapshot.statistics("lineno")[:top]:
+            out.write(f"{stat}\n")
+    report = out.getvalue()
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(report)
+        print(f"分析报告已保存到 {output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对自我对弈回合循环做 cProfile/tracemalloc 分析")
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="profile_report.txt")
+    parser.add_argument("--no-memory", action="store_true", help="不启用 tracemalloc（它会明显拖慢运行）")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    # 通过模块导入调用，保证与 train.py 等使用的是同一个全局计时器
+    import profiling
+    profiling.profile_turns(args.turns, args.seed, args.output, not args.no_memory, args.top)
@@ -0,0 +1,158 @@
+import os
+import struct
+import threading
+import numpy as np
+from qtable_store import ACTIONS, MappedQTable, merge_rows, write_q_table
+
+
+JOURNAL_MAGIC = b"CKQJ"
+BATCH_HEADER = struct.Struct("<4sQ")  # 魔数、本批记录数；之后是 count 条记录
+RECORD = np.dtype([("key", "<i8"), ("values", "<f4", (len(ACTIONS),))])  # 每条记录为一个状态的完整 Q 值
+
+
+def read_journal(filepath):
+    """读取日志中所有完整的批次，返回 (keys, values, 有效字节数)；末尾写了一半的批次会被忽略"""
+    keys, values = [], []
+    valid = 0
+    if os.path.exists(filepath):
+        with open(filepath, "rb") as f:
+            data = f.read()
+        while valid + BATCH_HEADER.size <= len(data):
+            magic, count = BATCH_HEADER.unpack_from(data, valid)
+            end = valid + BATCH_HEADER.size + count * RECORD.itemsize
+            if magic != JOURNAL_MAGIC or end > len(data):
+                break
+            records = np.frombuffer(data, dtype=RECORD, count=count, offset=valid + BATCH_HEADER.size)
+            keys.append(records["key"])
+            values.append(records["values"])
+            valid = end
+    if not keys:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, len(ACTIONS)), dtype=np.float32), valid
+    return np.concatenate(keys), np.concatenate(values), valid
+
+
+def latest_rows(keys, values):
+    """同一状态出现多次时只保留最后一次写入的值"""
+    unique, index = np.unique(keys[::-1], return_index=True)
+    index = len(keys) - 1 - index
+    return unique, values[index]
+
+
+def read_snapshot(filepath):
+    if not os.path.exists(filepath):
+        return np.zeros(0, dtype=np.int64), np.zeros((0, len(ACTIONS)), dtype=np.float32)
+    return MappedQTable(filepath).to_arrays()
+
+
+def compact(snapshot_path, journal_path):
+    """把日志合并进快照：先写临时文件再原子替换，最后删除日志
+
+    日志记录的是完整的 Q 值而不是增量，重复合并同一份日志结果不变，因此在任何一步崩溃后重做都是安全的。
+    """
+    keys, values = read_snapshot(snapshot_path)
+    journal_keys, journal_values, _ = read_journal(journal_path)
+    if len(journal_keys):
+        keys, values = merge_rows(keys, values, *latest_rows(journal_keys, journal_values))
+    write_q_table(snapshot_path, keys, values)  # 内部先写临时文件再原子替换
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+
+
+class QJournal:
+    """二进制 Q 表快照（.qtb）加上一个只追加的变更日志（.qjl）
+
+    检查点只把自上次检查点以来改动过的行追加到日志末尾，耗时与改动量成正比而与表大小无关；
+    日志变大后在后台线程中把它合并进快照。恢复时读取快照再按顺序重放日志。
+    """
+
+    def __init__(self, snapshot_path):
+        self.snapshot_path = snapshot_path
+        self.path = os.path.splitext(snapshot_path)[0] + ".qjl"
+        self.compacting_path = self.path + ".compacting"
+        self.compactor = None
+        self.error = None
+
+        # 上次运行在合并过程中崩溃：先把遗留的日志合并完
+        if os.path.exists(self.compacting_path):
+            compact(self.snapshot_path, self.compacting_path)
+        # 截掉末尾不完整的批次，保证之后追加的批次能被正确读取
+        _, _, valid = read_journal(self.path)
+        if os.path.exists(self.path) and os.path.getsize(self.path) != valid:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid)
+        self.file = open(self.path, "ab")
+
+    def load(self):
+        """返回快照与日志合并后的 {state: {action: q}} 字典"""
+        keys, values = read_snapshot(self.snapshot_path)
+        journal_keys, journal_values, _ = read_journal(self.path)
+        if len(journal_keys):
+            keys, values = merge_rows(keys, values, *latest_rows(journal_keys, journal_values))
+        return {state: dict(zip(ACTIONS, row)) for state, row in zip(keys.tolist(), values.tolist())}
+
+    def append(self, q_table, states):
+        """把 states 当前的 Q 值作为一个批次追加到日志并刷到磁盘，返回写入的字节数"""
+        if not states:
+            return 0
+        records = np.empty(len(states), dtype=RECORD)
+        records["key"] = np.fromiter(states, dtype=np.int64, count=len(states))
+        records["values"] = [[q_table[state][action] for action in ACTIONS] for state in states]
+        data = BATCH_HEADER.pack(JOURNAL_MAGIC, len(states)) + records.tobytes()
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return len(data)
+
+    def size(self):
+        return self.file.tell()
+
+    def snapshot_size(self):
+        return os.path.getsize(self.snapshot_path) if os.path.exists(self.snapshot_path) else 0
+
+    def reset(self, q_table=None):
+        """丢弃日志，用 q_table（默认为空表）重写快照"""
+        self.wait()
+        self.file.close()
+        keys, values = (np.zeros(0, dtype=np.int64), np.zeros((0, len(ACTIONS)), dtype=np.float32))
+        if q_table:
+            keys = np.fromiter(q_table.keys(), dtype=np.int64, count=len(q_table))
+            values = np.array([[row[action] for action in ACTIONS] for row in q_table.values()], dtype=np.float32)
+        write_q_table(self.snapshot_path, keys, values)
+        self.file = open(self.path, "wb")
+
+    def compacting(self):
+        return self.compactor is not None and self.compactor.is_alive()
+
+    def start_compaction(self, background=True):
+        """把当前日志改名后交给合并线程，新的检查点写入新的日志文件"""
+        self.wait()
+        if self.size() == 0:
+            return
+        self.file.close()
+        os.replace(self.path, self.compacting_path)
+        self.file = open(self.path, "ab")
+        if background:
+            self.compactor = threading.Thread(target=self.run_compaction, daemon=True)
+            self.compactor.start()
+        else:
+            self.run_compaction()
+            self.wait()
+
+    def run_compaction(self):
+        try:
+            compact(self.snapshot_path, self.compacting_path)
+        except Exception as e:  # 在主线程的 wait() 中重新抛出
+            self.error = e
+
+    def wait(self):
+        """等待正在进行的合并完成"""
+        if self.compactor is not None:
+            self.compactor.join()
+            self.compactor = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def close(self):
+        self.wait()
+        self.file.close()
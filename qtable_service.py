@@ -0,0 +1,282 @@
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from qtable_store import ACTIONS, HEADER, MAGIC, VERSION, MappedQTable, dict_to_arrays
+
+
+CONTROL_MAGIC = b"CKQS"
+SEGMENT_NAME_SIZE = 64
+CONTROL = struct.Struct(f"<4sQ{SEGMENT_NAME_SIZE}s")  # 魔数、序号（写入中为奇数，代数 = 序号 // 2）、当前数据段的名字
+SERVICE_PREFIX = "ckq_"
+
+
+def service_name(table_name):
+    """Q 表（data 文件夹中的文件名，不含扩展名）对应的共享内存服务名"""
+    return SERVICE_PREFIX + table_name
+
+
+def attach_segment(name):
+    """只读方附加已有的共享内存段，不登记到 resource_tracker
+
+    登记过的段会在附加它的进程退出时被 tracker 删除；事后再注销也不行，同一进程树共用一个 tracker，
+    会把发布者自己的登记一起去掉。Python 3.13 起可以直接传 track=False。
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+def lock_file(path):
+    """非阻塞地对 path 加排它锁，已被其他进程持有时抛出 RuntimeError；返回需要一直保持打开的文件对象"""
+    f = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        raise RuntimeError(f"{path} 已被其他进程锁定，同一时间只能有一个发布者")
+    return f
+
+
+def read_control(control):
+    """读取 (代数, 数据段名)；发布者正在写入时重试"""
+    while True:
+        magic, before, name = CONTROL.unpack_from(control.buf)
+        if magic != CONTROL_MAGIC:
+            raise ValueError(f"{control.name} 不是 Q 表服务的控制段")
+        if before % 2 == 0:
+            _, after, _ = CONTROL.unpack_from(control.buf)
+            if after == before:
+                return before // 2, name.rstrip(b"\0").decode("ascii")
+        time.sleep(0)
+
+
+class QTableService:
+    """把 Q 表发布到共享内存的发布者
+
+    数据段与 .qtb 文件的布局完全相同（头部 + 有序键数组 + 值数组），每次发布创建新一代的数据段，
+    再用类似 seqlock 的方式更新控制段中的代数和段名，最后删除上一代的段名：已经附加旧段的进程继续读旧数据，
+    下次查询时切换到新的一代。发布者持有一个文件锁，同一服务同时只能有一个发布者。
+    """
+
+    def __init__(self, name):
+        # 数据段名为 "{name}_{代数}"，必须能完整写进控制段（struct 会静默截断过长的名字）
+        longest = f"{name}_{2 ** 64 - 1}"
+        if not longest.isascii() or len(longest) > SEGMENT_NAME_SIZE:
+            raise ValueError(f"Q 表服务名 {name!r} 必须是不超过 {SEGMENT_NAME_SIZE - 21} 个字符的 ASCII 字符串")
+        self.name = name
+        self.lock = lock_file(os.path.join(tempfile.gettempdir(), f"{name}.lock"))
+        try:
+            self.control = shared_memory.SharedMemory(name, create=True, size=CONTROL.size)
+            CONTROL.pack_into(self.control.buf, 0, CONTROL_MAGIC, 0, b"")
+        except FileExistsError:
+            # 上一个发布者没有正常退出：接管它留下的控制段，代数继续递增
+            self.control = shared_memory.SharedMemory(name)
+        self.segment = None
+
+    @property
+    def generation(self):
+        return CONTROL.unpack_from(self.control.buf)[1] // 2
+
+    def publish(self, q_table):
+        """发布字典、MappedQTable 或 ArrayQStore，返回新的代数"""
+        if hasattr(q_table, "to_arrays"):
+            keys, values = q_table.to_arrays()
+        else:
+            keys, values = dict_to_arrays(q_table)
+        order = np.argsort(keys, kind="stable")
+        keys = np.asarray(keys, dtype=np.int64)[order]
+        values = np.asarray(values, dtype=np.float32)[order]
+        header = HEADER.pack(MAGIC, VERSION, len(keys))
+        return self.publish_bytes(len(header) + keys.nbytes + values.nbytes, [header, keys, values])
+
+    def publish_file(self, filepath):
+        """直接把 .qtb 文件的内容复制到新的数据段；文件只读一次，头部或长度不对（例如正被重写）时抛出 ValueError"""
+        with open(filepath, "rb") as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError(f"{filepath} 不完整：只有 {len(data)} 字节")
+        magic, version, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filepath} 不是有效的二进制Q表文件")
+        expected = HEADER.size + count * (8 + 4 * len(ACTIONS))
+        if len(data) != expected:
+            raise ValueError(f"{filepath} 长度为 {len(data)} 字节，按头部的 {count} 个状态应为 {expected} 字节")
+        return self.publish_bytes(len(data), [data])
+
+    def publish_bytes(self, size, parts):
+        _, seq, old_name = CONTROL.unpack_from(self.control.buf)
+        generation = seq // 2 + 1
+        segment = shared_memory.SharedMemory(f"{self.name}_{generation}", create=True, size=max(size, 1))
+        offset = 0
+        for part in parts:
+            data = memoryview(part).cast("B")
+            segment.buf[offset:offset + len(data)] = data
+            offset += len(data)
+
+        CONTROL.pack_into(self.control.buf, 0, CONTROL_MAGIC, seq + 1, old_name)
+        CONTROL.pack_into(self.control.buf, 0, CONTROL_MAGIC, seq + 2, segment.name.lstrip("/").encode("ascii"))
+        self.release_segment(old_name.rstrip(b"\0").decode("ascii"))
+        self.segment = segment
+        return generation
+
+    def release_segment(self, name):
+        """删除上一代数据段的名字（已附加的进程仍可继续读取，直到它们关闭）"""
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+        elif name:
+            try:
+                stale = shared_memory.SharedMemory(name)
+                stale.close()
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+
+    def close(self, unlink=True):
+        """停止发布；unlink 时删除控制段和当前数据段"""
+        if self.segment is not None:
+            self.segment.close()
+            if unlink:
+                self.segment.unlink()
+            self.segment = None
+        self.control.close()
+        if unlink:
+            self.control.unlink()
+        self.lock.close()
+
+
+class SharedQTable(MappedQTable):
+    """附加到 QTableService 发布的 Q 表，键数组和值数组直接指向共享内存，不做任何复制
+
+    查询接口与 MappedQTable 相同，写入只进入本进程的 overlay 字典。每次 `in` 查询（choose_action 的第一步）
+    检查控制段的代数，发布者换了新表后自动切换并清空 overlay。
+    """
+
+    def __init__(self, name):
+        self.filepath = name
+        self.control = attach_segment(name)
+        self.segment = None
+        self.generation = -1
+        self.refresh()
+
+    def refresh(self):
+        """发布者换了新的一代时重新附加，返回是否发生了切换"""
+        missing = None
+        while True:
+            generation, segment_name = read_control(self.control)
+            if generation == self.generation:
+                return False
+            if not segment_name:
+                raise RuntimeError(f"Q 表服务 {self.filepath} 还没有发布任何表")
+            try:
+                segment = attach_segment(segment_name)
+                break
+            except FileNotFoundError:
+                # 读到段名之后发布者又换了一代，旧段名已被删除：只有代数变了才值得重试
+                if generation == missing:
+                    raise RuntimeError(f"Q 表服务 {self.filepath} 第 {generation} 代的数据段 {segment_name} 不存在")
+                missing = generation
+        row_size = 8 + 4 * len(ACTIONS)
+        count = 0
+        if segment.size >= HEADER.size:
+            magic, version, count = HEADER.unpack_from(segment.buf)
+        if segment.size < HEADER.size or magic != MAGIC or version != VERSION:
+            segment.close()
+            raise ValueError(f"共享内存段 {segment_name} 不是有效的二进制Q表")
+        if segment.size < HEADER.size + count * row_size:
+            segment.close()
+            raise ValueError(f"共享内存段 {segment_name} 只有 {segment.size} 字节，装不下头部声明的 {count} 个状态")
+        self.release()
+        self.segment = segment
+        self.generation = generation
+        self.count = count
+        self.keys = np.frombuffer(segment.buf, dtype=np.int64, count=count, offset=HEADER.size)
+        self.values = np.frombuffer(segment.buf, dtype=np.float32, count=count * len(ACTIONS),
+                                    offset=HEADER.size + 8 * count).reshape(count, len(ACTIONS))
+        self.overlay = {}
+        return True
+
+    def __contains__(self, state):
+        self.refresh()
+        return super().__contains__(state)
+
+    def lookup_many(self, states):
+        self.refresh()
+        return super().lookup_many(states)
+
+    def release(self):
+        if self.segment is not None:
+            self.keys = self.values = None  # 先释放指向共享内存的数组，否则无法关闭段
+            try:
+                self.segment.close()
+            except BufferError:
+                pass  # 调用方还持有旧表的行视图：映射在这些视图被回收后才会解除
+            self.segment = None
+
+    def close(self):
+        self.release()
+        self.control.close()
+
+
+def serve(names=("agent1_q_table", "agent2_q_table"), interval=2.0):
+    """发布 data 文件夹中的 Q 表（优先 .qtb），并在文件被重新训练覆盖后热替换，直到 Ctrl-C"""
+    from ai import QLearningAgent
+
+    services = {}
+    mtimes = {}
+    failed = {}  # 发布失败的文件版本，同一版本只报告一次
+    try:
+        for name in names:
+            services[name] = QTableService(service_name(name))
+        while True:
+            for name, service in services.items():
+                filepath = os.path.join("data", f"{name}.qtb")
+                if not os.path.exists(filepath):
+                    filepath = os.path.join("data", f"{name}.csv")
+                mtime = os.path.getmtime(filepath) if os.path.exists(filepath) else None
+                if mtime is None or mtime == mtimes.get(name):
+                    continue
+                try:
+                    if filepath.endswith(".qtb"):
+                        generation = service.publish_file(filepath)
+                    else:
+                        agent = QLearningAgent()
+                        agent.load_q_table_from_csv(f"{name}.csv")
+                        generation = service.publish(agent.q_table)
+                except (OSError, ValueError) as e:
+                    # 文件可能正被训练进程重写：保留当前发布的表，下次轮询再试
+                    if failed.get(name) != mtime:
+                        print(f"发布 {filepath} 失败，稍后重试：{e}")
+                        failed[name] = mtime
+                    continue
+                mtimes[name] = mtime
+                print(f"已发布 {filepath} 到 {service.name}（第 {generation} 代）")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("停止发布")
+    finally:
+        for service in services.values():
+            service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把 Q 表发布到共享内存，供多个对局进程零拷贝读取")
+    parser.add_argument("names", nargs="*", default=["agent1_q_table", "agent2_q_table"])
+    parser.add_argument("--interval", type=float, default=2.0, help="检查文件是否更新的间隔（秒）")
+    args = parser.parse_args()
+    serve(args.names, args.interval)
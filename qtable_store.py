@@ -0,0 +1,230 @@
+import os
+import struct
+import time
+from operator import itemgetter
+import numpy as np
+
+
+ACTIONS = ["flip", "move", "capture", "skip"]
+ROW_VALUES = itemgetter(*ACTIONS)  # {action: q} 字典 -> 按 ACTIONS 顺序的 Q 值元组
+MAGIC = b"CKQT"
+VERSION = 1
+HEADER = struct.Struct("<4sIQ")  # 魔数、版本号、状态数；之后依次是 int64 键数组和 float32 [n, 4] 值数组
+
+
+def write_q_table(filepath, keys, values):
+    """把按键排序后的 (keys, values) 写入二进制 Q 表文件
+
+    先写临时文件并刷到磁盘再原子替换：其他进程正在内存映射的旧文件不会被原地截断或改写。
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float32).reshape(len(keys), len(ACTIONS))
+    order = np.argsort(keys, kind="stable")
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(keys)))
+        f.write(keys[order].tobytes())
+        f.write(values[order].tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+def dict_to_arrays(q_table):
+    """把 {state: {action: q}} 转换为 (keys, values) 数组"""
+    keys = np.fromiter(q_table.keys(), dtype=np.int64, count=len(q_table))
+    values = np.array([[row[action] for action in ACTIONS] for row in q_table.values()],
+                      dtype=np.float32).reshape(len(q_table), len(ACTIONS))
+    return keys, values
+
+
+class MappedQTable:
+    """内存映射的只读 Q 表，外加一个保存新增/修改行的字典
+
+    对外表现与 QLearningAgent.q_table 使用的字典相同：按键读取时在有序键数组上二分查找，
+    只有被访问的行才会复制成字典，整张表不会展开到内存中。
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, "rb") as f:
+            magic, version, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{filepath} 不是有效的二进制Q表文件")
+        self.count = count
+        if count:
+            self.keys = np.memmap(filepath, dtype=np.int64, mode="r", offset=HEADER.size, shape=(count,))
+            self.values = np.memmap(filepath, dtype=np.float32, mode="r",
+                                    offset=HEADER.size + 8 * count, shape=(count, len(ACTIONS)))
+        else:
+            self.keys = np.zeros(0, dtype=np.int64)
+            self.values = np.zeros((0, len(ACTIONS)), dtype=np.float32)
+        self.overlay = {}  # 被访问或修改过的行
+
+    def find(self, state):
+        """返回状态在映射数组中的行号，不存在时返回 -1"""
+        index = int(np.searchsorted(self.keys, state))
+        if index < self.count and self.keys[index] == state:
+            return index
+        return -1
+
+    def lookup(self, state):
+        """只读查询一行 Q 值（float32 数组），不存在时返回 None"""
+        row = self.overlay.get(state)
+        if row is not None:
+            return np.array([row[action] for action in ACTIONS], dtype=np.float32)
+        index = self.find(state)
+        return None if index < 0 else self.values[index]
+
+    def lookup_many(self, states):
+        """批量只读查询：返回 [n, 4] float64 数组，表中没有的状态为 0"""
+        states = np.asarray(states, dtype=np.int64)
+        values = np.zeros((len(states), len(ACTIONS)))
+        if self.count:
+            index = np.minimum(np.searchsorted(self.keys, states), self.count - 1)
+            found = self.keys[index] == states
+            values[found] = self.values[index[found]]
+        if self.overlay:
+            rows = list(map(self.overlay.get, states.tolist()))
+            found = [i for i, row in enumerate(rows) if row is not None]
+            if found:
+                values[found] = [ROW_VALUES(rows[i]) for i in found]
+        return values
+
+    def __contains__(self, state):
+        return state in self.overlay or self.find(state) >= 0
+
+    def __getitem__(self, state):
+        row = self.overlay.get(state)
+        if row is None:
+            index = self.find(state)
+            if index < 0:
+                raise KeyError(state)
+            row = self.overlay[state] = dict(zip(ACTIONS, self.values[index].tolist()))
+        return row
+
+    def __setitem__(self, state, row):
+        self.overlay[state] = row
+
+    def get(self, state, default=None):
+        try:
+            return self[state]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        for state in self.keys:
+            state = int(state)
+            if state not in self.overlay:
+                yield state
+        yield from self.overlay
+
+    def __len__(self):
+        new_states = sum(1 for state in self.overlay if self.find(state) < 0)
+        return self.count + new_states
+
+    def items(self):
+        for state in self:
+            yield state, self[state]
+
+    def to_arrays(self):
+        """合并映射数据与修改过的行，返回 (keys, values)"""
+        keys = np.array(self.keys, dtype=np.int64)
+        values = np.array(self.values, dtype=np.float32)
+        if not self.overlay:
+            return keys, values
+        return merge_rows(keys, values, *dict_to_arrays(self.overlay))
+
+
+def merge_rows(keys, values, new_keys, new_values):
+    """用 (new_keys, new_values) 覆盖或追加到按键排序的 (keys, values) 中，new_keys 不能重复
+
+    values 会被原地修改；返回的数组不保证有序（write_q_table 写入时会排序）。
+    """
+    index = np.searchsorted(keys, new_keys)
+    exists = index < len(keys)
+    exists[exists] = keys[index[exists]] == new_keys[exists]
+    values[index[exists]] = new_values[exists]
+    return (np.concatenate([keys, new_keys[~exists]]),
+            np.concatenate([values, new_values[~exists]]))
+
+
+def lookup_many(q_table, states):
+    """批量查询任意 Q 表（字典、MappedQTable、ArrayQStore 等）：返回 [n, 4] float64 数组，
+    没有的状态为 0，不会插入新行；带 lookup_many 方法的表走向量化路径"""
+    if hasattr(q_table, "lookup_many"):
+        return q_table.lookup_many(states)
+    values = np.zeros((len(states), len(ACTIONS)))
+    rows = list(map(q_table.get, np.asarray(states, dtype=np.int64).tolist()))
+    found = [i for i, row in enumerate(rows) if row is not None]
+    if found:
+        values[found] = [ROW_VALUES(rows[i]) for i in found]
+    return values
+
+
+def save_q_table(q_table, filepath):
+    """保存字典或带 to_arrays() 的 Q 表（MappedQTable、ArrayQStore）为二进制 Q 表"""
+    if hasattr(q_table, "to_arrays"):
+        keys, values = q_table.to_arrays()
+    else:
+        keys, values = dict_to_arrays(q_table)
+    write_q_table(filepath, keys, values)
+
+
+def benchmark(num_states=1_000_000, num_lookups=100_000, csv_states=20_000, seed=0):
+    """比较二进制格式与 CSV 的保存、加载和查询耗时"""
+    from ai import QLearningAgent
+
+    rng = np.random.default_rng(seed)
+    keys = np.unique(rng.integers(0, 2 ** 63 - 1, size=num_states, dtype=np.int64))
+    values = rng.standard_normal((len(keys), len(ACTIONS))).astype(np.float32)
+    filepath = os.path.join("data", "benchmark_q_table.qtb")
+    os.makedirs("data", exist_ok=True)
+
+    start = time.perf_counter()
+    write_q_table(filepath, keys, values)
+    save_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = MappedQTable(filepath)
+    load_time = time.perf_counter() - start
+
+    probes = rng.choice(keys, size=num_lookups).tolist()
+    start = time.perf_counter()
+    for state in probes:
+        table.lookup(state)
+    lookup_time = (time.perf_counter() - start) / num_lookups
+    print(f"二进制 {len(keys)} 个状态：保存 {save_time:.3f}s，加载 {load_time * 1000:.2f}ms，"
+          f"查询 {lookup_time * 1e6:.2f}us/次，文件 {os.path.getsize(filepath) / 1e6:.1f}MB")
+    del table
+    os.remove(filepath)
+
+    agent = QLearningAgent()
+    agent.q_table = {int(k): dict(zip(ACTIONS, v.tolist())) for k, v in zip(keys[:csv_states], values[:csv_states])}
+    start = time.perf_counter()
+    agent.save_q_table_as_csv("benchmark_q_table.csv")
+    csv_save_time = time.perf_counter() - start
+    start = time.perf_counter()
+    agent.load_q_table_from_csv("benchmark_q_table.csv")
+    csv_load_time = time.perf_counter() - start
+    print(f"CSV {csv_states} 个状态：保存 {csv_save_time:.3f}s，加载 {csv_load_time:.3f}s")
+    os.remove(os.path.join("data", "benchmark_q_table.csv"))
+
+
+def convert_csv_tables(names=("agent1_q_table", "agent2_q_table")):
+    """把 data 文件夹中的 CSV Q 表转换为二进制格式"""
+    from ai import QLearningAgent
+
+    for name in names:
+        agent = QLearningAgent()
+        agent.load_q_table_from_csv(f"{name}.csv")
+        agent.save_q_table_as_binary(f"{name}.qtb")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--convert" in sys.argv:
+        convert_csv_tables()
+    else:
+        benchmark()
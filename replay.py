@@ -0,0 +1,267 @@
+import argparse
+import random
+import time
+from itertools import repeat
+import numpy as np
+from ai import QLearningAgent
+from engine import GameEngine
+from qtable_store import ACTIONS
+
+
+ACTION_INDEX = {action: i for i, action in enumerate(ACTIONS)}
+
+
+class QRow:
+    """ArrayQStore 中一行的视图，用法与 {action: q} 字典相同"""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, action):
+        return float(self.store.q[self.row, ACTION_INDEX[action]])
+
+    def __setitem__(self, action, value):
+        self.store.q[self.row, ACTION_INDEX[action]] = value
+
+    def keys(self):
+        return iter(ACTIONS)
+
+    def values(self):
+        return self.store.q[self.row].tolist()
+
+    def items(self):
+        return zip(ACTIONS, self.values())
+
+
+class ArrayQStore:
+    """以 NumPy 数组保存 Q 值的 Q 表：状态键 -> 行号的字典加上一个 [行数, 4] 的 float64 数组
+
+    对外表现与 QLearningAgent.q_table 使用的字典相同（按键取出的是行视图），
+    同时可以按行号对一批转移做向量化的 TD 更新。
+    """
+
+    def __init__(self, initial_capacity=1024):
+        self.index = {}
+        self.q = np.zeros((initial_capacity, len(ACTIONS)), dtype=np.float64)
+
+    def row(self, state):
+        """状态对应的行号，新状态插入一行 0"""
+        row = self.index.get(state)
+        if row is None:
+            row = self.index[state] = len(self.index)
+            if row == len(self.q):
+                self.q = np.concatenate([self.q, np.zeros_like(self.q)])
+        return row
+
+    def __contains__(self, state):
+        return state in self.index
+
+    def __getitem__(self, state):
+        return QRow(self, self.index[state])
+
+    def __setitem__(self, state, row):
+        index = self.row(state)  # 先取行号：插入新行时 values 可能被重新分配
+        self.q[index] = [row[action] for action in ACTIONS]
+
+    def get(self, state, default=None):
+        return self[state] if state in self.index else default
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def keys(self):
+        return self.index.keys()
+
+    def values(self):
+        for row in self.index.values():
+            yield QRow(self, row)
+
+    def items(self):
+        for state, row in self.index.items():
+            yield state, QRow(self, row)
+
+    def lookup_many(self, states):
+        """批量只读查询：返回 [n, 4] 数组，表中没有的状态为 0"""
+        rows = np.fromiter(map(self.index.get, np.asarray(states, dtype=np.int64).tolist(), repeat(-1)),
+                           dtype=np.int64, count=len(states))
+        return np.where((rows >= 0)[:, None], self.q[rows], 0.0)
+
+    def to_arrays(self):
+        """返回 (keys, values)，供 qtable_store.save_q_table 直接写入"""
+        keys = np.fromiter(self.index.keys(), dtype=np.int64, count=len(self.index))
+        return keys, self.q[:len(self.index)].astype(np.float32)
+
+    def load(self, q_table):
+        """从字典或 MappedQTable 导入 Q 值"""
+        for state, row in q_table.items():
+            self[state] = row
+        return self
+
+    def td_update(self, rows, actions, rewards, next_rows, done, alpha, gamma, weights=None):
+        """对一批转移做 TD 更新，返回 TD 误差；同一 (状态, 动作) 在批中出现多次时更新量累加"""
+        values = self.q
+        next_best = np.where(done, 0.0, values[next_rows].max(axis=1))
+        td_error = rewards + gamma * next_best - values[rows, actions]
+        step = alpha * td_error if weights is None else alpha * weights * td_error
+        np.add.at(values, (rows, actions), step)
+        return td_error
+
+
+class ReplayBuffer:
+    """固定容量的环形经验回放缓冲区，转移以 (状态行号, 动作编号, 奖励, 下一状态行号, 是否结束) 保存
+
+    prioritized=True 时按 |TD误差|^priority_alpha 成比例采样，并返回重要性采样权重。
+    """
+
+    def __init__(self, capacity=100_000, prioritized=False, priority_alpha=0.6, beta=0.4, seed=None):
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.priority_alpha = priority_alpha
+        self.beta = beta
+        self.rng = np.random.default_rng(seed)
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.done = np.zeros(capacity, dtype=bool)
+        self.priorities = np.zeros(capacity, dtype=np.float64)
+        self.max_priority = 1.0
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.done[i] = done
+        self.priorities[i] = self.max_priority  # 新转移以当前最大优先级保证至少被采样一次
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def add_batch(self, states, actions, rewards, next_states, done):
+        """一次写入多条转移（例如 BatchedGameEnv 的一步），超出容量时覆盖最旧的"""
+        count = len(states)
+        index = (self.position + np.arange(count)) % self.capacity
+        self.states[index] = states
+        self.actions[index] = actions
+        self.rewards[index] = rewards
+        self.next_states[index] = next_states
+        self.done[index] = done
+        self.priorities[index] = self.max_priority
+        self.position = int((self.position + count) % self.capacity)
+        self.size = min(self.size + count, self.capacity)
+
+    def sample(self, batch_size):
+        """返回 (下标, 状态, 动作, 奖励, 下一状态, 是否结束, 权重)，均匀采样时权重为 None"""
+        if self.prioritized:
+            probs = self.priorities[:self.size] ** self.priority_alpha
+            probs /= probs.sum()
+            index = self.rng.choice(self.size, size=batch_size, p=probs)
+            weights = (self.size * probs[index]) ** -self.beta
+            weights /= weights.max()
+        else:
+            index = self.rng.integers(0, self.size, size=batch_size)
+            weights = None
+        return (index, self.states[index], self.actions[index], self.rewards[index],
+                self.next_states[index], self.done[index], weights)
+
+    def update_priorities(self, index, td_error, epsilon=1e-3):
+        priorities = np.abs(td_error) + epsilon
+        self.priorities[index] = priorities
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+
+class ReplayAgent(QLearningAgent):
+    """用经验回放学习的 Q-learning 智能体，choose_action 与 QLearningAgent 相同
+
+    update_q_table 只把转移写入缓冲区，每 learn_every 步抽取 batch_size 条转移做一次批量 TD 更新，
+    平均每条转移被重复学习 batch_size / learn_every 次。
+    """
+
+    def __init__(self, buffer_capacity=100_000, batch_size=64, learn_every=4, prioritized=False, seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.q_table = ArrayQStore()
+        self.buffer = ReplayBuffer(buffer_capacity, prioritized, seed=seed)
+        self.batch_size = batch_size
+        self.learn_every = learn_every
+        self.steps = 0
+
+    def update_q_table(self, state, action, reward, next_state, done=False):
+        store = self.q_table
+        self.buffer.add(store.row(state), ACTION_INDEX[action], reward, store.row(next_state), done)
+        self.steps += 1
+        if self.steps % self.learn_every == 0 and len(self.buffer) >= self.batch_size:
+            self.learn()
+
+    def learn(self, num_batches=1):
+        for _ in range(num_batches):
+            index, states, actions, rewards, next_states, done, weights = self.buffer.sample(self.batch_size)
+            td_error = self.q_table.td_update(states, actions, rewards, next_states, done,
+                                              self.alpha, self.gamma, weights)
+            if self.buffer.prioritized:
+                self.buffer.update_priorities(index, td_error)
+
+    def load_q_table_from_csv(self, filename):
+        super().load_q_table_from_csv(filename)
+        self.q_table = ArrayQStore().load(self.q_table)
+
+    def load_q_table_from_binary(self, filename):
+        super().load_q_table_from_binary(filename)
+        self.q_table = ArrayQStore().load(self.q_table)
+
+
+def train_with_replay(num_games=1000, board_size=5, seed=None, prioritized=False, batch_size=64, learn_every=4,
+                      save=True):
+    """用经验回放自我对弈训练，结束时与 train_agents 一样保存两张 Q 表"""
+    rng = random.Random(seed)
+    engine = GameEngine(board_size)
+    agents = [ReplayAgent(batch_size=batch_size, learn_every=learn_every, prioritized=prioritized,
+                          seed=None if seed is None else seed + i) for i in range(2)]
+
+    turns = 0
+    start = time.perf_counter()
+    for game_count in range(num_games):
+        engine.reset()
+        engine.setup_pieces(rng)
+        while not engine.game_over:
+            agent = agents[engine.current_player]
+            state = agent.state_key(engine)
+            action = agent.choose_action(state, engine.board, engine.current_player, rng)
+            reward = engine.apply_action(action, rng)
+            next_state = agent.state_key(engine)
+            engine.end_turn()
+            agent.update_q_table(state, action, reward, next_state, engine.game_over)
+            turns += 1
+        if (game_count + 1) % 100 == 0 or game_count + 1 == num_games:
+            elapsed = time.perf_counter() - start
+            print(f"已完成 {game_count + 1} 次训练，{(game_count + 1) / elapsed * 60:.0f} 局/分钟，"
+                  f"{turns / elapsed:.0f} 转移/秒")
+
+    if save:
+        agents[0].save_q_table("agent1_q_table")
+        agents[1].save_q_table("agent2_q_table")
+    return agents
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="经验回放 + 批量 TD 更新的自我对弈训练")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--prioritized", action="store_true", help="按 TD 误差优先级采样")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--learn-every", type=int, default=4)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+    train_with_replay(args.games, seed=args.seed, prioritized=args.prioritized, batch_size=args.batch_size,
+                      learn_every=args.learn_every, save=not args.no_save)
@@ -0,0 +1,344 @@
+import argparse
+import math
+import random
+import time
+from engine import GameEngine, PIECE_VALUES, PIECE_RANK
+from compact_board import CODE_OWNER, CODE_TYPE, NUM_CODES, CompactBoard
+from utils import CAPTURE_MATRIX, PIECE_TYPES, PIECE_TYPE_IDS, neighbor_cells
+
+
+FLIP, MOVE, SKIP = range(3)
+UNKNOWN = NUM_CODES  # 未翻开棋子在可观测哈希中的编码，与身份无关；棋子编码见 compact_board
+CODE_VALUE = [PIECE_VALUES[PIECE_TYPES[t]] if t >= 0 else 0 for t in CODE_TYPE]
+KING_TYPE = PIECE_TYPE_IDS["king"]
+_zobrist = {}
+
+
+def observable_zobrist(size):
+    """zobrist[cell][code]：已翻开棋子按编码取值，未翻开棋子统一取 UNKNOWN，另加一个轮到红方的分量"""
+    if size not in _zobrist:
+        rng = random.Random(20250301 + size)
+        table = [[rng.getrandbits(63) for _ in range(UNKNOWN + 1)] for _ in range(size * size)]
+        _zobrist[size] = (table, rng.getrandbits(63))
+    return _zobrist[size]
+
+
+NEIGHBORS = {}  # 格子编号 -> 相邻格子编号列表
+
+
+def _neighbors(size):
+    """neighbor_cells 的格子编号版本"""
+    if size not in NEIGHBORS:
+        NEIGHBORS[size] = [[r * size + c for r, c in neighbor_cells(size)[cell // size][cell % size]]
+                           for cell in range(size * size)]
+    return NEIGHBORS[size]
+
+
+class SearchState:
+    """搜索用的紧凑局面：格子编码列表 + 回合信息，复制只需要切片，规则与 GameEngine 一致"""
+
+    __slots__ = ("size", "cells", "player", "skips", "turns", "live", "kings", "key", "over", "winner",
+                 "max_skip_turns", "max_turns")
+
+    @classmethod
+    def from_engine(cls, engine):
+        """从规则引擎构造局面；未翻开的格子暂时保留真实编码，搜索时由 determinize 重新分配"""
+        state = cls()
+        state.size = engine.size
+        _neighbors(engine.size)
+        state.cells = list(CompactBoard.from_engine(engine).cells)
+        state.player = engine.current_player
+        state.skips = [engine.skip_turns[0], engine.skip_turns[1]]
+        state.turns = engine.total_turns
+        state.live = [engine.live_count[0], engine.live_count[1]]
+        state.kings = [engine.king_alive[0], engine.king_alive[1]]
+        state.max_skip_turns = engine.max_skip_turns
+        state.max_turns = engine.max_turns
+        state.over = engine.game_over
+        state.winner = engine.winner
+        table, side = observable_zobrist(state.size)
+        state.key = side if state.player else 0
+        for cell, code in enumerate(state.cells):
+            if code:
+                state.key ^= table[cell][code if code & 1 else UNKNOWN]
+        return state
+
+    def copy(self):
+        state = SearchState()
+        state.size = self.size
+        state.cells = self.cells[:]
+        state.player = self.player
+        state.skips = self.skips[:]
+        state.turns = self.turns
+        state.live = self.live[:]
+        state.kings = self.kings[:]
+        state.key = self.key
+        state.over = self.over
+        state.winner = self.winner
+        state.max_skip_turns = self.max_skip_turns
+        state.max_turns = self.max_turns
+        return state
+
+    def determinize(self, rng):
+        """把未翻开棋子的身份在未翻开格子之间随机重新分配
+
+        未翻开棋子的身份多重集是公开信息（全部棋子减去已翻开和已被吃掉的），只有具体位置是未知的。
+        """
+        state = self.copy()
+        hidden = [cell for cell, code in enumerate(state.cells) if code and not code & 1]
+        identities = [state.cells[cell] for cell in hidden]
+        rng.shuffle(identities)
+        for cell, code in zip(hidden, identities):
+            state.cells[cell] = code
+        return state
+
+    def legal_moves(self):
+        """可观测的合法走法：翻开任意未知棋子、移动己方已知棋子到空格或吃掉相邻的已知敌方棋子"""
+        moves = []
+        cells = self.cells
+        player = self.player
+        neighbors = NEIGHBORS[self.size]
+        for cell, code in enumerate(cells):
+            if not code:
+                continue
+            if not code & 1:
+                moves.append((FLIP, cell, cell))
+            elif CODE_OWNER[code] == player:
+                capture_row = CAPTURE_MATRIX[CODE_TYPE[code]]
+                for target_cell in neighbors[cell]:
+                    target = cells[target_cell]
+                    if not target or (target & 1 and CODE_OWNER[target] != player and capture_row[CODE_TYPE[target]]):
+                        moves.append((MOVE, cell, target_cell))
+        if not moves:
+            moves.append((SKIP, -1, -1))
+        return moves
+
+    def apply(self, move):
+        kind, src, dst = move
+        table, side = observable_zobrist(self.size)
+        cells = self.cells
+        if kind == FLIP:
+            code = cells[src]
+            cells[src] = code | 1
+            self.key ^= table[src][UNKNOWN] ^ table[src][code | 1]
+            self.skips[self.player] = 0
+        elif kind == MOVE:
+            code = cells[src]
+            target = cells[dst]
+            if target:
+                self.key ^= table[dst][target]
+                owner = CODE_OWNER[target]
+                self.live[owner] -= 1
+                if CODE_TYPE[target] == KING_TYPE:
+                    self.kings[owner] = False
+            self.key ^= table[src][code] ^ table[dst][code]
+            cells[dst] = code
+            cells[src] = 0
+            self.skips[self.player] = 0
+        else:
+            self.skips[self.player] += 1
+        self.end_turn(side)
+
+    def end_turn(self, side):
+        """与 GameEngine.end_turn / check_game_over 相同的判定顺序"""
+        self.turns += 1
+        winner = -1
+        if not self.kings[0]:
+            winner = 1
+        elif not self.kings[1]:
+            winner = 0
+        elif self.skips[0] > self.max_skip_turns:
+            winner = 1
+        elif self.skips[1] > self.max_skip_turns:
+            winner = 0
+        elif self.live[0] + self.live[1] == 2:
+            first, second = [code for code in self.cells if code]
+            first_rank, second_rank = PIECE_RANK[PIECE_TYPES[CODE_TYPE[first]]], PIECE_RANK[PIECE_TYPES[CODE_TYPE[second]]]
+            winner = None if first_rank == second_rank else CODE_OWNER[first if first_rank > second_rank else second]
+        elif self.max_turns is not None and self.turns > self.max_turns:
+            winner = None
+        if winner != -1:
+            self.over = True
+            self.winner = winner
+        else:
+            self.player = 1 - self.player
+            self.key ^= side
+
+    def evaluate(self):
+        """蓝方视角的估值，范围 [0, 1]：终局为胜负，否则按双方剩余子力（不含国王）之差"""
+        if self.over:
+            return 0.5 if self.winner is None else 1.0 - self.winner
+        material = 0
+        for code in self.cells:
+            if code and CODE_TYPE[code] != KING_TYPE:
+                material += CODE_VALUE[code] if CODE_OWNER[code] == 0 else -CODE_VALUE[code]
+        return 0.5 + 0.5 * math.tanh(material / 10)
+
+
+class SearchAgent:
+    """确定化蒙特卡洛树搜索（单观察者 ISMCTS）
+
+    每次迭代先把未翻开棋子的身份随机分配一次，再沿树用 UCB1 选择具体走法（翻子、移动、击杀），
+    遇到新局面时扩展并做一段带吃子偏好的随机模拟。树节点保存在以可观测局面哈希为键的置换表中，
+    相同局面（包括不同走法顺序到达的）共享统计，并在回合之间保留。每步在 budget_ms 毫秒内尽量多迭代。
+    """
+
+    def __init__(self, budget_ms=500, exploration=1.0, rollout_depth=20, max_depth=60, max_nodes=200_000, seed=None):
+        self.budget_ms = budget_ms
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.rng = random.Random(seed)
+        self.table = {}  # 可观测哈希 -> [访问次数, {走法: [次数, 累计得分]}]，得分以该局面的行棋方为视角
+        self.last_stats = {}
+
+    def choose_move(self, engine):
+        """在时间预算内搜索，返回 ("flip", (r, c)) / ("move", (r, c), (r2, c2)) / ("skip",)"""
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000
+        root = SearchState.from_engine(engine)
+        if len(self.table) > self.max_nodes:
+            self.table.clear()
+
+        moves = root.legal_moves()
+        iterations = visited = 0
+        if len(moves) > 1:
+            while True:
+                visited += self.iterate(root)
+                iterations += 1
+                if time.perf_counter() >= deadline:
+                    break
+            stats = self.table[root.key][1]
+            move = max(moves, key=lambda m: stats.get(m, (0, 0))[0])
+        else:
+            move = moves[0]
+
+        elapsed = time.perf_counter() - start
+        self.last_stats = {"iterations": iterations, "nodes": visited, "elapsed_ms": elapsed * 1000,
+                           "nodes_per_sec": visited / elapsed if elapsed else 0.0, "table_size": len(self.table)}
+        return self.to_engine_move(move, root.size)
+
+    def iterate(self, root):
+        """一次 选择-扩展-模拟-回传，返回经过的局面数"""
+        state = root.determinize(self.rng)
+        table = self.table
+        path = []
+        depth = 0
+        while not state.over and depth < self.max_depth:
+            node = table.get(state.key)
+            if node is None:
+                table[state.key] = [0, {}]
+                break
+            move = self.select(node, state.legal_moves())
+            path.append((node, move, state.player))
+            state.apply(move)
+            depth += 1
+        rollout_plies = self.rollout(state)
+        value = state.evaluate()  # 蓝方视角
+
+        for node, move, player in path:
+            node[0] += 1
+            stats = node[1].get(move)
+            if stats is None:
+                stats = node[1][move] = [0, 0.0]
+            stats[0] += 1
+            stats[1] += value if player == 0 else 1.0 - value
+        return depth + rollout_plies + 1
+
+    def select(self, node, moves):
+        """UCB1；没有试过的走法优先（随机挑一个）"""
+        stats = node[1]
+        untried = [move for move in moves if move not in stats]
+        if untried:
+            return self.rng.choice(untried)
+        log_visits = math.log(node[0] + 1)
+        exploration = self.exploration
+        best_move, best_score = None, -1.0
+        for move in moves:
+            count, total = stats[move]
+            score = total / count + exploration * math.sqrt(log_visits / count)
+            if score > best_score:
+                best_move, best_score = move, score
+        return best_move
+
+    def rollout(self, state):
+        """带偏好的随机模拟：有吃子时优先吃价值最高的棋子，最多 rollout_depth 步"""
+        rng = self.rng
+        plies = 0
+        while not state.over and plies < self.rollout_depth:
+            moves = state.legal_moves()
+            cells = state.cells
+            best_capture, best_value = None, 0
+            for move in moves:
+                if move[0] == MOVE and cells[move[2]]:
+                    value = CODE_VALUE[cells[move[2]]]
+                    if value > best_value:
+                        best_capture, best_value = move, value
+            state.apply(best_capture if best_capture and rng.random() < 0.8 else rng.choice(moves))
+            plies += 1
+        return plies
+
+    @staticmethod
+    def to_engine_move(move, size):
+        kind, src, dst = move
+        if kind == FLIP:
+            return ("flip", divmod(src, size))
+        if kind == MOVE:
+            return ("move", divmod(src, size), divmod(dst, size))
+        return ("skip",)
+
+
+def apply_move(engine, move):
+    """在规则引擎上执行 SearchAgent.choose_move 返回的具体走法，返回奖励"""
+    if move[0] == "flip":
+        return engine.flip_piece(*move[1])
+    if move[0] == "move":
+        return engine.move_piece(*move[1], *move[2])
+    return engine.skip_turn()
+
+
+def evaluate_search(budget_ms=200, num_games=20, opponent="random", seed=0):
+    """搜索 AI 与随机策略或训练好的 Q 表智能体对弈（轮流先手），报告胜负和平均每秒节点数"""
+    from ai import QLearningAgent
+
+    rng = random.Random(seed)
+    searcher = SearchAgent(budget_ms, seed=seed)
+    rival = QLearningAgent(epsilon=1.0 if opponent == "random" else 0)
+    if opponent == "q":
+        rival.load_q_table("agent1_q_table")
+    engine = GameEngine()
+    results = {"win": 0, "draw": 0, "loss": 0}
+    rates = []
+    for game in range(num_games):
+        search_seat = game % 2
+        engine.reset()
+        engine.setup_pieces(rng)
+        while not engine.game_over:
+            if engine.current_player == search_seat:
+                apply_move(engine, searcher.choose_move(engine))
+                rates.append(searcher.last_stats["nodes_per_sec"])
+            else:
+                state = rival.state_key(engine)
+                engine.apply_action(rival.choose_action(state, engine.board, engine.current_player, rng), rng)
+            engine.end_turn()
+        if engine.winner is None:
+            results["draw"] += 1
+        elif engine.winner == search_seat:
+            results["win"] += 1
+        else:
+            results["loss"] += 1
+    rates = [rate for rate in rates if rate]
+    print(f"搜索 AI（{budget_ms}ms/步）对 {opponent}（{num_games} 局）：胜 {results['win']} 平 {results['draw']} "
+          f"负 {results['loss']}，平均 {sum(rates) / max(len(rates), 1):.0f} 节点/秒")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="搜索 AI 对弈评估")
+    parser.add_argument("--budget", type=int, default=200, help="每步搜索时间（毫秒）")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--opponent", choices=["random", "q"], default="random")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    evaluate_search(args.budget, args.games, args.opponent, args.seed)
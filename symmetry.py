@@ -0,0 +1,138 @@
+import random
+import sys
+import time
+from zobrist import PIECE_NAMES, PIECE_STATES, zobrist_table
+
+
+NUM_SYMMETRIES = 8  # 正方形棋盘的二面体对称：4 种旋转 × 是否翻转
+
+_permutations = {}
+_tables = {}
+
+
+def symmetry_permutations(size):
+    """perm[k][cell] 为格子 cell 在第 k 种对称变换后的位置，k=0 为恒等变换"""
+    if size not in _permutations:
+        n = size - 1
+        transforms = [
+            lambda r, c: (r, c), lambda r, c: (c, n - r), lambda r, c: (n - r, n - c), lambda r, c: (n - c, r),
+            lambda r, c: (r, n - c), lambda r, c: (n - r, c), lambda r, c: (c, r), lambda r, c: (n - c, n - r),
+        ]
+        perms = []
+        for transform in transforms:
+            perm = []
+            for cell in range(size * size):
+                row, col = transform(cell // size, cell % size)
+                perm.append(row * size + col)
+            perms.append(perm)
+        _permutations[size] = perms
+    return _permutations[size]
+
+
+def symmetry_table(size=5):
+    """table[cell][(name, player, state)] 为该棋子在 16 种变换下的 Zobrist 分量
+
+    前 8 个对应 8 种对称变换，后 8 个在对称变换的同时交换红蓝双方。
+    """
+    if size not in _tables:
+        zobrist = zobrist_table(size)
+        perms = symmetry_permutations(size)
+        _tables[size] = [{(name, player, state): tuple(zobrist[perm[cell]][(name, player ^ swap, state)]
+                                                       for swap in (0, 1) for perm in perms)
+                          for name in PIECE_NAMES for player in (0, 1) for state in PIECE_STATES}
+                         for cell in range(size * size)]
+    return _tables[size]
+
+
+def symmetry_piece_keys(size, row, col, piece):
+    return symmetry_table(size)[row * size + col][(piece.name, piece.player, piece.state)]
+
+
+def symmetry_keys(board):
+    """从头计算棋盘在 16 种变换下的哈希，与 GameEngine.symmetry_keys 相同"""
+    size = len(board)
+    table = symmetry_table(size)
+    keys = [0] * (2 * NUM_SYMMETRIES)
+    for row in range(size):
+        for col in range(size):
+            piece = board[row][col]
+            if piece:
+                parts = table[row * size + col][(piece.name, piece.player, piece.state)]
+                keys = [key ^ part for key, part in zip(keys, parts)]
+    return keys
+
+
+def canonical_from_keys(keys, player):
+    """以 player 为己方（红方时交换颜色），取 8 种对称中最小的哈希作为等价类的代表"""
+    start = NUM_SYMMETRIES * player
+    return min(keys[start:start + NUM_SYMMETRIES])
+
+
+def canonical_key(board, player):
+    return canonical_from_keys(symmetry_keys(board), player)
+
+
+def compare_keys(num_games=2000, eval_games=400, seed=0):
+    """同样的对局数下，比较原始键（两个座位各一张表）与规范化键（两个座位共用一张表）
+
+    报告表的大小、训练时已见过状态的比例，以及两者贪心对弈（轮流先手）的胜负。
+    """
+    from ai import QLearningAgent
+    from engine import GameEngine
+
+    def train(agents):
+        rng = random.Random(seed)
+        engine = GameEngine()
+        seen = turns = 0
+        start = time.perf_counter()
+        for _ in range(num_games):
+            engine.reset()
+            engine.setup_pieces(rng)
+            while not engine.game_over:
+                agent = agents[engine.current_player]
+                state = agent.state_key(engine)
+                seen += state in agent.q_table
+                turns += 1
+                action = agent.choose_action(state, engine.board, engine.current_player, rng)
+                reward = engine.apply_action(action, rng)
+                agent.update_q_table(state, action, reward, agent.state_key(engine))
+                engine.end_turn()
+        return seen / turns, (time.perf_counter() - start) / num_games
+
+    raw_agents = [QLearningAgent(), QLearningAgent()]
+    shared = QLearningAgent(canonical=True)
+    raw_seen, raw_time = train(raw_agents)
+    canonical_seen, canonical_time = train([shared, shared])
+    raw_states = len(raw_agents[0].q_table) + len(raw_agents[1].q_table)
+    print(f"原始键：{raw_states} 个状态（两张表），已见状态比例 {raw_seen:.1%}，{raw_time * 1000:.2f}ms/局")
+    print(f"规范化键：{len(shared.q_table)} 个状态（共用一张表），已见状态比例 {canonical_seen:.1%}，"
+          f"{canonical_time * 1000:.2f}ms/局，表大小为原来的 {len(shared.q_table) / raw_states:.1%}")
+
+    # 贪心对弈：规范化智能体与原始智能体轮流执蓝方
+    for agent in raw_agents + [shared]:
+        agent.epsilon = 0
+    rng = random.Random(seed + 1)
+    engine = GameEngine()
+    results = {"win": 0, "draw": 0, "loss": 0}
+    for game in range(eval_games):
+        canonical_seat = game % 2
+        engine.reset()
+        engine.setup_pieces(rng)
+        while not engine.game_over:
+            player = engine.current_player
+            agent = shared if player == canonical_seat else raw_agents[player]
+            action = agent.choose_action(agent.state_key(engine), engine.board, player, rng)
+            engine.apply_action(action, rng)
+            engine.end_turn()
+        if engine.winner is None:
+            results["draw"] += 1
+        elif engine.winner == canonical_seat:
+            results["win"] += 1
+        else:
+            results["loss"] += 1
+    print(f"规范化智能体对原始智能体（{eval_games} 局）：胜 {results['win']} 平 {results['draw']} 负 {results['loss']}")
+    return results
+
+
+if __name__ == "__main__":
+    compare_keys(*(int(arg) for arg in sys.argv[1:3]))
@@ -1,289 +1,262 @@
-import tkinter as tk
-from tkinter import messagebox
-import random
-import time
-from board import Board
-from piece import Piece
-from ai import QLearningAgent
-from utils import can_capture
-
-
-class TestBoard(Board):
-    def __init__(self, root, size=5):
-        super().__init__(root, size)
-        self.root = root
-        self.size = size
-        self.current_player = None  # 当前玩家，初始化为 None，等待开始游戏时决定
-        self.agents = [QLearningAgent(), QLearningAgent()]  # 初始化两个智能体
-        self.piece_values = {"farmer": 1, "soilder": 2, "archer": 3, "knight": 4, "king": 20}  # 棋子价值表
-        self.skip_turns = {0: 0, 1: 0}  # 记录每个玩家跳过的回合次数
-
-        # 初始化界面
-        self.turn_label = tk.Label(root, text="", font=("Arial", 14))
-        self.turn_label.grid(row=size + 1, column=0, columnspan=size)
-        self.action_label = tk.Label(root, text="", font=("Arial", 12))
-        self.action_label.grid(row=size + 2, column=0, columnspan=size)
-
-        # 加载训练好的 Q 表
-        self.agents[0].load_q_table_from_csv("agent1_q_table.csv")
-        self.agents[1].load_q_table_from_csv("agent2_q_table.csv")
-
-        # 添加开始按钮
-        self.start_button = tk.Button(root, text="开始游戏", command=self.start_game)
-        self.start_button.grid(row=size + 3, column=0, columnspan=size)
-
-        # 初始化棋盘
-        self.reset()
-
-    def reset(self):
-        """重置棋盘"""
-        self.canvas.delete("all")
-        self.board = [[None for _ in range(self.size)] for _ in range(self.size)]
-        self.skip_turns = {0: 0, 1: 0}  # 重置跳过回合次数
-        self.draw_board()
-        self.setup_pieces()
-        self.update_turn_label()
-        self.action_label.config(text="")
-
-    def setup_pieces(self):
-        """随机初始化棋子"""
-        pieces = ["farmer"] * 4 + ["soilder"] * 4 + ["archer"] * 2 + ["knight"] + ["king"]
-        blue_pieces = [Piece(piece, 0, "unknown", 0, 1) for piece in pieces]
-        red_pieces = [Piece(piece, 1, "unknown", 0, 1) for piece in pieces]
-        all_pieces = blue_pieces + red_pieces
-        random.shuffle(all_pieces)
-
-        available_positions = [(row, col) for row in range(self.size) for col in range(self.size) if (row, col) != (2, 2)]
-        random.shuffle(available_positions)
-
-        for i, piece in enumerate(all_pieces):
-            row, col = available_positions[i]
-            self.place_piece(row, col, piece)
-
-    def update_turn_label(self):
-        """更新当前回合的标签"""
-        if self.current_player is None:
-            self.turn_label.config(text="游戏未开始")
-        else:
-            player_name = "玩家" if self.current_player == 0 else "AI"
-            self.turn_label.config(text=f"当前回合：{player_name} ({'蓝方' if self.current_player == 0 else '红方'})")
-
-    def start_game(self):
-        """开始游戏"""
-        self.reset()
-        self.current_player = random.choice([0, 1])  # 随机选择先手
-        player_name = "玩家" if self.current_player == 0 else "AI"
-        self.action_label.config(text=f"{player_name} 先手")
-        self.start_button.config(state="disabled")
-        self.update_turn_label()
-
-        if self.current_player == 1:  # 如果 AI 先手，直接开始 AI 的回合
-            self.ai_turn()
-        else:
-            self.root.bind("<Button-1>", self.human_move)  # 绑定玩家操作
-
-    def human_move(self, event):
-        """玩家操作"""
-        row = event.y // self.cell_size
-        col = event.x // self.cell_size
-        piece = self.get_piece(row, col)
-
-        if piece and piece.state == "unknown":
-            # 如果棋子状态为未知，允许翻开
-            self.flip_piece(row, col)
-            if self.check_game_over():
-                self.end_game()
-            else:
-                self.current_player = 1 - self.current_player
-                self.update_turn_label()
-                self.ai_turn()
-        elif piece and piece.state == "known" and piece.player == self.current_player:
-            # 如果棋子状态为已知且属于当前玩家，尝试移动
-            valid_moves = self.get_valid_moves(row, col)
-            if valid_moves:
-                self.action_label.config(text=f"选择目标位置：{valid_moves}")
-                self.root.bind("<Button-1>", lambda e, r=row, c=col: self.complete_human_move(e, r, c))
-            else:
-                self.action_label.config(text="当前棋子无法移动，请选择其他棋子")
-        elif not piece:
-            self.action_label.config(text="非法操作，请重新选择")
-        else:
-            self.action_label.config(text="非法操作，请重新选择")
-
-    def complete_human_move(self, event, from_row, from_col):
-        """完成玩家的移动操作"""
-        to_row = event.y // self.cell_size
-        to_col = event.x // self.cell_size
-        valid_moves = self.get_valid_moves(from_row, from_col)
-
-        if (to_row, to_col) in valid_moves:
-            reward = self.move_piece(from_row, from_col, to_row, to_col)
-            if self.check_game_over():
-                self.end_game()
-            else:
-                self.current_player = 1 - self.current_player
-                self.update_turn_label()
-                self.ai_turn()
-        else:
-            self.action_label.config(text="非法移动，请重新选择")
-            self.root.bind("<Button-1>", self.human_move)
-
-    def ai_turn(self):
-        """AI 回合"""
-        self.action_label.config(text="AI思考中...")  # 显示AI思考中
-        self.root.update()  # 更新界面以显示状态
-        time.sleep(0.5)  # 暂停0.5秒
-
-        agent = self.agents[self.current_player]
-        state = agent.get_state(self.board)
-        action = agent.choose_action(state, self.board, self.current_player)
-
-        reward = 0
-        if action == "flip":
-            unknown_pieces = [(r, c) for r in range(self.size) for c in range(self.size) if self.get_piece(r, c) and self.get_piece(r, c).state == "unknown"]
-            if unknown_pieces:
-                row, col = random.choice(unknown_pieces)
-                reward = self.flip_piece(row, col)
-                self.action_label.config(text=f"AI翻开棋子：{self.get_piece(row, col).name}，奖励：{reward}")
-        elif action == "move":
-            known_pieces = [(r, c) for r in range(self.size) for c in range(self.size) if self.get_piece(r, c) and self.get_piece(r, c).state == "known" and self.get_piece(r, c).player == self.current_player]
-            if known_pieces:
-                from_row, from_col = random.choice(known_pieces)
-                valid_moves = self.get_valid_moves(from_row, from_col)
-                if valid_moves:
-                    to_row, to_col = random.choice(valid_moves)
-                    reward = self.move_piece(from_row, from_col, to_row, to_col)
-                    self.action_label.config(text=f"AI移动棋子：{self.get_piece(to_row, to_col).name}，奖励：{reward}")
-        elif action == "capture":
-            capture_actions = []
-            for r in range(self.size):
-                for c in range(self.size):
-                    piece = self.get_piece(r, c)
-                    if piece and piece.state == "known" and piece.player == self.current_player:
-                        valid_moves = self.get_valid_moves(r, c)
-                        for move in valid_moves:
-                            target_piece = self.get_piece(move[0], move[1])
-                            if target_piece and target_piece.player != piece.player:
-                                capture_actions.append((r, c, move[0], move[1]))
-            if capture_actions:
-                from_row, from_col, to_row, to_col = random.choice(capture_actions)
-                reward = self.move_piece(from_row, from_col, to_row, to_col)
-                self.action_label.config(text=f"AI击杀棋子：{self.get_piece(to_row, to_col).name}，奖励：{reward}")
-        elif action == "skip":
-            self.skip_turns[self.current_player] += 1
-            reward = -1  # 跳过回合的惩罚
-            self.action_label.config(text=f"AI跳过回合，惩罚：{reward}")
-
-        next_state = agent.get_state(self.board)
-        agent.update_q_table(state, action, reward, next_state)
-
-        if self.check_game_over():
-            self.end_game()
-        else:
-            self.current_player = 1 - self.current_player
-            self.update_turn_label()
-            if self.current_player == 0:
-                self.root.bind("<Button-1>", self.human_move)
-
-    def flip_piece(self, row, col):
-        """翻开棋子"""
-        piece = self.get_piece(row, col)
-        if piece and piece.state == "unknown":
-            piece.state = "known"
-            self.update_draw_piece(row, col, piece)
-            self.action_label.config(text=f"{'玩家' if self.current_player == 0 else 'AI'} 翻开了棋子：{piece.name}")
-            return 1  # 成功翻开棋子的奖励
-        return 0  # 未翻开棋子的奖励
-
-    def move_piece(self, from_row, from_col, to_row, to_col):
-        """移动棋子"""
-        piece = self.get_piece(from_row, from_col)
-        if piece and piece.player == self.current_player and (to_row, to_col) in self.get_valid_moves(from_row, from_col):
-            target_piece = self.get_piece(to_row, to_col)
-            if target_piece and target_piece.player != piece.player and can_capture(piece.name, target_piece.name):
-                reward = self.piece_values[target_piece.name]
-                target_piece.alive = 0
-                self.board[to_row][to_col] = None
-                if self.current_player == 1:  # 只显示 AI 的行为奖励
-                    self.action_label.config(text=f"AI的{piece.name}击杀了{target_piece.name}，奖励：{reward}")
-            else:
-                reward = -0.1
-                if self.current_player == 1:  # 只显示 AI 的行为奖励
-                    self.action_label.config(text=f"AI移动了{piece.name}，奖励：{reward}")
-            self.board[from_row][from_col] = None
-            self.board[to_row][to_col] = piece
-            self.canvas.delete("all")
-            self.draw_board()
-            for r in range(self.size):
-                for c in range(self.size):
-                    p = self.get_piece(r, c)
-                    if p:
-                        self.draw_piece(r, c, p)
-            self.update_draw_piece(to_row, to_col, piece)
-            return reward
-        return -1  # 无效移动的奖励
-
-    def get_valid_moves(self, row, col):
-        """获取棋子的合法移动位置"""
-        moves = []
-        piece = self.get_piece(row, col)
-        if not piece or piece.state != "known":
-            return moves
-
-        for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            nr, nc = row + dr, col + dc
-            if 0 <= nr < self.size and 0 <= nc < self.size:
-                target_piece = self.get_piece(nr, nc)
-                if not target_piece:
-                    moves.append((nr, nc))
-                elif target_piece.player != piece.player and target_piece.state == "known":
-                    if can_capture(piece.name, target_piece.name):
-                        moves.append((nr, nc))
-        return moves
-
-    def check_game_over(self):
-        """检查游戏是否结束"""
-        blue_king_alive = any(piece.name == "king" and piece.alive == 1 and piece.player == 0 for row in self.board for piece in row if piece)
-        red_king_alive = any(piece.name == "king" and piece.alive == 1 and piece.player == 1 for row in self.board for piece in row if piece)
-
-        if not blue_king_alive:
-            print("蓝方国王被消灭，红方获胜")
-            return True
-        elif not red_king_alive:
-            print("红方国王被消灭，蓝方获胜")
-            return True
-
-        if self.skip_turns[0] > 50:
-            print("蓝方跳过回合超过50次，红方获胜")
-            return True
-        elif self.skip_turns[1] > 50:
-            print("红方跳过回合超过50次，蓝方获胜")
-            return True
-
-        remaining_pieces = [piece for row in self.board for piece in row if piece and piece.alive == 1]
-        if len(remaining_pieces) == 2:
-            piece_values = {"farmer": 1, "soilder": 2, "archer": 3, "knight": 4, "king": 20}
-            remaining_values = [piece_values[piece.name] for piece in remaining_pieces]
-            if remaining_values[0] > remaining_values[1]:
-                print("等级高的玩家获胜")
-                return True
-            elif remaining_values[0] < remaining_values[1]:
-                print("等级高的玩家获胜")
-                return True
-            else:
-                print("平局：剩余棋子等级相同")
-                return True
-
-        return False
-
-    def end_game(self):
-        """结束游戏"""
-        winner = "玩家" if self.current_player == 0 else "AI"
-        messagebox.showinfo("游戏结束", f"{winner}获胜！")
-        self.start_button.config(state="normal")
-
-if __name__ == "__main__":
-    root = tk.Tk()
-    root.title("CAT-KINGDOM Test")
-    board = TestBoard(root, size=5)
-    root.mainloop()
\ No newline at end of file
+import tkinter as tk
+from tkinter import messagebox
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from board import Board
+from engine import GameEngine
+from ai import QLearningAgent
+from profiling import timers
+
+
+class TestBoard(Board):
+    POLL_INTERVAL = 50  # 轮询 AI 结果的间隔（毫秒）
+
+    def __init__(self, root, size=5, ai_delay=500, ai="q", search_budget=500, shared_q=False):
+        super().__init__(root, size)
+        self.root = root
+        self.size = size
+        self.ai_delay = ai_delay  # AI 落子前“思考中”提示至少显示的时间（毫秒），只影响显示
+        self.engine = GameEngine(size)  # 规则引擎，棋盘数据由它维护
+        self.game_started = False
+        self.agents = [QLearningAgent(), QLearningAgent()]  # 初始化两个智能体
+        # ai="search" 时由搜索 AI 在 search_budget 毫秒内选择具体走法，否则使用 Q 表
+        self.searcher = None
+        if ai == "search":
+            from search import SearchAgent
+            self.searcher = SearchAgent(search_budget)
+        self.executor = ThreadPoolExecutor(max_workers=1)  # AI 在后台线程中选择动作，界面保持响应
+        self.ai_poll_id = None
+
+        # 初始化界面
+        self.turn_label = tk.Label(root, text="", font=("Arial", 14))
+        self.turn_label.grid(row=size + 1, column=0, columnspan=size)
+        self.action_label = tk.Label(root, text="", font=("Arial", 12))
+        self.action_label.grid(row=size + 2, column=0, columnspan=size)
+
+        # 添加开始按钮，Q 表加载完成前不可用
+        self.start_button = tk.Button(root, text="加载Q表中...", command=self.start_game, state="disabled")
+        self.start_button.grid(row=size + 3, column=0, columnspan=size)
+
+        # 初始化棋盘
+        self.reset()
+
+        # 在后台线程中加载训练好的 Q 表（连带导入 pandas / NumPy），窗口先显示出来
+        future = self.executor.submit(self.load_q_tables, shared_q)
+        self.ai_poll_id = self.root.after(self.POLL_INTERVAL, self.poll_q_tables, future)
+
+    def load_q_tables(self, shared_q):
+        """在后台线程中执行；shared_q 时附加到 qtable_service 发布的共享内存表"""
+        with timers.phase("load_q"):
+            for agent, name in zip(self.agents, ("agent1_q_table", "agent2_q_table")):
+                if shared_q:
+                    agent.attach_q_table(name)
+                else:
+                    agent.load_q_table(name)
+
+    def poll_q_tables(self, future):
+        """Q 表加载完成后启用开始按钮，失败时在界面上显示原因"""
+        self.ai_poll_id = None
+        if not future.done():
+            self.ai_poll_id = self.root.after(self.POLL_INTERVAL, self.poll_q_tables, future)
+            return
+        error = future.exception()
+        if error is not None:
+            self.start_button.config(text="Q表加载失败")
+            self.action_label.config(text=str(error))
+            return
+        self.start_button.config(text="开始游戏", state="normal")
+
+    @property
+    def current_player(self):
+        """当前玩家，游戏开始前为 None"""
+        return self.engine.current_player if self.game_started else None
+
+    def reset(self):
+        """重置棋盘"""
+        self.cancel_ai_poll()
+        self.engine.reset()
+        self.engine.setup_pieces()
+        self.board = self.engine.board
+        self.redraw()
+        self.update_turn_label()
+        self.action_label.config(text="")
+
+    def update_turn_label(self):
+        """更新当前回合的标签"""
+        if self.current_player is None:
+            self.turn_label.config(text="游戏未开始")
+        else:
+            player_name = "玩家" if self.current_player == 0 else "AI"
+            self.turn_label.config(text=f"当前回合：{player_name} ({'蓝方' if self.current_player == 0 else '红方'})")
+
+    def start_game(self):
+        """开始游戏"""
+        self.reset()
+        self.game_started = True
+        self.engine.current_player = random.choice([0, 1])  # 随机选择先手
+        player_name = "玩家" if self.current_player == 0 else "AI"
+        self.action_label.config(text=f"{player_name} 先手")
+        self.start_button.config(state="disabled")
+        self.update_turn_label()
+
+        if self.current_player == 1:  # 如果 AI 先手，直接开始 AI 的回合
+            self.ai_turn()
+        else:
+            self.root.bind("<Button-1>", self.human_move)  # 绑定玩家操作
+
+    def human_move(self, event):
+        """玩家操作"""
+        row = event.y // self.cell_size
+        col = event.x // self.cell_size
+        if not (0 <= row < self.size and 0 <= col < self.size):
+            return
+        piece = self.get_piece(row, col)
+
+        if piece and piece.state == "unknown":
+            # 如果棋子状态为未知，允许翻开
+            self.engine.flip_piece(row, col)
+            self.show_action(self.engine.last_action)
+            self.action_label.config(text=self.engine.describe_last_action("玩家"))
+            self.finish_turn()
+        elif piece and piece.state == "known" and piece.player == self.current_player:
+            # 如果棋子状态为已知且属于当前玩家，尝试移动
+            valid_moves = self.engine.get_valid_moves(row, col)
+            if valid_moves:
+                self.action_label.config(text=f"选择目标位置：{valid_moves}")
+                self.root.bind("<Button-1>", lambda e, r=row, c=col: self.complete_human_move(e, r, c))
+            else:
+                self.action_label.config(text="当前棋子无法移动，请选择其他棋子")
+        else:
+            self.action_label.config(text="非法操作，请重新选择")
+
+    def complete_human_move(self, event, from_row, from_col):
+        """完成玩家的移动操作"""
+        to_row = event.y // self.cell_size
+        to_col = event.x // self.cell_size
+
+        if self.engine.move_piece(from_row, from_col, to_row, to_col) != -1:
+            self.show_action(self.engine.last_action)
+            self.action_label.config(text=self.engine.describe_last_action("玩家"))
+            self.finish_turn()
+        else:
+            self.action_label.config(text="非法移动，请重新选择")
+            self.root.bind("<Button-1>", self.human_move)
+
+    def finish_turn(self):
+        """结束当前回合：判定胜负，然后交给下一位玩家"""
+        with timers.phase("check"):
+            game_over = self.engine.end_turn()
+        if game_over:
+            self.end_game()
+            return
+        self.update_turn_label()
+        if self.current_player == 1:
+            self.ai_turn()
+        elif not self.engine.has_valid_actions():
+            self.engine.skip_turn()
+            self.action_label.config(text="玩家无可用行动，自动跳过")
+            self.finish_turn()
+        else:
+            self.root.bind("<Button-1>", self.human_move)
+
+    def ai_turn(self):
+        """AI 回合：在后台线程中选择动作，主线程通过 after 轮询结果"""
+        self.root.bind("<Button-1>", self.ignore_click)
+        self.action_label.config(text="AI思考中")  # 显示AI思考中
+        agent = self.agents[self.current_player]
+        future = self.executor.submit(self.choose_ai_action, agent, self.current_player)
+        self.ai_poll_id = self.root.after(self.POLL_INTERVAL, self.poll_ai_turn, future, time.perf_counter(), 0)
+
+    def choose_ai_action(self, agent, player):
+        """在后台线程中执行；AI 回合期间玩家输入被屏蔽，棋盘不会被主线程修改"""
+        if self.searcher:
+            with timers.phase("choose"):
+                return agent, None, self.searcher.choose_move(self.engine)
+        with timers.phase("encode"):
+            state = agent.state_key(self.engine)
+        with timers.phase("choose"):
+            action = agent.choose_action(state, self.board, player)
+        return agent, state, action
+
+    def poll_ai_turn(self, future, started, ticks):
+        """AI 结果就绪且提示已显示满 ai_delay 毫秒后落子，否则更新提示并继续轮询"""
+        self.ai_poll_id = None
+        if not future.done() or (time.perf_counter() - started) * 1000 < self.ai_delay:
+            ticks += 1
+            self.action_label.config(text="AI思考中" + "." * (ticks // 5 % 4))
+            self.ai_poll_id = self.root.after(self.POLL_INTERVAL, self.poll_ai_turn, future, started, ticks)
+            return
+        error = future.exception()
+        if error is not None:
+            # AI 出错时结束本局，而不是让棋盘一直停在“AI思考中”
+            self.root.unbind("<Button-1>")
+            self.game_started = False
+            self.update_turn_label()
+            self.action_label.config(text=f"AI出错：{error}")
+            self.start_button.config(state="normal")
+            return
+        self.complete_ai_turn(*future.result())
+
+    def cancel_ai_poll(self):
+        if self.ai_poll_id is not None:
+            self.root.after_cancel(self.ai_poll_id)
+            self.ai_poll_id = None
+
+    def ignore_click(self, event):
+        """AI 回合中忽略棋盘点击"""
+        self.root.bell()
+
+    def complete_ai_turn(self, agent, state, action):
+        """在主线程中执行 AI 选择的动作并刷新界面"""
+        if self.searcher:
+            from search import apply_move
+
+            with timers.phase("apply"):
+                reward = apply_move(self.engine, action)
+            text = f"{self.engine.describe_last_action('AI', reward)}（{self.searcher.last_stats['nodes_per_sec']:.0f} 节点/秒）"
+        else:
+            with timers.phase("apply"):
+                reward = self.engine.apply_action(action)
+            with timers.phase("encode"):
+                next_state = agent.state_key(self.engine)
+            with timers.phase("q_update"):
+                agent.update_q_table(state, action, reward, next_state)
+            text = self.engine.describe_last_action("AI", reward)
+
+        with timers.phase("render"):
+            self.show_action(self.engine.last_action)
+            self.action_label.config(text=text)
+        self.finish_turn()
+
+    def end_game(self):
+        """结束游戏"""
+        self.root.unbind("<Button-1>")
+        winner = self.engine.winner
+        if winner is None:
+            messagebox.showinfo("游戏结束", self.engine.end_reason)
+        else:
+            messagebox.showinfo("游戏结束", f"{'玩家' if winner == 0 else 'AI'}获胜！{self.engine.end_reason}")
+        self.start_button.config(state="normal")
+
+    def close(self):
+        """关闭窗口并停止后台线程"""
+        self.cancel_ai_poll()
+        self.executor.shutdown(wait=False)
+        self.root.destroy()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="与训练好的 AI 对战")
+    parser.add_argument("--ai-delay", type=int, default=500, help="AI 落子前“思考中”提示的最短显示时间（毫秒）")
+    parser.add_argument("--ai", choices=["q", "search"], default="q", help="Q 表智能体或搜索 AI")
+    parser.add_argument("--budget", type=int, default=500, help="搜索 AI 每步的思考时间（毫秒）")
+    parser.add_argument("--shared-q", action="store_true", help="附加到 qtable_service.py 发布的共享内存 Q 表")
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    root.title("CAT-KINGDOM Test")
+    board = TestBoard(root, size=5, ai_delay=args.ai_delay, ai=args.ai, search_budget=args.budget,
+                      shared_q=args.shared_q)
+    root.protocol("WM_DELETE_WINDOW", board.close)
+    root.mainloop()
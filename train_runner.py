@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import random
+import time
+from ai import QLearningAgent
+from engine import GameEngine
+from qjournal import QJournal
+from train import play_game
+
+
+class JournaledAgent(QLearningAgent):
+    """记录自上次检查点以来 Q 值被更新过的状态"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.dirty = set()
+
+    def update_q_table(self, state, action, reward, next_state):
+        super().update_q_table(state, action, reward, next_state)
+        self.dirty.add(state)
+
+
+class TrainingRunner:
+    """可中断、可恢复的批量训练
+
+    每 checkpoint_games 局或 checkpoint_seconds 秒做一次检查点：把改动过的行追加到各智能体的日志，
+    再原子地写入进度文件。日志超过快照大小的 compact_ratio 倍时在后台合并进快照。
+    快照、日志和进度文件都放在 data/runs/<run_name> 下，训练完成后 finish() 才把结果写成
+    data 文件夹中 test.py 等加载的 Q 表，中途的检查点和 --fresh 都不会覆盖已发布的表。
+    """
+
+    def __init__(self, names=("agent1_q_table", "agent2_q_table"), board_size=5, seed=0,
+                 checkpoint_games=100, checkpoint_seconds=60, compact_ratio=0.5, run_name="default"):
+        self.run_dir = os.path.join("data", "runs", run_name)
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.names = names
+        self.seed = seed
+        self.checkpoint_games = checkpoint_games
+        self.checkpoint_seconds = checkpoint_seconds
+        self.compact_ratio = compact_ratio
+        self.progress_path = os.path.join(self.run_dir, "training_run.json")
+        self.engine = GameEngine(board_size)
+        self.agents = [JournaledAgent() for _ in names]
+        self.journals = [QJournal(os.path.join(self.run_dir, f"{name}.qtb")) for name in names]
+        self.games_done = 0
+        self.elapsed = 0.0  # 之前各次运行累计的训练时间
+
+    def resume(self):
+        """从快照和日志恢复 Q 表与进度；新的运行从 data 文件夹中已发布的 Q 表出发"""
+        if not os.path.exists(self.progress_path):
+            for agent, journal, name in zip(self.agents, self.journals, self.names):
+                agent.load_q_table(name)
+                journal.reset(dict(agent.q_table.items()))
+        for agent, journal in zip(self.agents, self.journals):
+            agent.q_table = journal.load()
+        if os.path.exists(self.progress_path):
+            with open(self.progress_path, encoding="utf-8") as f:
+                progress = json.load(f)
+            self.games_done = progress["games"]
+            self.elapsed = progress["elapsed"]
+        print(f"已恢复 {self.games_done} 局的训练进度，Q表状态数：{[len(a.q_table) for a in self.agents]}")
+
+    def start_fresh(self):
+        """清空本次运行的快照、日志和进度，从空表开始训练（已发布的 Q 表不受影响）"""
+        for agent, journal in zip(self.agents, self.journals):
+            agent.q_table = {}
+            agent.dirty = set()
+            journal.reset()
+        self.games_done = 0
+        self.elapsed = 0.0
+        self.save_progress()
+
+    def save_progress(self):
+        tmp_path = self.progress_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"games": self.games_done, "elapsed": self.elapsed, "seed": self.seed, "names": list(self.names)}, f)
+        os.replace(tmp_path, self.progress_path)
+
+    def checkpoint(self):
+        """追加改动过的行到日志后再更新进度，返回写入的字节数"""
+        written = 0
+        for agent, journal in zip(self.agents, self.journals):
+            written += journal.append(agent.q_table, list(agent.dirty))
+            agent.dirty = set()
+        self.save_progress()
+        for journal in self.journals:
+            if not journal.compacting() and journal.size() > self.compact_ratio * max(journal.snapshot_size(), 1 << 20):
+                journal.start_compaction()
+        return written
+
+    def run(self, num_games, time_limit=None):
+        """训练到累计 num_games 局，或本次运行达到 time_limit 秒为止；返回本次完成的局数"""
+        start = last_checkpoint = time.perf_counter()
+        games_at_start = self.games_done
+        games_since_checkpoint = 0
+        try:
+            while self.games_done < num_games:
+                if time_limit is not None and time.perf_counter() - start >= time_limit:
+                    print(f"达到时间上限 {time_limit}s")
+                    break
+                # 每局使用由 (种子, 局数) 决定的随机数，恢复后的对局序列与未中断时相同
+                game_seed = None if self.seed is None else self.seed * 1_000_003 + self.games_done
+                play_game(self.engine, self.agents, random.Random(game_seed))
+                self.games_done += 1
+                games_since_checkpoint += 1
+
+                now = time.perf_counter()
+                if games_since_checkpoint >= self.checkpoint_games or now - last_checkpoint >= self.checkpoint_seconds:
+                    self.elapsed += now - last_checkpoint
+                    self.checkpoint()
+                    last_checkpoint = now
+                    games_since_checkpoint = 0
+                    rate = (self.games_done - games_at_start) / (now - start) * 60
+                    print(f"已完成 {self.games_done} 局训练，{rate:.0f} 局/分钟")
+        except KeyboardInterrupt:
+            print("训练被中断，正在保存检查点")
+        finally:
+            self.elapsed += time.perf_counter() - last_checkpoint
+            self.checkpoint()
+            for journal in self.journals:
+                journal.wait()
+        return self.games_done - games_at_start
+
+    def finish(self, export_csv=True):
+        """把日志合并进本次运行的快照，再把完整的 Q 表发布到 data 文件夹；
+        export_csv 时同时重写 CSV（完整重写，只在训练结束时做）"""
+        for journal in self.journals:
+            journal.start_compaction(background=False)
+        for agent, name in zip(self.agents, self.names):
+            if export_csv:
+                agent.save_q_table(name)
+            else:
+                agent.save_q_table_as_binary(f"{name}.qtb")
+
+    def close(self):
+        for journal in self.journals:
+            journal.close()
+
+
+def run_training(num_games=1000, time_limit=None, fresh=False, seed=0, checkpoint_games=100,
+                 checkpoint_seconds=60, export_csv=True, run_name="default"):
+    """训练到累计 num_games 局；被中断或到达时间上限后再次运行会从上次的检查点继续"""
+    runner = TrainingRunner(seed=seed, checkpoint_games=checkpoint_games, checkpoint_seconds=checkpoint_seconds,
+                            run_name=run_name)
+    try:
+        if fresh:
+            runner.start_fresh()
+        else:
+            runner.resume()
+        runner.run(num_games, time_limit)
+        if runner.games_done >= num_games:
+            runner.finish(export_csv)
+            print(f"训练完成，共 {runner.games_done} 局，累计 {runner.elapsed:.1f}s")
+        else:
+            print(f"已保存检查点（{runner.games_done}/{num_games} 局），再次运行即可继续")
+    finally:
+        runner.close()
+    return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="可恢复的批量训练（检查点 + 只追加的Q值日志）")
+    parser.add_argument("--games", type=int, default=1000, help="累计训练局数")
+    parser.add_argument("--time-limit", type=float, help="本次运行的最长时间（秒）")
+    parser.add_argument("--fresh", action="store_true", help="丢弃本次运行已有的检查点和进度，从空表开始")
+    parser.add_argument("--run", default="default", help="运行名，检查点保存在 data/runs/<运行名> 下")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--checkpoint-games", type=int, default=100)
+    parser.add_argument("--checkpoint-seconds", type=float, default=60)
+    parser.add_argument("--no-csv", action="store_true", help="结束时不导出 CSV")
+    args = parser.parse_args()
+    run_training(args.games, args.time_limit, args.fresh, args.seed, args.checkpoint_games,
+                 args.checkpoint_seconds, not args.no_csv, args.run)
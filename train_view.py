@@ -0,0 +1,106 @@
+import tkinter as tk
+from board import Board
+from engine import GameEngine
+from ai import QLearningAgent
+from profiling import timers
+
+
+class TrainingBoard(Board):
+    """自我对弈观战界面：规则由 GameEngine 执行，这里只负责逐回合显示"""
+
+    def __init__(self, root, size=5, delay=1000):
+        super().__init__(root, size)
+        self.root = root
+        self.delay = delay  # 每回合之间的间隔（毫秒）
+        self.is_destroyed = False  # 标记窗口是否被销毁
+        self.after_ids = []  # 存储所有 after 的标识符
+        self.engine = GameEngine(size)
+
+        # 初始化界面
+        self.turn_label = tk.Label(root, text="当前回合：蓝方", font=("Arial", 14))
+        self.turn_label.grid(row=size + 1, column=0, columnspan=size)
+        self.action_label = tk.Label(root, text="", font=("Arial", 12))
+        self.action_label.grid(row=size + 2, column=0, columnspan=size)
+
+        # 初始化智能体
+        self.agents = [QLearningAgent(), QLearningAgent()]
+
+    def cancel_all_after(self):
+        """取消所有未完成的 after 脚本"""
+        for after_id in self.after_ids:
+            try:
+                self.root.after_cancel(after_id)
+            except Exception as e:
+                print(f"Error canceling after script: {e}")
+        self.after_ids = []
+
+    def destroy(self):
+        """销毁窗口"""
+        if not self.is_destroyed:
+            self.is_destroyed = True
+            self.cancel_all_after()
+            self.root.destroy()
+
+    def reset(self):
+        """重置棋盘"""
+        self.engine.reset()
+        self.engine.setup_pieces()
+        self.board = self.engine.board
+        self.redraw()
+        self.update_turn_label()
+        self.action_label.config(text="")
+
+    def update_turn_label(self):
+        """更新当前回合的标签"""
+        self.turn_label.config(text=f"当前回合：{'蓝方' if self.engine.current_player == 0 else '红方'}")
+
+    def play_turn(self):
+        """AI 执行一个回合并刷新界面"""
+        engine = self.engine
+        agent = self.agents[engine.current_player]
+        with timers.phase("encode"):
+            state = agent.state_key(engine)
+        with timers.phase("choose"):
+            action = agent.choose_action(state, self.board, engine.current_player)
+        with timers.phase("apply"):
+            reward = engine.apply_action(action)
+        with timers.phase("encode"):
+            next_state = agent.state_key(engine)
+        with timers.phase("q_update"):
+            agent.update_q_table(state, action, reward, next_state)
+
+        with timers.phase("render"):
+            self.show_action(engine.last_action)
+            self.action_label.config(text=engine.describe_last_action("蓝方" if engine.current_player == 0 else "红方", reward))
+
+        with timers.phase("check"):
+            game_over = engine.end_turn()
+        if game_over:
+            self.action_label.config(text=engine.end_reason)
+            self.after_ids.append(self.root.after(self.delay, self.start))
+        else:
+            self.update_turn_label()
+            self.after_ids.append(self.root.after(self.delay, self.play_turn))
+
+    def start(self):
+        """开始新的一局"""
+        self.cancel_all_after()
+        self.reset()
+        self.after_ids.append(self.root.after(self.delay, self.play_turn))
+
+
+def watch_agents(delay=1000, board_size=5):
+    """载入训练好的 Q 表，在窗口中观看两个智能体对弈"""
+    root = tk.Tk()
+    root.title("Royal Chess Training")
+
+    board = TrainingBoard(root, board_size, delay)
+    board.agents[0].load_q_table("agent1_q_table")
+    board.agents[1].load_q_table("agent2_q_table")
+    board.start()
+    root.protocol("WM_DELETE_WINDOW", board.destroy)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    watch_agents()
@@ -0,0 +1,272 @@
+import argparse
+import os
+import random
+import struct
+import time
+import numpy as np
+from qtable_store import ACTIONS
+
+
+TRAJECTORY_MAGIC = b"CKTR"
+TRAJECTORY_VERSION = 1
+FILE_HEADER = struct.Struct("<4sI")  # 魔数、版本号；之后是定长的转移记录，直到文件末尾
+TRANSITION = np.dtype([
+    ("state", "<i8"),        # 行动方智能体的状态键（agent.state_key）
+    ("next_state", "<i8"),
+    ("game", "<u4"),         # 对局编号，同一文件中递增
+    ("seed", "<u4"),         # 产生该对局的随机种子（低 32 位）
+    ("reward", "<f8"),       # 与引擎给出的奖励完全相同，逐条重放才能复现在线训练的结果
+    ("action", "u1"),        # ACTIONS 中的下标
+    ("player", "u1"),        # 行动方，决定更新哪一张 Q 表
+    ("done", "u1"),          # 这一步之后对局是否结束
+])  # 紧凑排列，每条 35 字节
+ACTION_INDEX = {action: i for i, action in enumerate(ACTIONS)}
+
+
+def check_header(f, filepath):
+    magic, version = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != TRAJECTORY_MAGIC or version != TRAJECTORY_VERSION:
+        raise ValueError(f"{filepath} 不是有效的轨迹文件")
+
+
+def record_count(filepath):
+    """文件中完整记录的条数；末尾写了一半的记录不计入"""
+    return max(0, os.path.getsize(filepath) - FILE_HEADER.size) // TRANSITION.itemsize
+
+
+class TrajectoryWriter:
+    """自我对弈转移的只追加写入器
+
+    记录先写进一个固定大小的结构化数组，满了才一次性写到文件，每条转移只是一次数组赋值。
+    打开已有文件时先截掉末尾不完整的记录（上次运行中途崩溃），对局编号接着已有的最后一局继续。
+    """
+
+    def __init__(self, filepath, seed=None, buffer_size=65536):
+        self.filepath = filepath
+        self.seed = (seed or 0) & 0xFFFFFFFF
+        self.buffer = np.zeros(buffer_size, dtype=TRANSITION)
+        self.pending = 0
+        self.game = -1
+        if os.path.exists(filepath) and os.path.getsize(filepath) >= FILE_HEADER.size:
+            count = record_count(filepath)
+            with open(filepath, "r+b") as f:
+                check_header(f, filepath)
+                f.truncate(FILE_HEADER.size + count * TRANSITION.itemsize)
+                if count:
+                    f.seek(FILE_HEADER.size + (count - 1) * TRANSITION.itemsize)
+                    self.game = int(np.frombuffer(f.read(TRANSITION.itemsize), dtype=TRANSITION)["game"][0])
+            self.file = open(filepath, "ab")
+        else:
+            self.file = open(filepath, "wb")
+            self.file.write(FILE_HEADER.pack(TRAJECTORY_MAGIC, TRAJECTORY_VERSION))
+        self.written = 0
+
+    def begin_game(self):
+        """开始新的一局，返回它的对局编号"""
+        self.game += 1
+        return self.game
+
+    def add(self, player, state, action, reward, next_state, done):
+        if self.pending == len(self.buffer):
+            self.flush()
+        self.buffer[self.pending] = (state, next_state, self.game, self.seed, reward, ACTION_INDEX[action], player, done)
+        self.pending += 1
+
+    def flush(self):
+        if self.pending:
+            self.file.write(self.buffer[:self.pending].tobytes())
+            self.written += self.pending
+            self.pending = 0
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_chunks(filepaths, chunk_size=1_000_000):
+    """按顺序逐块读取一个或多个轨迹文件，每块是最多 chunk_size 条记录的结构化数组
+
+    任何时候内存中只有一块数据，处理任意长的文件占用的内存都是固定的。
+    """
+    if isinstance(filepaths, str):
+        filepaths = [filepaths]
+    for filepath in filepaths:
+        remaining = record_count(filepath)
+        with open(filepath, "rb") as f:
+            check_header(f, filepath)
+            while remaining:
+                chunk = np.fromfile(f, dtype=TRANSITION, count=min(chunk_size, remaining))
+                remaining -= len(chunk)
+                yield chunk
+
+
+def for_player(chunks, player):
+    """只保留某一方的转移；player 为 None 时原样传递（双方共用一张表）"""
+    for chunk in chunks:
+        yield chunk if player is None else chunk[chunk["player"] == player]
+
+
+def iter_transitions(chunks):
+    """把记录块展开为 update_q_table 的参数 (player, state, action, reward, next_state)"""
+    for chunk in chunks:
+        yield from zip(chunk["player"].tolist(), chunk["state"].tolist(), [ACTIONS[a] for a in chunk["action"].tolist()],
+                       chunk["reward"].tolist(), chunk["next_state"].tolist())
+
+
+def replay_updates(filepaths, agents, chunk_size=1_000_000):
+    """按记录顺序把每条转移交给 agents[player].update_q_table
+
+    与自我对弈时的更新顺序完全相同：从同样的初始表出发，得到的 Q 表与在线训练的结果一致；
+    换一组 alpha / gamma 就是不重新对弈的重新训练。返回处理的转移数。
+    """
+    count = 0
+    updates = [agent.update_q_table for agent in agents]
+    for player, state, action, reward, next_state in iter_transitions(iter_chunks(filepaths, chunk_size)):
+        updates[player](state, action, reward, next_state)
+        count += 1
+    return count
+
+
+def fitted_q(filepaths, store, player=None, alpha=0.1, gamma=0.99, batch_size=4096, chunk_size=1_000_000):
+    """在 ArrayQStore 上按小批量做向量化 TD 更新，完整扫描一遍文件，返回 (转移数, TD 误差的均方根)
+
+    终局转移不再自举下一状态的价值；多次调用即多轮离线精修。
+    """
+    squared = 0.0
+    count = 0
+    for chunk in for_player(iter_chunks(filepaths, chunk_size), player):
+        if not len(chunk):
+            continue
+        # 整块的状态键一次去重后再映射到行号，每个不同的键只经过一次字典
+        keys, inverse = np.unique(np.concatenate([chunk["state"], chunk["next_state"]]), return_inverse=True)
+        rows = np.fromiter(map(store.row, keys.tolist()), dtype=np.int64, count=len(keys))[inverse]
+        state_rows, next_rows = rows[:len(chunk)], rows[len(chunk):]
+        actions = chunk["action"].astype(np.int64)
+        rewards = chunk["reward"].astype(np.float64)
+        done = chunk["done"].astype(bool)
+        for start in range(0, len(chunk), batch_size):
+            batch = slice(start, start + batch_size)
+            td_error = store.td_update(state_rows[batch], actions[batch], rewards[batch], next_rows[batch],
+                                       done[batch], alpha, gamma)
+            squared += float(td_error @ td_error)
+        count += len(chunk)
+    return count, (squared / count) ** 0.5 if count else 0.0
+
+
+def record_self_play(filepath, num_games=1000, seed=0, board_size=5, load=False):
+    """自我对弈并把所有转移追加到 filepath；load 时从 data 中现有的 Q 表出发"""
+    from ai import QLearningAgent
+    from engine import GameEngine
+    from train import play_game
+
+    rng = random.Random(seed)
+    engine = GameEngine(board_size)
+    agents = [QLearningAgent(), QLearningAgent()]
+    if load:
+        agents[0].load_q_table("agent1_q_table")
+        agents[1].load_q_table("agent2_q_table")
+    start = time.perf_counter()
+    with TrajectoryWriter(filepath, seed) as log:
+        for _ in range(num_games):
+            play_game(engine, agents, rng, log)
+    elapsed = time.perf_counter() - start
+    print(f"已记录 {num_games} 局、{log.written} 条转移到 {filepath}，{log.written / elapsed:.0f} 转移/秒")
+    return agents
+
+
+def train_offline(filepaths, names=("agent1_q_table", "agent2_q_table"), mode="replay", epochs=1, alpha=0.1,
+                  gamma=0.99, batch_size=4096, chunk_size=1_000_000, refine=False, save=True):
+    """不重新对弈，只从轨迹文件重建（refine 时在 data 中现有的 Q 表上精修）Q 表
+
+    mode="replay" 逐条按原顺序调用 update_q_table；mode="batch" 在 ArrayQStore 上做小批量向量化 TD 更新，
+    每个 epoch 完整扫描一遍文件。names 只有一个时双方的转移都写入同一张表。
+    """
+    from ai import QLearningAgent
+    from replay import ArrayQStore
+
+    agents = [QLearningAgent(alpha=alpha, gamma=gamma) for _ in names]
+    for agent, name in zip(agents, names):
+        if refine:
+            agent.load_q_table(name)
+        if mode == "batch":
+            agent.q_table = ArrayQStore().load(agent.q_table)
+
+    start = time.perf_counter()
+    count = 0
+    for epoch in range(epochs):
+        if mode == "batch":
+            for player, agent in enumerate(agents):
+                updated, rms = fitted_q(filepaths, agent.q_table, player if len(agents) > 1 else None, alpha, gamma,
+                                        batch_size, chunk_size)
+                count += updated
+                print(f"第 {epoch + 1} 轮，Q表 {names[player]}：TD 误差均方根 {rms:.4f}")
+        else:
+            count += replay_updates(filepaths, agents * 2 if len(agents) == 1 else agents, chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"离线训练完成：{count} 条转移，{count / max(elapsed, 1e-9):.0f} 转移/秒，"
+          f"Q表状态数：{[len(agent.q_table) for agent in agents]}")
+
+    if save:
+        for agent, name in zip(agents, names):
+            agent.save_q_table(name)
+    return agents
+
+
+def describe(filepaths, chunk_size=1_000_000):
+    """统计轨迹文件：转移数、对局数、各动作占比和平均奖励"""
+    count = 0
+    games = 0
+    actions = np.zeros(len(ACTIONS), dtype=np.int64)
+    reward = 0.0
+    for chunk in iter_chunks(filepaths, chunk_size):
+        count += len(chunk)
+        games += int(np.count_nonzero(chunk["done"]))  # 每局恰好有一条终局转移
+        actions += np.bincount(chunk["action"], minlength=len(ACTIONS))
+        reward += float(chunk["reward"].sum(dtype=np.float64))
+    print(f"{count} 条转移，{games} 局完整对局，每条 {TRANSITION.itemsize} 字节")
+    if count:
+        print("动作占比：" + "，".join(f"{a} {n / count:.1%}" for a, n in zip(ACTIONS, actions.tolist())))
+        print(f"平均奖励：{reward / count:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="自我对弈轨迹日志：记录、查看，以及不重新对弈的离线训练")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record = subparsers.add_parser("record", help="自我对弈并追加转移到轨迹文件")
+    record.add_argument("path")
+    record.add_argument("--games", type=int, default=1000)
+    record.add_argument("--seed", type=int, default=0)
+    record.add_argument("--load", action="store_true", help="从 data 中现有的 Q 表出发")
+
+    train = subparsers.add_parser("train", help="从轨迹文件离线重建或精修 Q 表")
+    train.add_argument("paths", nargs="+")
+    train.add_argument("--names", nargs="+", default=["agent1_q_table", "agent2_q_table"],
+                       help="输出的 Q 表名；只给一个时双方共用一张表")
+    train.add_argument("--mode", choices=["replay", "batch"], default="replay",
+                       help="replay 按原顺序逐条更新，batch 为小批量向量化 TD 更新")
+    train.add_argument("--epochs", type=int, default=1)
+    train.add_argument("--alpha", type=float, default=0.1)
+    train.add_argument("--gamma", type=float, default=0.99)
+    train.add_argument("--batch-size", type=int, default=4096)
+    train.add_argument("--chunk-size", type=int, default=1_000_000, help="每次读入内存的记录数")
+    train.add_argument("--refine", action="store_true", help="在 data 中现有的 Q 表上继续训练")
+
+    info = subparsers.add_parser("info", help="统计轨迹文件")
+    info.add_argument("paths", nargs="+")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record_self_play(args.path, args.games, args.seed, load=args.load)
+    elif args.command == "train":
+        train_offline(args.paths, args.names, args.mode, args.epochs, args.alpha, args.gamma, args.batch_size,
+                      args.chunk_size, args.refine)
+    else:
+        describe(args.paths)
@@ -1,11 +1,39 @@
+PIECE_TYPES = ["farmer", "soilder", "archer", "knight", "king"]  # 棋子类型编号 0-4
+PIECE_CHINESE_NAMES = {"farmer": "农民", "soilder": "卫兵", "archer": "弓箭手", "knight": "骑士", "king": "国王"}
+PIECE_TYPE_IDS = {name: i for i, name in enumerate(PIECE_TYPES)}
+PIECE_TYPE_IDS.update({PIECE_CHINESE_NAMES[name]: i for i, name in enumerate(PIECE_TYPES)})
+
+# 捕获规则：攻击方 -> 可以捕获的棋子
+CAPTURE_RULES = {
+    "骑士": ["农民", "卫兵", "弓箭手", "骑士"],
+    "卫兵": ["农民", "卫兵"],
+    "弓箭手": ["农民", "卫兵", "弓箭手"],
+    "国王": ["农民", "卫兵", "弓箭手", "骑士", "国王"],
+    "农民": ["国王", "农民"]
+}
+
+# 预先计算的捕获矩阵：CAPTURE_MATRIX[攻击方类型][防守方类型]
+CAPTURE_MATRIX = [[PIECE_CHINESE_NAMES[defender] in CAPTURE_RULES[PIECE_CHINESE_NAMES[attacker]]
+                   for defender in PIECE_TYPES] for attacker in PIECE_TYPES]
+
+
 def can_capture(attacker, defender):
-    """判断是否可以捕获棋子"""
-    # 示例捕获规则：骑士可以捕获农民
-    capture_rules = {
-        "骑士": ["农民","卫兵","弓箭手","骑士"],
-        "卫兵": ["农民","卫兵"],
-        "弓箭手": ["农民","卫兵","弓箭手"],
-        "国王": ["农民","卫兵","弓箭手","骑士","国王"],
-        "农民": ["国王","农民"]
-    }
-    return defender in capture_rules.get(attacker, [])
\ No newline at end of file
+    """判断是否可以捕获棋子，接受英文或中文棋子名"""
+    attacker_id = PIECE_TYPE_IDS.get(attacker)
+    defender_id = PIECE_TYPE_IDS.get(defender)
+    if attacker_id is None or defender_id is None:
+        return False
+    return CAPTURE_MATRIX[attacker_id][defender_id]
+
+
+DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+_neighbor_cells = {}
+
+
+def neighbor_cells(size):
+    """预先计算每个格子上下左右的相邻格子，neighbor_cells(size)[row][col] 为 (row, col) 列表"""
+    if size not in _neighbor_cells:
+        _neighbor_cells[size] = [[[(row + dr, col + dc) for dr, dc in DIRECTIONS
+                                   if 0 <= row + dr < size and 0 <= col + dc < size]
+                                  for col in range(size)] for row in range(size)]
+    return _neighbor_cells[size]
@@ -0,0 +1,75 @@
+import ast
+import os
+import random
+
+
+PIECE_NAMES = ["farmer", "soilder", "archer", "knight", "king"]
+PIECE_STATES = ["unknown", "known"]
+LEGACY_NAMES = {"农民": "farmer", "卫兵": "soilder", "弓箭手": "archer", "骑士": "knight", "国王": "king"}
+ZOBRIST_SEED = 20250223  # 固定种子：Q 表持久化依赖哈希值在不同运行之间保持一致
+
+_tables = {}
+
+
+def zobrist_table(size=5):
+    """每个格子、每种 (棋子, 玩家, 状态) 组合对应一个 63 位随机数，空格为 0"""
+    if size not in _tables:
+        rng = random.Random(ZOBRIST_SEED + size)
+        _tables[size] = [{(name, player, state): rng.getrandbits(63)
+                          for name in PIECE_NAMES for player in (0, 1) for state in PIECE_STATES}
+                         for _ in range(size * size)]
+    return _tables[size]
+
+
+def piece_key(size, row, col, piece):
+    """单个棋子在某个格子上的哈希分量"""
+    return zobrist_table(size)[row * size + col][(piece.name, piece.player, piece.state)]
+
+
+def hash_board(board):
+    """从头计算整个棋盘的哈希值，与 GameEngine 增量维护的 state_key 相同"""
+    size = len(board)
+    table = zobrist_table(size)
+    key = 0
+    for row in range(size):
+        for col in range(size):
+            piece = board[row][col]
+            if piece:
+                key ^= table[row * size + col][(piece.name, piece.player, piece.state)]
+    return key
+
+
+def hash_legacy_state(state, size=5):
+    """把旧版 get_state 生成的字符串（列表的 str）转换为哈希值"""
+    table = zobrist_table(size)
+    key = 0
+    for index, (name, piece_state, player) in enumerate(ast.literal_eval(state)):
+        if name == "empty":
+            continue
+        key ^= table[index][(LEGACY_NAMES.get(name, name), player, piece_state)]
+    return key
+
+
+def rekey_q_table_csv(filename, size=5):
+    """把 data 文件夹中以字符串为键的 Q 表转换为以哈希值为键"""
+    import pandas as pd
+
+    filepath = os.path.join("data", filename)
+    if not os.path.exists(filepath):
+        print(f"文件 {filepath} 不存在，无法转换Q表。")
+        return
+
+    q_table_df = pd.read_csv(filepath, index_col=0)
+    if pd.api.types.is_integer_dtype(q_table_df.index):
+        print(f"{filepath} 已经是哈希键，无需转换。")
+        return
+
+    q_table_df.index = [hash_legacy_state(state, size) for state in q_table_df.index]
+    q_table_df = q_table_df[~q_table_df.index.duplicated(keep="first")]
+    q_table_df.to_csv(filepath)
+    print(f"Q表已转换为哈希键：{filepath}，共 {len(q_table_df)} 个状态")
+
+
+if __name__ == "__main__":
+    rekey_q_table_csv("agent1_q_table.csv")
+    rekey_q_table_csv("agent2_q_table.csv")